@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+from ..utils.db_utils import Base
+
+class CrawlState(Base):
+    """每个arXiv分类的增量爬取状态，也用于保存OAI-PMH回填任务的断点"""
+    __tablename__ = 'crawl_states'
+    
+    category = Column(String(50), primary_key=True)
+    last_arxiv_id = Column(String(50))  # 已爬取到的最新论文ID(水位线)
+    last_published_date = Column(DateTime)  # 水位线论文所在列表的日期
+    etag = Column(String(200))  # 列表首页的ETag
+    last_modified = Column(String(100))  # 列表首页的Last-Modified
+    resumption_token = Column(String(200))  # OAI-PMH回填的续传令牌
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
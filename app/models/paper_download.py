@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..utils.db_utils import Base
@@ -7,13 +7,24 @@ class PaperDownload(Base):
     __tablename__ = 'paper_downloads'
     
     id = Column(Integer, primary_key=True)
-    paper_id = Column(Integer, ForeignKey('papers.id'), nullable=False)
+    paper_id = Column(Integer, ForeignKey('papers.id'), nullable=False, unique=True)
     download_status = Column(String(20), default='pending')  # pending, downloading, completed, failed
     download_progress = Column(Float, default=0.0)
     download_path = Column(String(500))
     download_error = Column(String(500))
+    # 文件内容的SHA-256和大小，用于完整性检查和去重
+    content_hash = Column(String(64), index=True)
+    file_size = Column(BigInteger)
+    # 下载队列租约信息，worker领取任务后持有租约并定期续期，过期后其他worker可重新领取
+    lease_owner = Column(String(100))
+    lease_expires_at = Column(DateTime, index=True)
+    attempts = Column(Integer, default=0)  # 已领取下载的次数
+    # 下载后处理的结果: 页数、纯文本文件路径和处理时间，重新下载完成后清空 processed_at 等待再次处理
+    page_count = Column(Integer)
+    text_path = Column(String(500))
+    processed_at = Column(DateTime, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # 建立与Paper模型的关系
     paper = relationship('Paper', backref='downloads')
\ No newline at end of file
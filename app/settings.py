@@ -16,28 +16,132 @@ ROBOTSTXT_OBEY = False
 CONCURRENT_REQUESTS = 2
 
 # Configure a delay for requests for the same website
-DOWNLOAD_DELAY = 1
+# 请求速率由共享的自适应限速器控制(RATE_LIMIT_*)，不再使用固定延迟
+DOWNLOAD_DELAY = 0
 
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
    'scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware': 100,
+   'app.spiders.middlewares.RateLimitMiddleware': 900,
 }
 
+# Enable or disable extensions
+EXTENSIONS = {
+   'app.spiders.extensions.MetricsExtension': 500,
+   'app.spiders.extensions.StatsFileExtension': 510,
+}
+
+LOG_LEVEL = 'INFO'
+
 # Configure item pipelines
 ITEM_PIPELINES = {
    'app.spiders.pipelines.PaperPipeline': 300,
 }
 
+# 管道批量写入配置，PIPELINE_BATCH_SIZE <= 1 时逐条保存
+PIPELINE_BATCH_SIZE = 100  # 每批写入的论文数量
+PIPELINE_BATCH_INTERVAL = 5  # 缓冲区最长等待时间(秒)
+
+# 指标配置
+METRICS_FILE = 'metrics.prom'  # 爬虫和下载worker结束时写出的Prometheus文本格式指标文件，None表示不写
+METRICS_HTTP_PORT = None  # 设置端口后在爬虫运行期间通过HTTP暴露 /metrics
+STATS_FILE = None  # 设置后爬虫结束时把Scrapy统计信息以JSON写入该文件，供分片编排汇总
+
+# 全文检索索引配置
+SEARCH_INDEX_ENABLED = True  # 保存论文时同步更新本地检索索引
+SEARCH_INDEX_PATH = 'search_index.db'  # SQLite FTS5索引文件路径
+
+# 论文向量化配置
+EMBEDDING_ENABLED = True  # 爬虫结束时(分片爬取时在全部分片结束后)为新论文生成向量并回写 vector_id
+EMBEDDER_CLASS = 'app.utils.vector_index.HashingEmbedder'  # 向量化器类路径
+EMBEDDING_DIM = 256  # 向量维度
+VECTOR_INDEX_BACKEND = 'local'  # 向量索引: local(本地内存映射IVF) 或 milvus
+VECTOR_INDEX_PATH = 'vector_index'  # 本地向量索引目录
+VECTOR_INDEX_NLIST = 256  # IVF聚类数
+VECTOR_INDEX_NPROBE = 16  # 检索时访问的聚类数
+MILVUS_URI = 'http://localhost:19530'
+MILVUS_COLLECTION = 'papers'
+
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = '2.7'
 # 移除 TWISTED_REACTOR 设置，让 Scrapy 自动选择合适的反应器
 # TWISTED_REACTOR = 'twisted.internet.selectreactor.SelectReactor'
 FEED_EXPORT_ENCODING = 'utf-8'
 
+# arXiv站点地址，离线测试时可指向本地替身服务器
+ARXIV_BASE_URL = 'https://arxiv.org'
+
+# arXiv OAI-PMH接口地址，用于历史数据回填
+ARXIV_OAI_URL = 'https://oaipmh.arxiv.org/oai'
+
+# 增量爬取: 保存各分类的水位线和缓存校验信息，列表未变化或已爬到水位线时停止
+ARXIV_INCREMENTAL = True
+
+# 数据库配置
+# 完整的SQLAlchemy连接URL，None时根据 DB_USER/DB_PASSWORD/DB_HOST/DB_PORT/DB_NAME 环境变量拼接MySQL地址，
+# 环境变量 DB_URL 优先。单机运行和测试可使用 sqlite:///paper_assistant.db
+DB_URL = None
+DB_POOL_SIZE = 5  # 连接池保持的连接数
+DB_MAX_OVERFLOW = 10  # 连接池满时允许额外创建的连接数
+DB_POOL_PRE_PING = True  # 取出连接时先检测是否可用，避免使用被服务器断开的连接
+DB_POOL_RECYCLE = 3600  # 连接最长复用时间(秒)
+DB_SQLITE_WAL = True  # SQLite启用WAL模式，允许读写并发
+
+# 自适应限速配置: 爬虫和PDF下载按主机共享同一个令牌桶，状态保存在文件中供多个进程共享
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_STATE_DIR = '.ratelimit'  # 令牌桶状态文件目录，None表示只在进程内共享
+RATE_LIMIT_INITIAL_RATE = 1.0  # 初始每秒请求数
+RATE_LIMIT_MIN_RATE = 0.2  # 最低每秒请求数
+RATE_LIMIT_MAX_RATE = 4.0  # 最高每秒请求数
+RATE_LIMIT_BURST = 2  # 令牌桶容量，空闲后最多连续发起的请求数
+RATE_LIMIT_INCREASE = 0.02  # 慢启动结束后每个正常响应增加的每秒请求数
+RATE_LIMIT_TARGET_LATENCY = 2.0  # 响应时间超过该值(秒)时降低速率
+
+# 数据导出配置
+EXPORT_DIR = 'exports'  # 导出文件目录，增量导出的水位线也保存在这里
+EXPORT_FORMAT = 'jsonl'  # jsonl、jsonl.gz、parquet 或 arrow，后两种需要安装pyarrow
+EXPORT_CHUNK_SIZE = 5000  # 服务端游标每次读取的行数
+# 增量导出从上次水位线之前这么多秒开始读取，补上时间戳较早但提交较晚的行，重复的行按ID和updated_at去除
+EXPORT_OVERLAP_SECONDS = 300
+
 # 论文下载相关配置
 PAPERS_FOLDER = 'papers'  # 论文下载保存路径
 DOWNLOAD_MAX_WORKERS = 2  # 下载线程池大小
 DOWNLOAD_CHUNK_SIZE = 8192  # 下载块大小
 DOWNLOAD_RETRY_TIMES = 3  # 下载重试次数
-DOWNLOAD_RETRY_DELAY = 5  # 重试等待时间(秒)
-DOWNLOAD_DELAY = 1  # 每个下载任务之间的延迟时间(秒)
\ No newline at end of file
+DOWNLOAD_RETRY_DELAY = 5  # 重试等待时间(秒)，每次重试翻倍
+DOWNLOAD_TIMEOUT = 60  # 下载连接和读取超时时间(秒)
+DOWNLOAD_ENGINE = 'thread'  # 下载引擎: thread(线程池) 或 asyncio(异步连接池)
+DOWNLOAD_ASYNC_MAX_CONCURRENCY = 200  # asyncio引擎同时进行的下载数
+DOWNLOAD_PER_HOST_CONCURRENCY = 4  # asyncio引擎每个主机的最大并发连接数
+PROGRESS_FLUSH_INTERVAL = 2  # 下载进度写入数据库的最小间隔(秒)
+PROGRESS_FLUSH_PERCENT = 10  # 下载进度变化超过该百分比才写入数据库
+
+# 下载队列配置
+DOWNLOAD_QUEUE_BATCH_SIZE = 10  # worker每次领取的任务数
+DOWNLOAD_QUEUE_LEASE_SECONDS = 300  # 任务租约时长(秒)，worker每1/3租约时长续期一次
+DOWNLOAD_QUEUE_MAX_ATTEMPTS = 5  # 失败任务最多被领取的次数
+DOWNLOAD_QUEUE_POLL_INTERVAL = 10  # 队列为空时worker的轮询间隔(秒)
+
+# 流水线下载: 论文入库后立即交给进程内的下载调度器，下载与爬取同时进行
+# 离线基准测试中尚未快于爬取结束后再下载，默认关闭，见 python -m benchmarks.run_e2e --pipelined
+DOWNLOAD_PIPELINED = False
+DOWNLOAD_SCHEDULER_QUEUE_SIZE = 200  # 等待下载的论文数上限，队列满时管道暂停处理新论文
+DOWNLOAD_PRIORITY = 'newest'  # 下载顺序: newest(新发布的优先)、category(按下面的分类顺序)、fifo(入库顺序)
+DOWNLOAD_PRIORITY_CATEGORIES = 'cs.AI,cs.CL'  # category 策略下的分类优先顺序，未列出的分类排在最后
+
+# 下载后处理: 在进程池中校验PDF结构并提取页数和纯文本，无效的PDF标记为失败重新下载
+PDF_PROCESS_ENABLED = True  # 定时任务下载完成后处理新下载的PDF
+PDF_PROCESS_WORKERS = None  # 处理进程数，None表示CPU核数
+PDF_PROCESS_BATCH_SIZE = 200  # 每批处理并合并回写状态的下载记录数
+PDF_TEXT_ENGINE = 'builtin'  # builtin(内置解析，只识别标准编码的文本) 或 pypdf(需要安装pypdf)
+
+# 分片爬取编排配置(Celery)
+CRAWL_CATEGORIES = 'cs.AI,cs.CL'  # 定时任务爬取的分类
+CRAWL_DAYS_BACK = 1  # 定时任务回溯的天数
+CRAWL_SHARD_SIZE = 1  # 每个爬虫子进程负责的分类数
+CRAWL_MAX_PARALLEL = 4  # 同时运行的爬虫子进程上限
+CRAWL_SHARD_TIMEOUT = 3600  # 单个爬虫子进程的超时时间(秒)
+CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_RESULT_BACKEND = 'redis://localhost:6379/1'
+CELERY_CRAWL_HOUR = 2  # 每天定时爬取的时刻(UTC小时)
@@ -0,0 +1,157 @@
+import io
+import scrapy
+from datetime import datetime
+from urllib.parse import urlencode, urlparse
+from ..utils.db_utils import db_manager, paper_content_hash, parse_version, is_changed
+from ..models.crawl_state import CrawlState
+from ..settings import ARXIV_OAI_URL, ARXIV_BASE_URL
+from .items import PaperItem
+from .pipelines import flush_requested
+from .oai_parser import iterparse_oai
+
+class ArxivOaiSpider(scrapy.Spider):
+    """通过arXiv OAI-PMH接口批量回填历史论文
+
+    使用resumptionToken翻页，流式解析XML，每页处理完后记录断点，
+    中断后再次以相同参数启动会从断点继续。
+    """
+    name = 'arxiv_oai'
+    custom_settings = {
+        'ROBOTSTXT_OBEY': False,
+        'CONCURRENT_REQUESTS': 1,  # 续传令牌只能顺序请求
+        'DOWNLOAD_DELAY': 5,       # OAI-PMH接口要求的请求间隔
+        'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],
+        'RETRY_TIMES': 10,
+    }
+    
+    def __init__(self, set_spec='cs', from_date=None, until_date=None, oai_url=ARXIV_OAI_URL,
+                 base_url=ARXIV_BASE_URL, metadata_prefix='arXivRaw', *args, **kwargs):
+        super(ArxivOaiSpider, self).__init__(*args, **kwargs)
+        self.set_spec = set_spec
+        self.from_date = from_date
+        self.until_date = until_date
+        self.oai_url = oai_url
+        self.base_url = base_url.rstrip('/')
+        self.allowed_domains = [urlparse(self.oai_url).hostname]
+        self.metadata_prefix = metadata_prefix
+        # 断点以回填参数为键保存在crawl_states表中
+        self.checkpoint_key = f'oai:{set_spec}:{from_date or ""}:{until_date or ""}'
+        self.db_session = db_manager.get_session()
+        self.records_seen = 0
+        self.logger.info(f"初始化回填爬虫: set={set_spec}, from={from_date}, until={until_date}")
+    
+    def closed(self, reason):
+        """爬虫关闭时关闭数据库会话"""
+        self.logger.info(f"回填结束({reason})，本次处理 {self.records_seen} 条记录")
+        self.db_session.close()
+    
+    def _list_url(self, token=None, from_date=None):
+        if token:
+            params = {'verb': 'ListRecords', 'resumptionToken': token}
+        else:
+            params = {'verb': 'ListRecords', 'metadataPrefix': self.metadata_prefix, 'set': self.set_spec}
+            if from_date:
+                params['from'] = from_date
+            if self.until_date:
+                params['until'] = self.until_date
+        return f'{self.oai_url}?{urlencode(params)}'
+    
+    def start_requests(self):
+        checkpoint = self.db_session.get(CrawlState, self.checkpoint_key)
+        if checkpoint is not None and checkpoint.resumption_token:
+            self.logger.info(f"从断点继续回填: {checkpoint.resumption_token}")
+            url = self._list_url(token=checkpoint.resumption_token)
+        else:
+            url = self._list_url(from_date=self.from_date)
+        yield scrapy.Request(url, callback=self.parse, meta={'token': None},
+                             errback=self.errback_httpbin)
+    
+    async def start(self):
+        # Scrapy 2.13+ 的入口，旧版本仍调用 start_requests
+        for request in self.start_requests():
+            yield request
+    
+    def errback_httpbin(self, failure):
+        """处理请求错误"""
+        self.logger.error(f"请求失败: {failure}")
+    
+    def parse(self, response):
+        records = []
+        token = None
+        for kind, value in iterparse_oai(io.BytesIO(response.body)):
+            if kind == 'record':
+                records.append(value)
+            elif kind == 'token':
+                token = value
+            elif kind == 'error':
+                code, message = value
+                if code == 'badResumptionToken':
+                    # 令牌已过期，从已保存的最后一条记录日期重新开始
+                    yield from self._restart_from_datestamp()
+                    return
+                if code != 'noRecordsMatch':
+                    self.logger.error(f"OAI-PMH错误: {code} {message}")
+                return
+        
+        self.records_seen += len(records)
+        # 已有论文只在元数据变化或出现新版本时重新写入
+        known = db_manager.existing_versions(self.db_session, [r['arxiv_id'] for r in records])
+        for record in records:
+            item = self._build_item(record)
+            if is_changed(paper_content_hash(item), parse_version(item['version']), known.get(record['arxiv_id'])):
+                yield item
+        
+        # 断点保存为获取本页所用的令牌，续传时重新处理本页。之前各页的论文可能还在管道缓冲区中(不足一批)，
+        # 保存断点前让管道写入数据库，中断后从断点续传不会丢失这些论文
+        self.crawler.signals.send_catch_log(signal=flush_requested, spider=self)
+        last_datestamp = max((r['datestamp'] for r in records), default=None)
+        self._save_checkpoint(response.meta.get('token'), last_datestamp)
+        
+        if token:
+            self.logger.info(f"已处理 {self.records_seen} 条记录，继续请求下一页")
+            yield scrapy.Request(self._list_url(token=token), callback=self.parse,
+                                 meta={'token': token}, errback=self.errback_httpbin)
+        else:
+            self.logger.info(f"回填完成，共处理 {self.records_seen} 条记录")
+            self._save_checkpoint(None, last_datestamp, finished=True)
+    
+    def _build_item(self, record):
+        """将OAI记录转换为PaperItem"""
+        item = PaperItem()
+        item['arxiv_id'] = record['arxiv_id']
+        item['title'] = record['title']
+        item['authors'] = record['authors']
+        item['institutions'] = []
+        item['abstract'] = record['abstract']
+        item['pdf_url'] = f"{self.base_url}/pdf/{record['arxiv_id']}.pdf"
+        item['published_date'] = record['published_date'] or datetime.utcnow()
+        item['categories'] = record['categories']
+        item['version'] = record['versions'][-1]['version'] if record['versions'] else None
+        return item
+    
+    def _save_checkpoint(self, token, datestamp, finished=False):
+        """保存回填断点"""
+        try:
+            checkpoint = self.db_session.get(CrawlState, self.checkpoint_key) or CrawlState(category=self.checkpoint_key)
+            if not finished:
+                checkpoint.resumption_token = token
+            else:
+                checkpoint.resumption_token = None
+            if datestamp:
+                checkpoint.last_published_date = datetime.strptime(datestamp[:10], '%Y-%m-%d')
+            self.db_session.add(checkpoint)
+            self.db_session.commit()
+        except Exception as e:
+            self.logger.error(f"保存回填断点时出错: {str(e)}")
+            self.db_session.rollback()
+    
+    def _restart_from_datestamp(self):
+        """续传令牌失效时，从断点记录的日期重新发起ListRecords请求"""
+        checkpoint = self.db_session.get(CrawlState, self.checkpoint_key)
+        from_date = self.from_date
+        if checkpoint is not None and checkpoint.last_published_date:
+            from_date = checkpoint.last_published_date.strftime('%Y-%m-%d')
+        self.logger.warning(f"续传令牌已失效，从 {from_date} 重新开始")
+        self._save_checkpoint(None, None)
+        yield scrapy.Request(self._list_url(from_date=from_date), callback=self.parse,
+                             meta={'token': None}, dont_filter=True, errback=self.errback_httpbin)
@@ -2,66 +2,106 @@ import scrapy
 import re
 import logging
 from datetime import datetime, timedelta
-from urllib.parse import urlencode
-from ..utils.db_utils import db_manager, Paper
+from urllib.parse import urlencode, urlparse
+from ..utils.db_utils import db_manager, Paper, paper_content_hash, parse_version, is_changed
+from ..utils.paper_queries import papers_published_on
+from ..utils.metrics import LISTING_FETCH_SECONDS, LISTING_PARSE_SECONDS, LISTING_ENTRIES
+from ..models.crawl_state import CrawlState
+from ..settings import ARXIV_INCREMENTAL, ARXIV_BASE_URL
 from .items import PaperItem
+from .listing_parser import parse_listing
+
+def arxiv_id_key(arxiv_id):
+    """将arXiv ID转换为可比较大小的键，新格式(2501.01234)总是排在旧格式(cs/0501001)之后"""
+    arxiv_id = re.sub(r'v\d+$', '', arxiv_id)
+    match = re.match(r'^(\d{4})\.(\d{4,5})$', arxiv_id)
+    if match:
+        return (1, int(match.group(1)), int(match.group(2)))
+    return (0, 0, arxiv_id)
 
 class ArxivSpider(scrapy.Spider):
     name = 'arxiv'
     allowed_domains = ['arxiv.org']
     custom_settings = {
         'ROBOTSTXT_OBEY': False,
-        'CONCURRENT_REQUESTS': 2,  # 限制并发请求数
-        'DOWNLOAD_DELAY': 1,       # 下载延迟，避免请求过于频繁
-        'LOG_LEVEL': 'DEBUG',      # 设置日志级别为DEBUG
+        'CONCURRENT_REQUESTS': 2,  # 限制并发请求数，请求速率由共享限速器控制
     }
     
-    def __init__(self, categories='cs.AI,cs.CL', days_back=1, *args, **kwargs):
+    def __init__(self, categories='cs.AI,cs.CL', days_back=1, incremental=ARXIV_INCREMENTAL,
+                 base_url=ARXIV_BASE_URL, *args, **kwargs):
         super(ArxivSpider, self).__init__(*args, **kwargs)
+        # 可以指向本地的arXiv替身服务器做离线测试
+        self.base_url = base_url.rstrip('/')
+        self.allowed_domains = [urlparse(self.base_url).hostname]
         self.categories = categories.split(',')
         self.days_back = int(days_back)
+        # 早于该日期的列表页不再抓取
+        self.min_date = datetime.utcnow().date() - timedelta(days=self.days_back)
+        self.incremental = str(incremental).lower() in ('1', 'true', 'yes')
         # 创建数据库会话
         self.db_session = db_manager.get_session()
         # 用于记录新爬取的论文ID
         self.new_paper_ids = []
+        # 内存中已知论文的 {arxiv_id: (元数据摘要, 版本号)}，启动时加载一次，爬取过程中持续更新
+        self.known_versions = self._load_known_versions()
+        # 批量去重节省的数据库查询次数
+        self.db_queries_avoided = 0
+        # 各分类的增量爬取状态，爬取完整结束的分类在关闭时写回数据库
+        self.crawl_states = self._load_crawl_states() if self.incremental else {}
+        self.pending_states = {}
         self.logger.info(f"初始化爬虫: 分类={self.categories}, 天数={self.days_back}")
     
+    def wants_download(self, paper_data):
+        """论文入库后是否立即下载PDF，与关闭时入队的范围一致，只下载今天发布的论文"""
+        return paper_data['published_date'].date() == datetime.utcnow().date()
+    
     def closed(self, reason):
-        """爬虫关闭时启动论文下载并关闭数据库会话"""
+        """爬虫关闭时将今日尚未下载的论文加入下载队列并关闭数据库会话
+        
+        启用流水线下载时大部分论文已在爬取过程中下载，这里只补充没有下载记录的论文，
+        下载失败的论文由下载worker按重试次数重新领取。
+        """
         try:
             # 获取今天的日期
             today = datetime.utcnow().date()
-            # 获取今天发布的所有论文
-            papers = self.db_session.query(Paper).filter(
-                Paper.published_date >= today,
-                Paper.published_date < today + timedelta(days=1)
-            ).all()
+            # 获取今天发布的所有论文ID，published_date上有索引
+            paper_ids = [row[0] for row in papers_published_on(self.db_session, today, columns=[Paper.id])]
             
-            if papers:
-                # 启动下载任务
-                from ..utils.downloader import paper_downloader
-                paper_downloader.download_papers(papers)
-                self.logger.info(f"已启动{len(papers)}篇今日发布的新论文的下载任务")
+            if paper_ids:
+                # 写入持久化下载队列，由下载worker领取，已有下载记录的论文不会重复入队
+                from ..utils.download_queue import download_queue
+                added = download_queue.enqueue(self.db_session, paper_ids)
+                self.logger.info(f"今日发布{len(paper_ids)}篇论文，新加入下载队列{added}篇")
             else:
                 self.logger.info("今日没有新发布的论文")
         except Exception as e:
             self.logger.error(f"获取今日论文时出错: {str(e)}")
         finally:
+            self.logger.info(f"批量去重共节省数据库查询 {self.db_queries_avoided} 次")
+            if self.incremental:
+                self._save_crawl_states()
             # 关闭数据库会话
             if hasattr(self, 'db_session'):
                 self.db_session.close()
                 self.logger.info("数据库会话已关闭")
     
+    async def start(self):
+        # Scrapy 2.13+ 的入口，旧版本仍调用 start_requests
+        for request in self.start_requests():
+            yield request
+    
     def start_requests(self):
         # 为每个分类创建请求
         for category in self.categories:
             # 使用网站列表页面而不是API
-            url = f'https://arxiv.org/list/{category}/recent?skip=0&show=250'
+            url = f'{self.base_url}/list/{category}/recent?skip=0&show=250'
             self.logger.info(f"开始请求: {url}")
             yield scrapy.Request(
                 url=url,
                 callback=self.parse,
-                meta={'category': category},
+                headers=self._conditional_headers(category),
+                # 304表示列表首页自上次爬取后没有变化
+                meta={'category': category, 'handle_httpstatus_list': [304]},
                 errback=self.errback_httpbin
             )
     
@@ -71,125 +111,59 @@ class ArxivSpider(scrapy.Spider):
     
     def parse(self, response):
         self.logger.info(f"解析页面: {response.url}")
+        category = response.meta.get('category')
         
-        # 查找包含论文列表的主要容器
-        articles_containers = response.css('dl#articles')
-        if not articles_containers:
-            self.logger.error("未找到论文列表容器 (dl#articles)")
+        if response.status == 304:
+            self.logger.info(f"分类 {category} 的列表没有变化，跳过")
             return
         
-        articles_container = articles_containers[0]
+        LISTING_FETCH_SECONDS.observe(response.meta.get('download_latency', 0), category=category)
         
-        if not articles_container:
+        # 单次遍历解析列表页，得到与Scrapy无关的论文记录
+        with LISTING_PARSE_SECONDS.time():
+            page = parse_listing(response.body)
+        if page is None:
             self.logger.error("未找到论文列表容器 (dl#articles)")
             return
         
-        # 从标题中提取日期和总条目数
-        date_entries_info = response.xpath('//h3[contains(text(), "entries")]/text()').get('')
-        self.logger.debug(f"日期条目信息: {date_entries_info}")
-        
-        current_date = None
-        total_entries = 0
+        current_date = page['date']
+        total_entries = page['total_entries']
+        entries = page['entries']
+        LISTING_ENTRIES.inc(len(entries), category=category)
+        if current_date is None:
+            self.logger.error("日期解析错误，使用当前时间作为发布日期")
+        self.logger.info(f"找到 {len(entries)} 篇论文, 日期: {current_date}, 总条目数: {total_entries}")
+        if page['unpaired']:
+            self.logger.warning(f"有 {page['unpaired']} 个dt/dd标签无法配对，已跳过")
         
-        if date_entries_info:
-            # 提取日期
-            date_part = date_entries_info.split('(')[0].strip()
+        # 先构建本页所有论文项，再统一与已有论文的摘要和版本号比较
+        page_ids = [record['arxiv_id'] for record in entries]
+        items = []
+        for record in entries:
             try:
-                # 将解析的日期转换为UTC时间
-                current_date = datetime.strptime(date_part, '%a, %d %b %Y').replace(hour=0, minute=0, second=0)
-                self.logger.debug(f"提取的日期: {current_date}")
-            except ValueError as e:
-                self.logger.error(f"日期解析错误: {e}")
-                current_date = datetime.utcnow()
-                
-            # 提取总条目数
-            try:
-                if 'showing first' in date_entries_info:
-                    entries_part = date_entries_info.split('showing first')[1]
-                    if 'of' in entries_part:
-                        total_entries = int(entries_part.split('of')[1].split('entries')[0].strip())
-                        self.logger.debug(f"总条目数: {total_entries}")
-            except (ValueError, IndexError) as e:
-                self.logger.error(f"提取总条目数错误: {e}")
-                total_entries = 0
-        
-        # 获取所有dt和dd标签对
-        dt_tags = articles_container.css('dt')
-        dd_tags = articles_container.css('dd')
+                items.append(self._build_item(record))
+            except Exception as e:
+                self.logger.error(f"处理论文 {record['arxiv_id']} 时出错: {str(e)}")
+        unchanged_ids = self._filter_unchanged(items)
         
-        self.logger.info(f"找到 {len(dt_tags)} 个dt标签和 {len(dd_tags)} 个dd标签")
+        for item in items:
+            arxiv_id = item['arxiv_id']
+            if arxiv_id in unchanged_ids:
+                continue
+            # 记录新增或变化的论文，同一论文在其他分类页面中再次出现时直接跳过
+            self.new_paper_ids.append(arxiv_id)
+            known = self.known_versions.get(arxiv_id)
+            version = parse_version(item['version'])
+            if version is None and known is not None:
+                version = known[1]
+            self.known_versions[arxiv_id] = (paper_content_hash(item), version)
+            yield item
         
-        # 确保dt和dd标签数量匹配
-        if len(dt_tags) != len(dd_tags):
-            self.logger.warning(f"dt标签数量({len(dt_tags)})与dd标签数量({len(dd_tags)})不匹配")
+        # 增量模式下记录本次看到的最新论文ID和首页的缓存校验信息
+        self._track_page(category, response, page_ids, current_date)
         
-        # 处理每对dt和dd标签
-        for i, (dt, dd) in enumerate(zip(dt_tags, dd_tags)):
-            try:
-                # 从dt标签中提取论文ID
-                arxiv_id_link = dt.css('a[href*="/abs/"]::attr(href)').get('')
-                if not arxiv_id_link:
-                    self.logger.warning(f"条目 {i+1} 没有找到arxiv_id链接")
-                    continue
-                    
-                # 从链接中提取ID
-                arxiv_id = arxiv_id_link.split('/abs/')[1]
-                if not arxiv_id:
-                    self.logger.warning(f"条目 {i+1} 无法从链接提取arxiv_id")
-                    continue
-                
-                self.logger.debug(f"处理论文 {i+1}/{len(dt_tags)}: {arxiv_id}")
-                    
-                # 检查论文是否已存在
-                if not self._is_paper_exists(arxiv_id):
-                    item = PaperItem()
-                    item['arxiv_id'] = arxiv_id
-                    
-                    # 获取标题 - 从dt标签中的meta div获取
-                    meta_div = dd.css('div.meta')
-                    title_element = meta_div.css('div.list-title::text').getall()
-                    title = ''.join(title_element).replace('Title:', '').strip()
-                    item['title'] = title
-                    
-                    # 获取作者 - 从meta div中的list-authors获取
-                    authors_element = meta_div.css('div.list-authors a::text').getall()
-                    item['authors'] = [author.strip() for author in authors_element]
-                    
-                    # 机构信息在列表页面不可用
-                    item['institutions'] = []
-                    
-                    # 获取摘要 - 从dd标签中获取
-                    abstract = dd.css('p.mathjax::text').get('').strip()
-                    item['abstract'] = abstract
-                    
-                    # PDF链接
-                    item['pdf_url'] = f'https://arxiv.org/pdf/{arxiv_id}.pdf'
-                    
-                    # 使用从页面标题提取的日期
-                    item['published_date'] = current_date if current_date else datetime.utcnow()
-                    
-                    categories = []
-                    # 获取分类 - 从meta div中的list-subjects获取
-                    prime_categories = meta_div.css('div.list-subjects span.primary-subject::text').getall()
-                    if prime_categories:
-                        categories.extend([cat.strip() for cat in prime_categories if cat.strip()])
-                    
-                    other_categories_text = meta_div.css('div.list-subjects::text').getall()
-                    if other_categories_text:
-                        other_cats = other_categories_text[0].strip().split(';')
-                        if len(other_cats) > 1:  # 确保有分号分隔的内容
-                            categories.extend([cat.strip() for cat in other_cats[1:] if cat.strip()])
-                    
-                    item['categories'] = categories
-                    
-                    self.logger.debug(f"提取论文: {arxiv_id}, 标题: {title[:30]}...")
-                    # 记录新爬取的论文ID
-                    self.new_paper_ids.append(arxiv_id)
-                    yield item
-                else:
-                    self.logger.debug(f"论文已存在: {arxiv_id}")
-            except Exception as e:
-                self.logger.error(f"处理条目 {i+1} 时出错: {str(e)}")
+        # 本页已全部在水位线以下，或者已早于days_back范围时不再翻页
+        stop_reason = self._stop_reason(category, page_ids, current_date)
         
         # 如果有更多页面需要抓取，生成下一页请求
         if total_entries > 0:
@@ -203,8 +177,7 @@ class ArxivSpider(scrapy.Spider):
             next_skip = current_skip + items_per_page
             
             # 如果还有更多条目需要抓取
-            if next_skip < total_entries:
-                category = response.meta.get('category')
+            if next_skip < total_entries and not stop_reason:
                 next_url = re.sub(r'skip=\d+', f'skip={next_skip}', response.url)
                 self.logger.info(f"请求下一页: {next_url}")
                 yield scrapy.Request(
@@ -213,13 +186,129 @@ class ArxivSpider(scrapy.Spider):
                     meta={'category': category},
                     errback=self.errback_httpbin
                 )
+                return
+            elif stop_reason:
+                self.logger.info(f"分类 {category} 停止翻页: {stop_reason}")
             else:
                 self.logger.info(f"已到达最后一页，总条目: {total_entries}")
+        
+        # 分类已完整爬取，关闭时保存其增量状态
+        if category in self.pending_states:
+            self.pending_states[category]['complete'] = True
+    
+    def _build_item(self, record):
+        """将列表解析得到的论文记录转换为PaperItem"""
+        item = PaperItem()
+        item['arxiv_id'] = record['arxiv_id']
+        item['title'] = record['title']
+        item['authors'] = record['authors']
+        # 机构信息在列表页面不可用
+        item['institutions'] = []
+        item['abstract'] = record['abstract']
+        item['pdf_url'] = f"{self.base_url}/pdf/{record['arxiv_id']}.pdf"
+        # 使用条目所在日期标题的日期
+        item['published_date'] = record['published_date'] or datetime.utcnow()
+        item['categories'] = record['categories']
+        item['version'] = record.get('version')
+        return item
+    
+    def _load_crawl_states(self):
+        """加载各分类的增量爬取状态"""
+        try:
+            states = self.db_session.query(CrawlState).filter(CrawlState.category.in_(self.categories)).all()
+            return {state.category: state for state in states}
+        except Exception as e:
+            self.logger.error(f"加载增量爬取状态时出错: {str(e)}")
+            self.db_session.rollback()
+            return {}
+    
+    def _conditional_headers(self, category):
+        """使用上次保存的缓存校验信息构造条件请求头"""
+        state = self.crawl_states.get(category)
+        headers = {}
+        if state is not None:
+            if state.etag:
+                headers['If-None-Match'] = state.etag
+            if state.last_modified:
+                headers['If-Modified-Since'] = state.last_modified
+        return headers
+    
+    def _track_page(self, category, response, page_ids, current_date):
+        """记录本次爬取中各分类看到的最新论文ID和首页的缓存校验信息"""
+        if not self.incremental:
+            return
+        pending = self.pending_states.setdefault(category, {
+            'last_arxiv_id': None, 'last_published_date': None,
+            'etag': None, 'last_modified': None, 'complete': False,
+        })
+        if 'skip=0' in response.url:
+            pending['etag'] = response.headers.get('ETag', b'').decode() or None
+            pending['last_modified'] = response.headers.get('Last-Modified', b'').decode() or None
+        if page_ids:
+            newest = max(page_ids, key=arxiv_id_key)
+            if pending['last_arxiv_id'] is None or arxiv_id_key(newest) > arxiv_id_key(pending['last_arxiv_id']):
+                pending['last_arxiv_id'] = newest
+                pending['last_published_date'] = current_date
+    
+    def _stop_reason(self, category, page_ids, current_date):
+        """判断是否可以提前停止翻页，返回停止原因，继续翻页时返回None"""
+        if current_date and current_date.date() < self.min_date:
+            return f"列表日期 {current_date.date()} 早于 {self.min_date}"
+        state = self.crawl_states.get(category)
+        if state is not None and state.last_arxiv_id and page_ids:
+            watermark = arxiv_id_key(state.last_arxiv_id)
+            if all(arxiv_id_key(arxiv_id) <= watermark for arxiv_id in page_ids):
+                return f"本页论文均不晚于水位线 {state.last_arxiv_id}"
+        return None
+    
+    def _save_crawl_states(self):
+        """保存爬取完整结束的分类的增量状态"""
+        try:
+            for category, pending in self.pending_states.items():
+                if not pending['complete']:
+                    continue
+                state = self.db_session.get(CrawlState, category) or CrawlState(category=category)
+                if pending['last_arxiv_id'] and (not state.last_arxiv_id or
+                        arxiv_id_key(pending['last_arxiv_id']) > arxiv_id_key(state.last_arxiv_id)):
+                    state.last_arxiv_id = pending['last_arxiv_id']
+                    state.last_published_date = pending['last_published_date']
+                state.etag = pending['etag']
+                state.last_modified = pending['last_modified']
+                self.db_session.add(state)
+            self.db_session.commit()
+        except Exception as e:
+            self.logger.error(f"保存增量爬取状态时出错: {str(e)}")
+            self.db_session.rollback()
     
-    def _is_paper_exists(self, arxiv_id):
-        """检查论文是否已存在于数据库中"""
+    def _load_known_versions(self):
+        """爬虫启动时一次性加载数据库中已有论文的元数据摘要和版本号"""
         try:
-            return db_manager.paper_exists(self.db_session, arxiv_id)
+            return db_manager.load_versions(self.db_session)
         except Exception as e:
-            self.logger.error(f"检查论文存在性时出错: {str(e)}")
-            return False
\ No newline at end of file
+            self.logger.error(f"加载已有论文时出错: {str(e)}")
+            return {}
+    
+    def _filter_unchanged(self, items):
+        """返回元数据和版本都没有变化的论文ID集合，优先使用内存中的已知论文，剩余论文通过一次批量查询确认"""
+        unknown = [item['arxiv_id'] for item in items if item['arxiv_id'] not in self.known_versions]
+        
+        # 原先每个条目都要单独查询一次数据库
+        queries = 1 if unknown else 0
+        self.db_queries_avoided += len(items) - queries
+        if getattr(self, 'crawler', None) is not None:
+            self.crawler.stats.inc_value('arxiv/db_queries_avoided', len(items) - queries)
+        
+        if unknown:
+            try:
+                self.known_versions.update(db_manager.existing_versions(self.db_session, unknown))
+            except Exception as e:
+                self.logger.error(f"检查论文存在性时出错: {str(e)}")
+                self.db_session.rollback()
+        
+        unchanged = {item['arxiv_id'] for item in items
+                     if not is_changed(paper_content_hash(item), parse_version(item['version']),
+                                       self.known_versions.get(item['arxiv_id']))}
+        if getattr(self, 'crawler', None) is not None:
+            self.crawler.stats.inc_value('arxiv/papers_unchanged', len(unchanged))
+        self.logger.debug(f"本页 {len(items)} 篇论文中未变化 {len(unchanged)} 篇, 累计节省查询 {self.db_queries_avoided} 次")
+        return unchanged
\ No newline at end of file
@@ -0,0 +1,62 @@
+import json
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from ..utils.metrics import metrics
+from ..settings import METRICS_FILE, METRICS_HTTP_PORT
+
+class MetricsExtension:
+    """爬虫运行期间暴露指标，结束时把各阶段耗时汇总写入Scrapy统计和指标文件"""
+
+    def __init__(self, stats, metrics_file=METRICS_FILE, http_port=METRICS_HTTP_PORT):
+        self.stats = stats
+        self.metrics_file = metrics_file
+        self.http_port = http_port
+        self.server = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.stats,
+                  crawler.settings.get('METRICS_FILE', METRICS_FILE),
+                  crawler.settings.getint('METRICS_HTTP_PORT') or None)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        if self.http_port:
+            self.server = metrics.start_http_server(self.http_port)
+            spider.logger.info(f"指标服务已启动: http://0.0.0.0:{self.http_port}/metrics")
+
+    def spider_closed(self, spider):
+        # 直方图汇总为 count/avg/p50/p95 写入统计，便于在爬虫结束日志中查看
+        for name, summary in metrics.summaries().items():
+            for key, value in summary.items():
+                self.stats.set_value(f"metrics/{name}/{key}", value)
+        if self.metrics_file:
+            metrics.write_prometheus(self.metrics_file)
+        if self.server is not None:
+            self.server.shutdown()
+
+
+class StatsFileExtension:
+    """爬虫结束时把统计信息写入JSON文件，用于子进程爬取时把结果交回编排进程"""
+
+    def __init__(self, stats, path):
+        self.stats = stats
+        self.path = path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('STATS_FILE')
+        if not path:
+            raise NotConfigured
+        ext = cls(crawler.stats, path)
+        # 在MetricsExtension之后加载，写出的统计中已包含指标汇总
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        stats = dict(self.stats.get_stats())
+        stats['finish_reason'] = reason
+        with open(self.path, 'w') as f:
+            json.dump(stats, f, ensure_ascii=False, default=str)
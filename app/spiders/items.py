@@ -9,4 +9,5 @@ class PaperItem(Item):
     abstract = Field()  # 摘要
     pdf_url = Field()   # PDF链接
     published_date = Field()  # 发布时间
-    categories = Field()  # arXiv分类
\ No newline at end of file
+    categories = Field()  # arXiv分类
+    version = Field()  # 最新版本号，如 v2
\ No newline at end of file
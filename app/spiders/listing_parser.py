@@ -0,0 +1,114 @@
+import re
+from datetime import datetime
+from lxml import html as lxml_html
+
+TOTAL_ENTRIES_RE = re.compile(r'of\s+(\d+)\s+entries')
+# 链接中的论文ID，可能带有版本号，如 /abs/2510.01234、/html/2510.01234v2
+LINK_ID_RE = re.compile(r'/(?P<kind>abs|html|pdf)/(?P<id>[^?#]+?)(?:v(?P<version>\d+))?/?$')
+
+
+def parse_listing_date(text):
+    """从列表日期标题(如 'Fri, 17 Oct 2025 (showing first 250 of 400 entries )')中提取日期"""
+    date_part = text.split('(')[0].strip()
+    try:
+        return datetime.strptime(date_part, '%a, %d %b %Y')
+    except ValueError:
+        return None
+
+
+def parse_total_entries(text):
+    """从列表日期标题中提取总条目数，没有时返回0"""
+    match = TOTAL_ENTRIES_RE.search(text)
+    return int(match.group(1)) if match else 0
+
+
+def _arxiv_id_from_dt(dt):
+    """从dt标签的链接中提取不带版本号的论文ID和最新版本号，返回 (论文ID, 版本号)
+
+    摘要链接通常不带版本号，HTML链接带有最新版本号(如 /html/2510.01234v2)，没有版本信息时版本号为None。
+    """
+    arxiv_id = None
+    version = None
+    for link in dt.iter('a'):
+        match = LINK_ID_RE.search(link.get('href', '').strip())
+        if match is None:
+            continue
+        if match.group('kind') == 'abs' and arxiv_id is None:
+            arxiv_id = match.group('id') or None
+        if match.group('version'):
+            version = max(version or 0, int(match.group('version')))
+    return arxiv_id, version
+
+
+def _parse_dd(dd):
+    """一次遍历dd标签，提取标题、作者、分类和摘要"""
+    record = {'title': '', 'authors': [], 'categories': [], 'abstract': ''}
+    for node in dd.iter('div', 'p'):
+        classes = node.get('class', '')
+        if node.tag == 'p':
+            if 'mathjax' in classes and not record['abstract']:
+                record['abstract'] = node.text_content().strip()
+        elif 'list-title' in classes:
+            record['title'] = node.text_content().replace('Title:', '').strip()
+        elif 'list-authors' in classes:
+            record['authors'] = [a.text_content().strip() for a in node.iter('a')]
+        elif 'list-subjects' in classes:
+            for span in node.iter('span'):
+                if 'primary-subject' in span.get('class', ''):
+                    record['categories'].append(span.text_content().strip())
+                    # 主分类之后以分号分隔的其他分类
+                    others = (span.tail or '').split(';')
+                    record['categories'].extend(cat.strip() for cat in others if cat.strip())
+                    break
+    return record
+
+
+def parse_listing(body):
+    """单次遍历 dl#articles 解析arXiv列表页
+
+    返回 dict: date(首个日期标题的日期), total_entries(总条目数),
+    entries(论文记录列表, 每条包含 arxiv_id/version/title/authors/categories/abstract/published_date),
+    unpaired(没有配对的dt或dd数量)。找不到列表容器时返回None。
+    """
+    root = lxml_html.fromstring(body)
+    containers = root.xpath('//dl[@id="articles"]')
+    if not containers:
+        return None
+
+    page = {'date': None, 'total_entries': 0, 'entries': [], 'unpaired': 0}
+    # 日期标题可能在列表容器之前，也可能作为容器的子节点出现在每天的条目之前
+    for h3 in root.iter('h3'):
+        text = h3.text_content()
+        if 'entries' in text:
+            page['date'] = parse_listing_date(text)
+            page['total_entries'] = parse_total_entries(text)
+            break
+
+    current_date = page['date']
+    pending_id = None
+    pending_version = None
+    pending_dt = False
+    for node in containers[0].iterchildren():
+        tag = node.tag
+        if tag == 'dt':
+            if pending_dt:
+                page['unpaired'] += 1
+            pending_id, pending_version = _arxiv_id_from_dt(node)
+            pending_dt = True
+        elif tag == 'dd':
+            if not pending_dt:
+                page['unpaired'] += 1
+                continue
+            pending_dt = False
+            if pending_id is None:
+                continue
+            record = _parse_dd(node)
+            record['arxiv_id'] = pending_id
+            record['version'] = pending_version
+            record['published_date'] = current_date
+            page['entries'].append(record)
+        elif tag == 'h3':
+            current_date = parse_listing_date(node.text_content()) or current_date
+    if pending_dt:
+        page['unpaired'] += 1
+    return page
@@ -0,0 +1,37 @@
+from twisted.internet.task import deferLater
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from ..utils import rate_limiter
+from ..utils.rate_limiter import get_rate_limiter
+
+class RateLimitMiddleware:
+    """通过共享的自适应限速器控制请求速率，与PDF下载器使用同一个令牌桶
+
+    启用后应将 DOWNLOAD_DELAY 设为0，由限速器决定请求间隔。
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('RATE_LIMIT_ENABLED', True):
+            # 流水线下载与爬虫在同一进程中，一并关闭
+            rate_limiter.set_enabled(False)
+            raise NotConfigured
+        return cls()
+
+    async def process_request(self, request, spider=None):
+        limiter = get_rate_limiter(request.url)
+        if limiter is None:
+            return None
+        wait = limiter.reserve()
+        if wait > 0:
+            from twisted.internet import reactor
+            # 非阻塞等待，不占用reactor线程
+            await maybe_deferred_to_future(deferLater(reactor, wait, lambda: None))
+        return None
+
+    def process_response(self, request, response, spider=None):
+        limiter = get_rate_limiter(request.url)
+        if limiter is not None:
+            limiter.feedback(response.status, request.meta.get('download_latency'),
+                             response.headers.get('Retry-After'))
+        return response
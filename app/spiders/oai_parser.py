@@ -0,0 +1,77 @@
+import re
+from datetime import datetime
+from lxml import etree
+
+OAI_NS = '{http://www.openarchives.org/OAI/2.0/}'
+RAW_NS = '{http://arxiv.org/OAI/arXivRaw/}'
+AUTHOR_SPLIT_RE = re.compile(r',\s*|\s+and\s+')
+
+
+def _text(element, tag):
+    """取子元素文本并合并多余空白"""
+    child = element.find(tag)
+    if child is None or child.text is None:
+        return ''
+    return ' '.join(child.text.split())
+
+
+def _parse_version_date(text):
+    """解析版本日期，如 'Mon, 2 Apr 2007 19:18:42 GMT'"""
+    try:
+        return datetime.strptime(text.strip(), '%a, %d %b %Y %H:%M:%S %Z')
+    except ValueError:
+        return None
+
+
+def _parse_record(record):
+    """将一条arXivRaw格式的OAI记录转换为论文记录，已删除的记录返回None"""
+    header = record.find(f'{OAI_NS}header')
+    if header is not None and header.get('status') == 'deleted':
+        return None
+    raw = record.find(f'{OAI_NS}metadata/{RAW_NS}arXivRaw')
+    if raw is None:
+        return None
+
+    versions = []
+    for version in raw.iterfind(f'{RAW_NS}version'):
+        versions.append({
+            'version': version.get('version'),
+            'date': _parse_version_date(_text(version, f'{RAW_NS}date')),
+        })
+    authors = _text(raw, f'{RAW_NS}authors')
+    return {
+        'arxiv_id': _text(raw, f'{RAW_NS}id'),
+        'title': _text(raw, f'{RAW_NS}title'),
+        'authors': [author.strip() for author in AUTHOR_SPLIT_RE.split(authors) if author.strip()],
+        'abstract': _text(raw, f'{RAW_NS}abstract'),
+        'categories': _text(raw, f'{RAW_NS}categories').split(),
+        'versions': versions,
+        # 首次提交日期作为发布日期
+        'published_date': versions[0]['date'] if versions else None,
+        'datestamp': _text(header, f'{OAI_NS}datestamp') if header is not None else '',
+    }
+
+
+def iterparse_oai(source):
+    """流式解析OAI-PMH ListRecords响应
+
+    依次产出 ('record', 论文记录)，最后产出 ('token', 续传令牌或None)；
+    出错时产出 ('error', (错误码, 错误信息))。每条记录解析后立即释放对应的XML节点，
+    不会在内存中构建整棵文档树。
+    """
+    token = None
+    tags = (f'{OAI_NS}record', f'{OAI_NS}resumptionToken', f'{OAI_NS}error')
+    for _, element in etree.iterparse(source, events=('end',), tag=tags):
+        if element.tag == f'{OAI_NS}record':
+            record = _parse_record(element)
+            if record is not None:
+                yield 'record', record
+        elif element.tag == f'{OAI_NS}resumptionToken':
+            token = (element.text or '').strip() or None
+        else:
+            yield 'error', (element.get('code'), (element.text or '').strip())
+        # 释放已处理的节点及其之前的兄弟节点
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    yield 'token', token
@@ -1,29 +1,197 @@
+import time
+from collections import deque
 from datetime import datetime
+from twisted.internet.defer import Deferred
+from twisted.internet.task import deferLater
+from twisted.internet.threads import deferToThread
+from scrapy.utils.defer import maybe_deferred_to_future
 # from ..models import Paper, db
 from ..utils.db_utils import db_manager
+from ..utils.search_index import search_index
+from ..settings import (PIPELINE_BATCH_SIZE, PIPELINE_BATCH_INTERVAL, SEARCH_INDEX_ENABLED,
+                        EMBEDDING_ENABLED, DOWNLOAD_PIPELINED)
+
+# 下载调度器队列已满时，管道等待空位的轮询间隔(秒)
+SCHEDULER_POLL_INTERVAL = 0.1
+
+# 自定义信号: 爬虫保存断点前发送，管道收到后立即写入缓冲区中的论文
+flush_requested = object()
 
 class PaperPipeline:
+    def __init__(self, batch_size=PIPELINE_BATCH_SIZE, batch_interval=PIPELINE_BATCH_INTERVAL,
+                 index_enabled=SEARCH_INDEX_ENABLED, pipelined_downloads=DOWNLOAD_PIPELINED):
+        # batch_size <= 1 时逐条保存，否则按批次或时间窗口缓冲写入
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.index_enabled = index_enabled
+        self.pipelined_downloads = pipelined_downloads
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        # 已入库、等待交给下载调度器的论文
+        self.pending_downloads = deque()
+        self.scheduler = None
+        # 正在向调度器提交论文时，等待提交完成的其他协程
+        self.schedule_waiters = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        crawler.signals.connect(pipeline.on_flush_requested, signal=flush_requested)
+        return pipeline
+    
+    def on_flush_requested(self, spider):
+        """爬虫请求时写入缓冲区，保证断点之前产出的论文都已入库"""
+        if hasattr(self, 'db_session'):
+            self.flush(spider)
+    
     def open_spider(self, spider):
-        """爬虫启动时创建数据库会话"""
+        """爬虫启动时创建数据库会话，爬虫需要下载PDF时创建下载调度器"""
         self.db_session = db_manager.get_session()
         spider.logger.info("管道已创建数据库会话")
+        # 默认关闭，只在爬虫关闭时写入下载队列，可以通过 -s DOWNLOAD_PIPELINED=True 开启
+        pipelined = spider.settings.getbool('DOWNLOAD_PIPELINED', self.pipelined_downloads)
+        if pipelined and hasattr(spider, 'wants_download'):
+            from ..utils.downloader import paper_downloader
+            from ..utils.download_scheduler import DownloadScheduler
+            self.scheduler = DownloadScheduler(paper_downloader)
+        # 分片爬取时由编排任务在全部分片结束后统一向量化
+        self.embedding_enabled = spider.settings.getbool('EMBEDDING_ENABLED', EMBEDDING_ENABLED)
     
-    def close_spider(self, spider):
-        """爬虫关闭时关闭数据库会话"""
+    async def close_spider(self, spider):
+        """爬虫关闭时写入缓冲区中剩余的论文，等待流水线下载完成，为新论文生成向量并关闭数据库会话"""
         if hasattr(self, 'db_session'):
+            self.flush(spider)
+            if self.scheduler is not None:
+                # 在线程中等待下载完成，不阻塞reactor
+                await maybe_deferred_to_future(deferToThread(self._drain_downloads, spider))
+            if self.embedding_enabled:
+                self._embed_new_papers(spider)
             self.db_session.close()
             spider.logger.info("管道已关闭数据库会话")
     
     async def process_item(self, item, spider):
         """处理爬取的论文项"""
+        if self.batch_size > 1:
+            self.buffer.append(dict(item))
+            if (len(self.buffer) >= self.batch_size
+                    or time.monotonic() - self.last_flush >= self.batch_interval):
+                self.flush(spider)
+            await self._schedule_downloads()
+            return item
+        
         try:
-            success, message = db_manager.save_paper(self.db_session, dict(item))
+            changed, revised = db_manager.changed_papers(self.db_session, [dict(item)])
+            if not changed:
+                spider.logger.debug(f"论文未变化: {item['arxiv_id']}")
+                return item
+            success, message = db_manager.save_paper(self.db_session, changed[0])
             if success:
-                spider.logger.info(f"保存论文成功: {item['arxiv_id']}")
+                spider.logger.info(f"保存论文成功: {item['arxiv_id']} ({message})")
+                self._after_save(changed, spider)
+                self._requeue_revised(revised, spider)
+                await self._schedule_downloads()
             else:
                 spider.logger.info(f"保存论文失败: {item['arxiv_id']} - {message}")
             return item
         except Exception as e:
             spider.logger.error(f"处理论文项时出错: {str(e)}")
             self.db_session.rollback()
-            return item
\ No newline at end of file
+            return item
+    
+    def flush(self, spider):
+        """将缓冲区中新增或变化的论文批量写入数据库，未变化的论文不写库"""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        try:
+            changed, revised = db_manager.changed_papers(self.db_session, batch)
+            saved, errors = db_manager.save_papers(self.db_session, changed) if changed else (0, [])
+            spider.logger.info(f"批量保存论文: 成功 {saved} 篇, 未变化 {len(batch) - len(changed)} 篇, "
+                               f"失败 {len(errors)} 篇")
+            spider.crawler.stats.inc_value('pipeline/papers_unchanged', len(batch) - len(changed))
+            for arxiv_id, message in errors:
+                spider.logger.info(f"保存论文失败: {arxiv_id} - {message}")
+            failed_ids = {arxiv_id for arxiv_id, _ in errors}
+            self._after_save([data for data in changed if data['arxiv_id'] not in failed_ids], spider)
+            self._requeue_revised([arxiv_id for arxiv_id in revised if arxiv_id not in failed_ids], spider)
+        except Exception as e:
+            spider.logger.error(f"批量保存论文时出错: {str(e)}")
+            self.db_session.rollback()
+    
+    def _requeue_revised(self, arxiv_ids, spider):
+        """论文出现新版本时重新下载PDF，调度器或其他worker正在下载的任务持有租约，不会被重置"""
+        if not arxiv_ids:
+            return
+        from ..utils.download_queue import download_queue
+        count = download_queue.requeue(self.db_session, arxiv_ids)
+        spider.logger.info(f"{len(arxiv_ids)} 篇论文出现新版本，重新加入下载队列 {count} 篇")
+        spider.crawler.stats.inc_value('pipeline/papers_revised', len(arxiv_ids))
+    
+    def _after_save(self, papers_data, spider):
+        """论文入库后更新检索索引，并把需要下载的论文加入待下载列表"""
+        self._index_papers(papers_data, spider)
+        if self.scheduler is not None:
+            self.pending_downloads.extend(data for data in papers_data if spider.wants_download(data))
+    
+    async def _schedule_downloads(self):
+        """把待下载的论文交给调度器，调度器队列已满时暂停处理新论文，使爬取速度与下载速度匹配
+        
+        同一时间只有一个协程轮询调度器，其余协程等待它提交完成，避免大量协程同时轮询。
+        """
+        if self.scheduler is None or not self.pending_downloads:
+            return
+        if self.schedule_waiters is not None:
+            waiter = Deferred()
+            self.schedule_waiters.append(waiter)
+            await maybe_deferred_to_future(waiter)
+            return
+        from twisted.internet import reactor
+        self.schedule_waiters = []
+        try:
+            while self.pending_downloads:
+                if self.scheduler.offer(self.pending_downloads[0]):
+                    self.pending_downloads.popleft()
+                else:
+                    await maybe_deferred_to_future(deferLater(reactor, SCHEDULER_POLL_INTERVAL, lambda: None))
+        finally:
+            waiters, self.schedule_waiters = self.schedule_waiters, None
+            for waiter in waiters:
+                waiter.callback(None)
+    
+    def _drain_downloads(self, spider):
+        """提交剩余的论文并等待调度器中的下载全部完成"""
+        start = time.monotonic()
+        while self.pending_downloads:
+            self.scheduler.submit(self.pending_downloads.popleft())
+        results = self.scheduler.close()
+        # 释放下载器的线程池或事件循环和连接池
+        self.scheduler.downloader.close()
+        drain_seconds = time.monotonic() - start
+        spider.logger.info(f"流水线下载完成: 成功 {results.get('completed', 0)} 篇, "
+                           f"失败 {results.get('failed', 0)} 篇, 已由其他worker领取或已完成 "
+                           f"{results.get('skipped', 0)} 篇, 关闭时等待 {drain_seconds:.1f}s")
+        stats = spider.crawler.stats
+        stats.set_value('download_scheduler/completed', results.get('completed', 0))
+        stats.set_value('download_scheduler/failed', results.get('failed', 0))
+        stats.set_value('download_scheduler/skipped', results.get('skipped', 0))
+        stats.set_value('download_scheduler/drain_seconds', round(drain_seconds, 3))
+    
+    def _index_papers(self, papers_data, spider):
+        """将已保存的论文增量写入全文检索索引，索引出错不影响入库"""
+        if not self.index_enabled or not papers_data:
+            return
+        try:
+            search_index.add_papers(papers_data)
+        except Exception as e:
+            spider.logger.error(f"更新检索索引时出错: {str(e)}")
+    
+    def _embed_new_papers(self, spider):
+        """为尚未向量化的论文批量生成向量并回写vector_id"""
+        try:
+            from ..utils.vector_index import EmbeddingStage
+            count = EmbeddingStage().run(self.db_session)
+            spider.logger.info(f"已为 {count} 篇论文生成向量")
+        except Exception as e:
+            spider.logger.error(f"生成论文向量时出错: {str(e)}")
+            self.db_session.rollback()
@@ -0,0 +1,265 @@
+import time
+import asyncio
+import threading
+from urllib.parse import urlparse
+import aiohttp
+from .db_utils import db_manager
+from .downloader import PaperDownloader
+from .progress import progress_tracker
+from .metrics import DOWNLOAD_BYTES, DOWNLOAD_RETRIES, DOWNLOAD_QUEUE_DEPTH
+from .rate_limiter import get_rate_limiter
+from ..models.paper_download import PaperDownload
+from ..settings import (DOWNLOAD_RETRY_TIMES, DOWNLOAD_RETRY_DELAY, DOWNLOAD_TIMEOUT, DOWNLOAD_ASYNC_MAX_CONCURRENCY,
+                      DOWNLOAD_PER_HOST_CONCURRENCY)
+
+# 写入临时文件前在内存中缓冲的字节数
+WRITE_BUFFER_SIZE = 256 * 1024
+
+class HostLimiter:
+    """单个主机的并发数限制，请求速率由共享的自适应限速器控制"""
+
+    def __init__(self, concurrency, rate_limiter=None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = rate_limiter
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+    def feedback(self, status, latency, retry_after):
+        if self.rate_limiter is not None:
+            self.rate_limiter.feedback(status, latency, retry_after)
+
+class AsyncPaperDownloader(PaperDownloader):
+    """基于asyncio的下载引擎
+
+    所有下载在一个后台事件循环线程中运行，共享一个保持长连接的连接池，
+    按主机限制并发数和请求速率。download_papers 与线程引擎接口一致，返回 Future 列表。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.max_concurrency = DOWNLOAD_ASYNC_MAX_CONCURRENCY
+        self.loop = None
+        self.loop_thread = None
+        self.http_session = None
+        self.semaphore = None
+        self.host_limiters = {}
+        self.loop_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        """首次使用时启动后台事件循环线程"""
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self.loop.run_forever,
+                                                    name='paper-downloader-loop', daemon=True)
+                self.loop_thread.start()
+        return self.loop
+
+    def _get_http_session(self):
+        """在事件循环线程内创建共享的HTTP会话和连接池"""
+        if self.http_session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                                             limit_per_host=DOWNLOAD_PER_HOST_CONCURRENCY,
+                                             keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(sock_connect=DOWNLOAD_TIMEOUT, sock_read=DOWNLOAD_TIMEOUT)
+            self.http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.http_session
+
+    def _get_host_limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.host_limiters:
+            self.host_limiters[host] = HostLimiter(DOWNLOAD_PER_HOST_CONCURRENCY, get_rate_limiter(url))
+        return self.host_limiters[host]
+
+    def _begin_record(self, paper):
+        """创建或获取下载记录并标记为downloading，返回 (记录ID, 下载路径)，已下载时返回None"""
+        session = db_manager.get_session()
+        try:
+            download_record = session.query(PaperDownload).filter_by(paper_id=paper.id).first()
+            if not download_record:
+                download_record = PaperDownload(paper_id=paper.id)
+                session.add(download_record)
+            elif self._is_downloaded(download_record):
+                return None
+            download_record.download_status = 'downloading'
+            download_record.download_progress = 0
+            download_record.download_path = self.get_download_path(paper)
+            session.commit()
+            return download_record.id, download_record.download_path
+        finally:
+            session.close()
+
+    def _finish_record(self, record_id, status, error=None, content_hash=None, file_size=None):
+        """写入下载的最终状态"""
+        session = db_manager.get_session()
+        try:
+            download_record = session.get(PaperDownload, record_id)
+            download_record.download_status = status
+            if status == 'completed':
+                download_record.download_progress = 100
+                download_record.content_hash = content_hash
+                download_record.file_size = file_size
+                download_record.processed_at = None
+            download_record.download_error = error
+            session.commit()
+        finally:
+            session.close()
+
+    def _prepare_resume(self, temp_path):
+        """读取续传状态并构造请求头，返回 (续传状态, 请求头, 已下载字节数)"""
+        state = self._load_resume_state(temp_path)
+        headers, offset = self._resume_headers(temp_path, state)
+        return state, headers, offset
+
+    def _write_block(self, f, hasher, chunks):
+        """把缓冲的数据块写入临时文件并更新哈希"""
+        block = b''.join(chunks)
+        f.write(block)
+        hasher.update(block)
+
+    async def _fetch(self, paper, temp_path):
+        """下载一次到临时文件，存在有效的临时文件时从断点续传
+
+        边下载边计算哈希，返回 (本次传输的字节数, 文件SHA-256, 文件大小)。
+        文件读写、哈希计算和进度写库都在线程池中执行，不阻塞事件循环。
+        """
+        loop = asyncio.get_running_loop()
+        http_session = self._get_http_session()
+        state, headers, offset = await loop.run_in_executor(None, self._prepare_resume, temp_path)
+        host_limiter = self._get_host_limiter(paper.pdf_url)
+        async with host_limiter:
+            requested = time.monotonic()
+            async with http_session.get(paper.pdf_url, headers=headers) as response:
+                host_limiter.feedback(response.status, time.monotonic() - requested, response.headers.get('Retry-After'))
+                # 临时文件已包含完整内容
+                if response.status == 416 and offset and offset == state.get('total_size'):
+                    return 0, await loop.run_in_executor(None, self.store.hash_file, temp_path), offset
+                if response.status == 416:
+                    # 续传位置超出远端文件或缺少文件总大小，保留临时文件会一直发送同样的Range
+                    await loop.run_in_executor(None, self._discard_partial, temp_path)
+                response.raise_for_status()
+                try:
+                    append, total_size = self._check_resume(response.status, response.headers, state, offset)
+                except IOError:
+                    await loop.run_in_executor(None, self._discard_partial, temp_path)
+                    raise
+                if not append:
+                    offset = 0
+                await loop.run_in_executor(None, self._save_resume_state, temp_path, {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'total_size': total_size,
+                })
+
+                downloaded_size = offset
+                hasher = await loop.run_in_executor(None, self.store.hasher, temp_path if append else None)
+                f = await loop.run_in_executor(None, open, temp_path, 'ab' if append else 'wb')
+                try:
+                    # 攒够一批数据块再交给线程池写入，减少线程切换
+                    chunks = []
+                    buffered = 0
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        chunks.append(chunk)
+                        buffered += len(chunk)
+                        downloaded_size += len(chunk)
+                        DOWNLOAD_BYTES.inc(len(chunk))
+                        if buffered >= WRITE_BUFFER_SIZE:
+                            await loop.run_in_executor(None, self._write_block, f, hasher, chunks)
+                            chunks, buffered = [], 0
+                        if progress_tracker.update(paper.id, downloaded_size, total_size, flush=False):
+                            loop.run_in_executor(None, progress_tracker.flush)
+                    if chunks:
+                        await loop.run_in_executor(None, self._write_block, f, hasher, chunks)
+                finally:
+                    await loop.run_in_executor(None, f.close)
+
+        if total_size and downloaded_size != total_size:
+            raise IOError(f"下载不完整: {downloaded_size}/{total_size} 字节")
+        return downloaded_size - offset, hasher.hexdigest(), downloaded_size
+
+    async def download_paper_async(self, paper):
+        """下载单个论文"""
+        loop = asyncio.get_running_loop()
+        if not paper.pdf_url:
+            await loop.run_in_executor(None, self._mark_failed, paper.id, "PDF URL不存在")
+            return False, "PDF URL不存在"
+
+        self._get_http_session()
+        async with self.semaphore:
+            record = await loop.run_in_executor(None, self._begin_record, paper)
+            if record is None:
+                return True, "论文已下载"
+            record_id, download_path = record
+            progress_tracker.start(paper.id, record_id)
+            temp_path = download_path + '.tmp'
+            started = time.perf_counter()
+            received = 0
+            try:
+                # 重试覆盖整个传输过程，失败后从断点继续，等待时间指数退避
+                for retry in range(DOWNLOAD_RETRY_TIMES):
+                    try:
+                        transferred, content_hash, file_size = await self._fetch(paper, temp_path)
+                        received += transferred
+                        break
+                    except Exception:
+                        if retry < DOWNLOAD_RETRY_TIMES - 1:
+                            DOWNLOAD_RETRIES.inc()
+                            await asyncio.sleep(DOWNLOAD_RETRY_DELAY * (2 ** retry))
+                            continue
+                        raise
+
+                # 下载完成后放入内容寻址存储，相同内容只保存一份
+                await loop.run_in_executor(None, self.store.commit, temp_path, content_hash, download_path)
+                await loop.run_in_executor(None, self._discard_partial, temp_path)
+                progress_tracker.finish(paper.id)
+                await loop.run_in_executor(None, self._finish_record, record_id, 'completed', None,
+                                           content_hash, file_size)
+                self._observe_download('completed', started, received)
+                return True, "下载成功"
+
+            except Exception as e:
+                progress_tracker.finish(paper.id)
+                # 保留临时文件，下次下载时从断点续传
+                await loop.run_in_executor(None, self._finish_record, record_id, 'failed', str(e)[:500])
+                self._observe_download('failed', started)
+                return False, str(e)
+
+    def download_paper(self, paper):
+        """同步下载单个论文，阻塞直到完成"""
+        return self.download_papers([paper])[0].result()
+
+    def download_papers(self, papers):
+        """批量下载论文"""
+        loop = self._ensure_loop()
+        futures = []
+        for paper in papers:
+            future = asyncio.run_coroutine_threadsafe(self.download_paper_async(paper), loop)
+            DOWNLOAD_QUEUE_DEPTH.inc()
+            future.add_done_callback(lambda _: DOWNLOAD_QUEUE_DEPTH.dec())
+            futures.append(future)
+        return futures
+
+    def close(self):
+        """关闭连接池并停止事件循环，之后再次下载时重新创建"""
+        with self.loop_lock:
+            loop, self.loop = self.loop, None
+        if loop is not None:
+            if self.http_session is not None:
+                asyncio.run_coroutine_threadsafe(self.http_session.close(), loop).result()
+                self.http_session = None
+            loop.call_soon_threadsafe(loop.stop)
+            self.loop_thread.join()
+            loop.close()
+            # 信号量绑定在旧的事件循环上
+            self.host_limiters = {}
+        super().close()
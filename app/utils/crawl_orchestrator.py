@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from ..settings import CRAWL_SHARD_SIZE, CRAWL_MAX_PARALLEL, CRAWL_SHARD_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# 项目根目录，子进程从这里导入app包
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# 合并分片统计时取最小值/最大值的键，其余数值求和
+MIN_STATS = {'start_time'}
+MAX_STATS = {'finish_time', 'elapsed_time_seconds', 'memusage/max', 'memusage/startup'}
+# 指标汇总中的平均值和分位数无法相加，取各分片的最大值
+MAX_STAT_SUFFIXES = ('/avg', '/p50', '/p95')
+
+
+def shard_categories(categories, shard_size=CRAWL_SHARD_SIZE):
+    """把分类列表按 shard_size 切分为分片，每个分片是逗号分隔的分类字符串"""
+    if isinstance(categories, str):
+        categories = [c.strip() for c in categories.split(',') if c.strip()]
+    shard_size = max(1, int(shard_size))
+    return [','.join(categories[i:i + shard_size]) for i in range(0, len(categories), shard_size)]
+
+
+def plan_lanes(shards, max_parallel=CRAWL_MAX_PARALLEL):
+    """把分片轮流分配到至多 max_parallel 条通道，同一通道内的分片依次运行"""
+    lanes = [[] for _ in range(min(max(1, int(max_parallel)), len(shards)))]
+    for i, shard in enumerate(shards):
+        lanes[i % len(lanes)].append(shard)
+    return lanes
+
+
+def run_shard(categories, days_back=1, base_url=None, timeout=CRAWL_SHARD_TIMEOUT, settings=None):
+    """在独立子进程中运行一次 scrapy crawl arxiv，返回该分片的结果字典
+
+    每次爬取使用新的进程和Twisted reactor，可以在同一个Celery worker中反复执行。
+    子进程继承当前工作目录和环境变量(如DB_URL)，相对路径的配置与进程内爬取一致。
+    """
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE='app.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_file = os.path.join(tmp, 'stats.json')
+        command = [sys.executable, '-m', 'scrapy', 'crawl', 'arxiv',
+                   '-a', f'categories={categories}', '-a', f'days_back={days_back}',
+                   '-s', f'STATS_FILE={stats_file}',
+                   # 多个分片同时运行时不各自覆盖指标文件，指标汇总随统计信息返回
+                   '-s', 'METRICS_FILE=',
+                   # 向量化在全部分片结束后由 embed_new_papers 任务执行一次，分片之间不争用向量索引
+                   '-s', 'EMBEDDING_ENABLED=False']
+        if base_url:
+            command += ['-a', f'base_url={base_url}']
+        for key, value in (settings or {}).items():
+            command += ['-s', f'{key}={value}']
+
+        result = {'categories': categories, 'status': 'success', 'stats': {}}
+        try:
+            process = subprocess.run(command, env=env, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.error(f"分片 {categories} 爬取超时({timeout}秒)")
+            result.update(status='error', error=f'timeout after {timeout}s')
+            return result
+
+        result['returncode'] = process.returncode
+        if os.path.exists(stats_file):
+            with open(stats_file) as f:
+                result['stats'] = json.load(f)
+        if process.returncode != 0 or not result['stats']:
+            # 只保留日志末尾，避免结果过大
+            result.update(status='error', error=process.stderr[-2000:])
+            logger.error(f"分片 {categories} 爬取失败, 返回码 {process.returncode}")
+        return result
+
+
+def merge_stats(results):
+    """汇总各分片的结果，返回 (合并后的统计, 失败的分片列表)"""
+    merged = {}
+    failed = []
+    for result in results:
+        if result.get('status') != 'success':
+            failed.append(result.get('categories'))
+        for key, value in result.get('stats', {}).items():
+            if key in MIN_STATS:
+                merged[key] = min(merged.get(key, value), value)
+            elif key in MAX_STATS or key.endswith(MAX_STAT_SUFFIXES):
+                merged[key] = max(merged.get(key, value), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+    merged['shards'] = len(results)
+    merged['failed_shards'] = len(failed)
+    return merged, failed
@@ -1,13 +1,30 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
+import re
+import time
+import hashlib
+import logging
+import threading
+from sqlalchemy import (create_engine, event, insert, case, Column, Integer, String, Text, DateTime, Float,
+                        Boolean, ForeignKey, Index)
+from sqlalchemy.dialects import mysql
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, Session
 from datetime import datetime
 import json
+from .metrics import DB_QUERY_SECONDS, DB_COMMIT_SECONDS
+from ..settings import (DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE,
+                        DB_SQLITE_WAL)
+
+logger = logging.getLogger(__name__)
 
 # 创建基类
 Base = declarative_base()
 
+def _binary_string(length):
+    """区分大小写和重音的字符串列，MySQL默认排序规则下 'José' 与 'jose' 会违反唯一约束"""
+    return String(length).with_variant(mysql.VARCHAR(length, charset='utf8mb4', collation='utf8mb4_bin'), 'mysql')
+
 # 定义Paper模型类
 class Paper(Base):
     __tablename__ = 'papers'
@@ -18,35 +35,214 @@ class Paper(Base):
     institutions = Column(Text)  # JSON格式存储
     abstract = Column(Text, nullable=False)
     pdf_url = Column(String(200))
-    published_date = Column(DateTime, nullable=False)
+    published_date = Column(DateTime, nullable=False, index=True)
     categories = Column(String(200))  # 以逗号分隔的分类列表
     vector_id = Column(String(50))  # Milvus中的向量ID
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer)  # 已知的最新版本号，列表页没有版本信息时为空
+    content_hash = Column(String(32))  # 元数据摘要，重新爬取时用于判断论文是否变化
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # 增量导出按此列过滤和排序
+
+# 规范化的作者和分类表，与papers表中的JSON/逗号分隔字段同步维护，用于按作者、分类查询
+class Author(Base):
+    __tablename__ = 'authors'
+    id = Column(Integer, primary_key=True)
+    name = Column(_binary_string(200), unique=True, nullable=False)
+
+class PaperAuthor(Base):
+    __tablename__ = 'paper_authors'
+    paper_id = Column(Integer, ForeignKey('papers.id'), primary_key=True)
+    author_id = Column(Integer, ForeignKey('authors.id'), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)  # 作者排序
+    __table_args__ = (Index('ix_paper_authors_author_id', 'author_id', 'paper_id'),)
+
+class Category(Base):
+    __tablename__ = 'categories'
+    id = Column(Integer, primary_key=True)
+    code = Column(_binary_string(50), unique=True, nullable=False)  # 如 cs.CL
+    name = Column(String(200))  # 如 Computation and Language
+
+class PaperCategory(Base):
+    __tablename__ = 'paper_categories'
+    paper_id = Column(Integer, ForeignKey('papers.id'), primary_key=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    is_primary = Column(Boolean, nullable=False, default=False)
+    __table_args__ = (Index('ix_paper_categories_category_id', 'category_id', 'paper_id'),)
+
+CATEGORY_RE = re.compile(r'^(?P<name>.*?)\s*\((?P<code>[^()]+)\)\s*$')
+
+def parse_category(text):
+    """解析分类文本，'Computation and Language (cs.CL)' 和 'cs.CL' 都返回 (代码, 名称)"""
+    text = text.strip()
+    match = CATEGORY_RE.match(text)
+    if match:
+        return match.group('code').strip(), match.group('name').strip() or None
+    return text, None
+
+def as_list(value, separator=','):
+    """兼容列表、JSON字符串和分隔字符串三种存储形式"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        if value.startswith('['):
+            return json.loads(value)
+        return [part for part in value.split(separator) if part.strip()]
+    return list(value)
+
+# 逗号分隔存储的带名称分类，名称本身可能包含逗号，如 'Computational Engineering, Finance, and Science (cs.CE)'
+CATEGORY_ITEM_RE = re.compile(r'(?:^|,)\s*([^()]*?\([^()]+\))')
+
+def split_categories(value):
+    """拆分分类字段，逗号分隔的带名称分类按 '(代码)' 切分，不拆开名称中的逗号"""
+    if isinstance(value, str) and not value.startswith('[') and '(' in value:
+        return [item.strip() for item in CATEGORY_ITEM_RE.findall(value)]
+    return [item.strip() for item in as_list(value) if item.strip()]
+
+VERSION_RE = re.compile(r'^(?P<id>.+?)v(?P<version>\d+)$')
+
+def split_version(arxiv_id):
+    """拆分带版本号的arXiv ID，'2501.01234v2' 返回 ('2501.01234', 2)，没有版本号时版本为None"""
+    match = VERSION_RE.match(arxiv_id)
+    if match:
+        return match.group('id'), int(match.group('version'))
+    return arxiv_id, None
+
+def parse_version(value):
+    """把 'v2'、'2' 或 2 转换为整数版本号，无法解析时返回None"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(str(value).lstrip('vV'))
+    except ValueError:
+        return None
+
+def paper_content_hash(paper_data):
+    """论文元数据的摘要
+
+    只包含标题、作者、机构、摘要、分类和PDF链接。发布日期取自列表页的日期标题，版本号单独比较，都不参与计算。
+    """
+    categories = paper_data.get('categories')
+    parts = [
+        paper_data.get('title') or '',
+        json.dumps(as_list(paper_data.get('authors')), ensure_ascii=False),
+        json.dumps(as_list(paper_data.get('institutions')), ensure_ascii=False),
+        paper_data.get('abstract') or '',
+        ','.join(as_list(categories)) if categories else '',
+        paper_data.get('pdf_url') or '',
+    ]
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+def is_changed(content_hash, version, known):
+    """known 为数据库中的 (content_hash, version)，不存在时为None；元数据变化或出现更新的版本时返回True"""
+    if known is None:
+        return True
+    known_hash, known_version = known
+    if version is not None and known_version is not None and version < known_version:
+        # 过期的列表页中的旧版本
+        return False
+    return content_hash != known_hash or (version is not None and version != known_version)
+
+# 批量写入时遇到已存在论文需要更新的列
+UPSERT_COLUMNS = ['title', 'authors', 'institutions', 'abstract', 'pdf_url',
+                  'published_date', 'categories', 'version', 'content_hash', 'updated_at']
+
+class TimedSession(Session):
+    """记录提交耗时的会话"""
+    
+    def commit(self):
+        with DB_COMMIT_SECONDS.time():
+            super().commit()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('query_start', None)
+    if start is None:
+        return
+    DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=statement.lstrip()[:6].upper())
+
+def _enable_sqlite_wal(dbapi_conn, connection_record):
+    """WAL模式保存在数据库文件中，只需在第一个连接上设置"""
+    dbapi_conn.execute('PRAGMA journal_mode=WAL')
+
+def _configure_sqlite(dbapi_conn, connection_record):
+    dbapi_conn.execute('PRAGMA synchronous=NORMAL')
+    dbapi_conn.execute('PRAGMA busy_timeout=30000')
+
+def default_db_url():
+    """环境变量 DB_URL 优先，其次是配置中的 DB_URL，最后根据环境变量拼接MySQL地址"""
+    db_url = os.environ.get('DB_URL') or DB_URL
+    if db_url:
+        return db_url
+    db_user = os.environ.get('DB_USER', 'root')
+    db_password = os.environ.get('DB_PASSWORD', 'root1234')
+    db_host = os.environ.get('DB_HOST', 'localhost')
+    db_port = os.environ.get('DB_PORT', '3306')
+    db_name = os.environ.get('DB_NAME', 'paper_assistant')
+    return f'mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
 
 class DBManager:
-    """数据库管理器，提供独立的数据库会话"""
-    
-    def __init__(self):
-        # 从环境变量或配置文件获取数据库连接信息
-        db_user = os.environ.get('DB_USER', 'root')
-        db_password = os.environ.get('DB_PASSWORD', 'root1234')
-        db_host = os.environ.get('DB_HOST', 'localhost')
-        db_port = os.environ.get('DB_PORT', '3306')
-        db_name = os.environ.get('DB_NAME', 'paper_assistant')
-        
-        # 创建数据库连接
-        self.engine = create_engine(
-            f'mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}',
-            pool_recycle=3600,
-            echo=False
-        )
-        
-        # 创建会话工厂
-        self.Session = sessionmaker(bind=self.engine)
+    """数据库管理器，提供独立的数据库会话
+
+    引擎和会话工厂在第一次使用时创建，导入模块不会加载数据库驱动或建立连接池。
+    进程fork后子进程丢弃继承的连接，按需重新连接。
+    """
+    
+    def __init__(self, db_url=None):
+        # 显式传入db_url时使用指定的数据库，否则在创建引擎时读取配置和环境变量
+        self.db_url = db_url
+        self._engine = None
+        self._session_factory = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _engine_options(self, url):
+        options = {'pool_recycle': DB_POOL_RECYCLE, 'echo': False}
+        if url.get_backend_name() != 'sqlite':
+            # 本地SQLite文件不存在连接被服务器断开的问题，不需要预检
+            options['pool_pre_ping'] = DB_POOL_PRE_PING
+        # 内存SQLite每个连接是独立的数据库，使用SQLAlchemy默认的单连接池
+        if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+        return options
+    
+    def _connect(self):
+        with self._lock:
+            if self._engine is None:
+                url = make_url(self.db_url or default_db_url())
+                engine = create_engine(url, **self._engine_options(url))
+                if url.get_backend_name() == 'sqlite' and DB_SQLITE_WAL:
+                    event.listen(engine, 'first_connect', _enable_sqlite_wal)
+                    event.listen(engine, 'connect', _configure_sqlite)
+                # 统计语句执行耗时
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+                self._session_factory = sessionmaker(bind=engine, class_=TimedSession)
+                self._engine = engine
+        return self._engine
+    
+    def _reset_after_fork(self):
+        """子进程不能使用父进程的连接，丢弃连接池但不关闭父进程仍在使用的连接"""
+        self._lock = threading.Lock()
+        if self._engine is not None:
+            self._engine.dispose(close=False)
+    
+    @property
+    def engine(self):
+        return self._engine if self._engine is not None else self._connect()
+    
+    @property
+    def Session(self):
+        """会话工厂"""
+        if self._session_factory is None:
+            self._connect()
+        return self._session_factory
     
     def create_tables(self):
         """创建所有表"""
+        # 导入其余模型，使其注册到Base.metadata
+        from ..models import paper_download, crawl_state  # noqa: F401
         Base.metadata.create_all(self.engine)
     
     def get_session(self):
@@ -57,28 +253,253 @@ class DBManager:
         """检查论文是否已存在"""
         return session.query(Paper.id).filter_by(arxiv_id=arxiv_id).scalar() is not None
     
+    def existing_versions(self, session, arxiv_ids, chunk_size=500):
+        """批量查询已存在论文的 (content_hash, version)，返回 {arxiv_id: (content_hash, version)}"""
+        arxiv_ids = list(arxiv_ids)
+        existing = {}
+        for start in range(0, len(arxiv_ids), chunk_size):
+            chunk = arxiv_ids[start:start + chunk_size]
+            rows = session.query(Paper.arxiv_id, Paper.content_hash, Paper.version) \
+                .filter(Paper.arxiv_id.in_(chunk))
+            existing.update((arxiv_id, (content_hash, version)) for arxiv_id, content_hash, version in rows)
+        return existing
+    
+    def load_versions(self, session, chunk_size=10000):
+        """分批加载数据库中所有论文的 (content_hash, version)"""
+        query = session.query(Paper.arxiv_id, Paper.content_hash, Paper.version).yield_per(chunk_size)
+        return {arxiv_id: (content_hash, version) for arxiv_id, content_hash, version in query}
+    
+    def changed_papers(self, session, papers_data):
+        """与数据库中的摘要和版本号批量比较，返回 (新增或变化的论文, 出现新版本的arxiv_id列表)
+        
+        没有版本信息的论文沿用数据库中的版本号，旧版本的过期数据视为未变化。
+        """
+        papers_data = list({data['arxiv_id']: data for data in papers_data}.values())
+        known = self.existing_versions(session, [data['arxiv_id'] for data in papers_data])
+        changed, revised = [], []
+        for data in papers_data:
+            current = known.get(data['arxiv_id'])
+            version = parse_version(data.get('version'))
+            if not is_changed(paper_content_hash(data), version, current):
+                continue
+            if current is not None and current[1] is not None:
+                if version is None:
+                    data = dict(data, version=current[1])
+                elif version > current[1]:
+                    revised.append(data['arxiv_id'])
+            changed.append(data)
+        return changed, revised
+    
+    def _paper_values(self, paper_data):
+        """将爬取的论文数据转换为papers表的列值"""
+        return {
+            'arxiv_id': paper_data['arxiv_id'],
+            'title': paper_data['title'],
+            'authors': json.dumps(paper_data['authors']),
+            'institutions': json.dumps(paper_data['institutions']),
+            'abstract': paper_data['abstract'],
+            'pdf_url': paper_data['pdf_url'],
+            'published_date': paper_data['published_date'],
+            'categories': ','.join(paper_data['categories']) if paper_data['categories'] else '',
+            'version': parse_version(paper_data.get('version')),
+            'content_hash': paper_content_hash(paper_data),
+        }
+    
+    def _upsert_updates(self, new):
+        """冲突时更新的列，new 为新行的列集合(inserted/excluded)
+
+        内容哈希变化时清空 vector_id，由向量化阶段重新生成向量。MySQL按顺序执行赋值，
+        vector_id 必须在 content_hash 之前比较。
+        """
+        updates = {'vector_id': case((Paper.content_hash == new.content_hash, Paper.vector_id), else_=None)}
+        updates.update((column, new[column]) for column in UPSERT_COLUMNS)
+        return updates
+    
+    def _upsert_statement(self, rows):
+        """根据数据库方言构造插入或更新语句，不支持的方言返回None
+
+        rows 作为executemany参数和语句一起执行，语句不随行数变化，编译结果可以缓存复用。
+        """
+        dialect = self.engine.dialect.name
+        now = datetime.utcnow()
+        for row in rows:
+            row.setdefault('created_at', now)
+            row['updated_at'] = now
+        
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(Paper)
+            return stmt.on_duplicate_key_update(list(self._upsert_updates(stmt.inserted).items()))
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(Paper)
+            return stmt.on_conflict_do_update(
+                index_elements=['arxiv_id'],
+                set_=self._upsert_updates(stmt.excluded)
+            )
+        return None
+    
+    def save_papers(self, session, papers_data):
+        """批量保存论文数据，每批执行一次批量插入或更新语句并只提交一次
+        
+        已存在的论文会更新元数据。整批写入失败时会拆分重试，
+        只有出错的单条记录被丢弃，返回 (成功条数, [(arxiv_id, 错误信息), ...])
+        """
+        papers_data = list(papers_data)
+        # 同一批次中重复的论文只保留最后一条
+        rows = list({data['arxiv_id']: self._paper_values(data) for data in papers_data}.values())
+        if not rows:
+            return 0, []
+        
+        stmt = self._upsert_statement(rows)
+        if stmt is None:
+            # 不支持批量upsert的数据库退回逐条保存
+            saved, errors = 0, []
+            for data in papers_data:
+                success, message = self.save_paper(session, data)
+                if success:
+                    saved += 1
+                else:
+                    errors.append((data['arxiv_id'], message))
+            return saved, errors
+        
+        try:
+            session.execute(stmt, rows)
+            try:
+                self.sync_links(session, papers_data)
+            except Exception as e:
+                # 不为每批开保存点: 关联失败时回滚整个事务，只重新写入论文
+                logger.error(f"同步作者/分类关联失败，论文已保存: {e}")
+                session.rollback()
+                session.execute(stmt, rows)
+            session.commit()
+            return len(rows), []
+        except Exception as e:
+            session.rollback()
+            if len(rows) == 1:
+                return 0, [(rows[0]['arxiv_id'], str(e))]
+        
+        # 二分拆批，隔离出错的记录
+        middle = len(papers_data) // 2
+        left_saved, left_errors = self.save_papers(session, papers_data[:middle])
+        right_saved, right_errors = self.save_papers(session, papers_data[middle:])
+        return left_saved + right_saved, left_errors + right_errors
+    
+    def _insert_ignore(self, model, key):
+        """构造遇到唯一键冲突时跳过的插入语句，其他进程同时插入了相同的作者/分类时不报错"""
+        dialect = self.engine.dialect.name
+        if dialect == 'mysql':
+            return insert(model).prefix_with('IGNORE')
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            return insert(model)
+        return dialect_insert(model).on_conflict_do_nothing(index_elements=[key])
+
+    def _get_or_create(self, session, model, key, values):
+        """按唯一键批量获取或创建作者/分类，values为 {键值: 其他列}，返回 {键值: id}
+
+        插入时跳过已存在的键再重新查询。数据库排序规则不区分大小写或重音时(未迁移的MySQL表)，
+        与已有行只差大小写的键查不到自己的行，不出现在返回值中。
+        """
+        column = getattr(model, key)
+        ids = {}
+        keys = list(values)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            ids.update((k, i) for k, i in session.query(column, model.id).filter(column.in_(chunk)) if k in values)
+        missing = [k for k in keys if k not in ids]
+        if missing:
+            session.execute(self._insert_ignore(model, key), [{key: k, **values[k]} for k in missing])
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                ids.update((k, i) for k, i in session.query(column, model.id).filter(column.in_(chunk)) if k in values)
+            unresolved = [k for k in missing if k not in ids]
+            if unresolved:
+                logger.warning(f"{model.__tablename__} 中有 {len(unresolved)} 个键与已有行冲突，跳过关联: {unresolved[:5]}")
+        return ids
+
+    def _sync_links_isolated(self, session, papers_data):
+        """在保存点中同步作者/分类关联，失败时只回滚关联，论文照常保存"""
+        try:
+            with session.begin_nested():
+                self.sync_links(session, papers_data)
+        except Exception as e:
+            logger.error(f"同步作者/分类关联失败，论文已保存: {e}")
+    
+    def sync_links(self, session, papers_data):
+        """根据论文的作者和分类字段重建 paper_authors/paper_categories 关联，调用方负责提交"""
+        papers_data = {data['arxiv_id']: data for data in papers_data}
+        paper_ids = dict(session.query(Paper.arxiv_id, Paper.id).filter(Paper.arxiv_id.in_(list(papers_data))))
+        if not paper_ids:
+            return
+        
+        authors = {}
+        categories = {}
+        parsed = {}
+        for arxiv_id, data in papers_data.items():
+            names = [name.strip()[:200] for name in as_list(data.get('authors')) if name.strip()]
+            cats = [parse_category(text) for text in split_categories(data.get('categories'))]
+            parsed[arxiv_id] = (names, cats)
+            authors.update((name, {}) for name in names)
+            for code, name in cats:
+                if name or code not in categories:
+                    categories[code] = {'name': name}
+        
+        author_ids = self._get_or_create(session, Author, 'name', authors)
+        category_ids = self._get_or_create(session, Category, 'code', categories)
+        
+        ids = list(paper_ids.values())
+        session.query(PaperAuthor).filter(PaperAuthor.paper_id.in_(ids)).delete(synchronize_session=False)
+        session.query(PaperCategory).filter(PaperCategory.paper_id.in_(ids)).delete(synchronize_session=False)
+        author_rows, category_rows = [], []
+        for arxiv_id, (names, cats) in parsed.items():
+            paper_id = paper_ids.get(arxiv_id)
+            if paper_id is None:
+                continue
+            # 同一篇论文中重复出现的作者或分类只保留第一次
+            # 没有解析到ID的作者或分类跳过
+            author_list = dict.fromkeys(author_ids[name] for name in names if name in author_ids)
+            for position, author_id in enumerate(author_list):
+                author_rows.append({'paper_id': paper_id, 'author_id': author_id, 'position': position})
+            category_list = dict.fromkeys(category_ids[code] for code, _ in cats if code in category_ids)
+            for index, category_id in enumerate(category_list):
+                category_rows.append({'paper_id': paper_id, 'category_id': category_id, 'is_primary': index == 0})
+        if author_rows:
+            session.execute(insert(PaperAuthor), author_rows)
+        if category_rows:
+            session.execute(insert(PaperCategory), category_rows)
+    
     def save_paper(self, session, paper_data):
-        """保存论文数据"""
+        """保存论文数据，已存在的论文只在元数据变化或出现新版本时更新"""
         try:
-            # 检查论文是否已存在
-            if not self.paper_exists(session, paper_data['arxiv_id']):
+            paper = session.query(Paper).filter_by(arxiv_id=paper_data['arxiv_id']).first()
+            values = self._paper_values(paper_data)
+            if paper is None:
                 # 创建新的论文记录
-                paper = Paper(
-                    arxiv_id=paper_data['arxiv_id'],
-                    title=paper_data['title'],
-                    authors=json.dumps(paper_data['authors']),
-                    institutions=json.dumps(paper_data['institutions']),
-                    abstract=paper_data['abstract'],
-                    pdf_url=paper_data['pdf_url'],
-                    published_date=paper_data['published_date'],
-                    categories=','.join(paper_data['categories']) if paper_data['categories'] else ''
-                )
-                
+                paper = Paper(**values)
                 session.add(paper)
-                session.commit()
-                return True, "保存成功"
+                message = "保存成功"
+            elif not is_changed(values['content_hash'], values['version'], (paper.content_hash, paper.version)):
+                return False, "论文未变化"
             else:
-                return False, "论文已存在"
+                if values['version'] is None:
+                    values['version'] = paper.version
+                if values['content_hash'] != paper.content_hash:
+                    # 元数据变化后旧向量失效，等待重新向量化
+                    values['vector_id'] = None
+                for column, value in values.items():
+                    setattr(paper, column, value)
+                message = "更新成功"
+            session.flush()
+            self._sync_links_isolated(session, [paper_data])
+            session.commit()
+            return True, message
         except Exception as e:
             session.rollback()
             return False, str(e)
@@ -0,0 +1,236 @@
+import os
+import time
+import socket
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, case, select, update, func
+from sqlalchemy.exc import IntegrityError
+from .db_utils import db_manager, Paper
+from .metrics import metrics
+from ..models.paper_download import PaperDownload
+from ..settings import (DOWNLOAD_QUEUE_BATCH_SIZE, DOWNLOAD_QUEUE_LEASE_SECONDS,
+                      DOWNLOAD_QUEUE_MAX_ATTEMPTS, DOWNLOAD_QUEUE_POLL_INTERVAL, METRICS_FILE)
+
+class DownloadQueue:
+    """基于paper_downloads表的持久化下载队列
+
+    worker通过租约领取任务: 领取时写入 lease_owner/lease_expires_at，下载期间定期续期。
+    已完成的任务不会再被领取，未超过重试次数的failed任务和租约过期的downloading任务会被重新领取，
+    重试次数用尽后租约过期的任务标记为failed。
+    支持 SKIP LOCKED 的数据库(MySQL 8/PostgreSQL)在领取时跳过其他worker已锁定的行，
+    其他数据库依靠带条件的UPDATE保证同一任务只被一个worker领取。
+    """
+
+    def __init__(self, lease_seconds=DOWNLOAD_QUEUE_LEASE_SECONDS, max_attempts=DOWNLOAD_QUEUE_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, session, paper_ids, chunk_size=500):
+        """为没有下载记录的论文创建pending任务，返回新入队的数量"""
+        paper_ids = list(paper_ids)
+        added = 0
+        for start in range(0, len(paper_ids), chunk_size):
+            chunk = paper_ids[start:start + chunk_size]
+            existing = {row[0] for row in session.query(PaperDownload.paper_id)
+                        .filter(PaperDownload.paper_id.in_(chunk))}
+            new_ids = [paper_id for paper_id in chunk if paper_id not in existing]
+            if not new_ids:
+                continue
+            try:
+                session.add_all([PaperDownload(paper_id=paper_id, download_status='pending')
+                                 for paper_id in new_ids])
+                session.commit()
+                added += len(new_ids)
+            except IntegrityError:
+                # 其他进程同时入队了相同论文，逐条插入跳过重复项
+                session.rollback()
+                for paper_id in new_ids:
+                    try:
+                        session.add(PaperDownload(paper_id=paper_id, download_status='pending'))
+                        session.commit()
+                        added += 1
+                    except IntegrityError:
+                        session.rollback()
+        return added
+
+    def requeue(self, session, arxiv_ids):
+        """论文出现新版本时把已完成或失败的下载记录重置为pending，返回重新入队的数量
+
+        正在下载的记录不重置，没有下载记录的论文按原有规则在爬虫关闭时入队。
+        """
+        arxiv_ids = list(arxiv_ids)
+        if not arxiv_ids:
+            return 0
+        paper_ids = select(Paper.id).where(Paper.arxiv_id.in_(arxiv_ids))
+        count = session.query(PaperDownload).filter(
+            PaperDownload.paper_id.in_(paper_ids),
+            PaperDownload.download_status.in_(('completed', 'failed'))
+        ).update({
+            PaperDownload.download_status: 'pending',
+            PaperDownload.download_progress: 0,
+            PaperDownload.download_error: None,
+            PaperDownload.attempts: 0,
+        }, synchronize_session=False)
+        session.commit()
+        return count
+
+    def _claimable(self, now):
+        """可被领取的任务条件"""
+        return or_(
+            PaperDownload.download_status == 'pending',
+            # 迁移前的旧记录 attempts 可能为NULL
+            and_(PaperDownload.download_status == 'failed',
+                 func.coalesce(PaperDownload.attempts, 0) < self.max_attempts),
+            # 持有租约的worker已失联，反复导致worker退出的任务同样受重试次数限制
+            and_(self._stale(now), func.coalesce(PaperDownload.attempts, 0) < self.max_attempts),
+        )
+
+    def _stale(self, now):
+        """租约已过期的downloading任务"""
+        stale = now - timedelta(seconds=self.lease_seconds)
+        return and_(PaperDownload.download_status == 'downloading',
+                    or_(PaperDownload.lease_expires_at < now,
+                        and_(PaperDownload.lease_expires_at.is_(None), PaperDownload.updated_at < stale)))
+
+    def claim(self, session, worker_id, batch_size=DOWNLOAD_QUEUE_BATCH_SIZE, paper_ids=None):
+        """原子地领取一批任务，返回领取到的下载记录ID列表，指定 paper_ids 时只领取这些论文的任务"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        # 重试次数用尽且租约已过期的任务不再领取，标记为failed，不会一直停留在downloading
+        session.query(PaperDownload).filter(
+            self._stale(now),
+            func.coalesce(PaperDownload.attempts, 0) >= self.max_attempts
+        ).update({
+            PaperDownload.download_status: 'failed',
+            PaperDownload.download_error: '租约多次过期，超过重试次数',
+            PaperDownload.lease_owner: None,
+            PaperDownload.lease_expires_at: None,
+        }, synchronize_session=False)
+        query = session.query(PaperDownload.id).filter(self._claimable(now))
+        if paper_ids is not None:
+            query = query.filter(PaperDownload.paper_id.in_(list(paper_ids)))
+        query = query.order_by(PaperDownload.id).limit(batch_size)
+        if db_manager.engine.dialect.name in ('mysql', 'postgresql'):
+            query = query.with_for_update(skip_locked=True)
+        candidate_ids = [row[0] for row in query]
+        if not candidate_ids:
+            session.commit()
+            return []
+
+        # 再次带上领取条件更新，保证不支持行锁的数据库上也不会重复领取
+        session.query(PaperDownload).filter(
+            PaperDownload.id.in_(candidate_ids),
+            self._claimable(now)
+        ).update({
+            PaperDownload.download_status: 'downloading',
+            PaperDownload.lease_owner: worker_id,
+            PaperDownload.lease_expires_at: expires_at,
+            PaperDownload.attempts: func.coalesce(PaperDownload.attempts, 0) + 1,
+        }, synchronize_session=False)
+        session.commit()
+
+        return [row[0] for row in session.query(PaperDownload.id).filter(
+            PaperDownload.id.in_(candidate_ids),
+            PaperDownload.lease_owner == worker_id,
+            PaperDownload.download_status == 'downloading'
+        )]
+
+    def heartbeat(self, session, worker_id, record_ids):
+        """为仍在下载的任务续期租约"""
+        if not record_ids:
+            return
+        session.query(PaperDownload).filter(
+            PaperDownload.id.in_(record_ids),
+            PaperDownload.lease_owner == worker_id,
+            PaperDownload.download_status == 'downloading'
+        ).update({
+            PaperDownload.lease_expires_at: datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        session.commit()
+
+    def release(self, session, worker_id, record_ids):
+        """清除已结束任务的租约，下载器没有写入最终状态的任务标记为failed"""
+        if not record_ids:
+            return
+        unfinished = PaperDownload.download_status == 'downloading'
+        # MySQL按顺序执行赋值，download_error 必须在 download_status 改变之前判断
+        session.execute(update(PaperDownload).where(
+            PaperDownload.id.in_(record_ids),
+            PaperDownload.lease_owner == worker_id
+        ).ordered_values(
+            (PaperDownload.download_error, case((unfinished, '下载结束时没有写入结果'),
+                                                else_=PaperDownload.download_error)),
+            (PaperDownload.download_status, case((unfinished, 'failed'), else_=PaperDownload.download_status)),
+            (PaperDownload.lease_owner, None),
+            (PaperDownload.lease_expires_at, None),
+        ).execution_options(synchronize_session=False))
+        session.commit()
+
+    def load_papers(self, session, record_ids):
+        """加载下载记录对应的论文"""
+        return session.query(Paper).join(PaperDownload, PaperDownload.paper_id == Paper.id) \
+            .filter(PaperDownload.id.in_(record_ids)).all()
+
+class DownloadWorker:
+    """独立的下载worker进程，循环从队列领取任务并下载"""
+
+    def __init__(self, downloader, queue=None, worker_id=None, batch_size=DOWNLOAD_QUEUE_BATCH_SIZE,
+                 poll_interval=DOWNLOAD_QUEUE_POLL_INTERVAL):
+        self.downloader = downloader
+        self.queue = queue or DownloadQueue()
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+    def _heartbeat_loop(self, record_ids, stop_event):
+        """下载期间定期续期租约"""
+        session = db_manager.get_session()
+        try:
+            while not stop_event.wait(self.queue.lease_seconds / 3):
+                try:
+                    self.queue.heartbeat(session, self.worker_id, record_ids)
+                except Exception:
+                    session.rollback()
+        finally:
+            session.close()
+
+    def run_batch(self):
+        """领取并下载一批任务，返回本批处理的任务数"""
+        # 提交后不过期属性，论文对象交给下载线程后仍可读取
+        session = db_manager.Session(expire_on_commit=False)
+        try:
+            record_ids = self.queue.claim(session, self.worker_id, self.batch_size)
+            if not record_ids:
+                return 0
+            papers = self.queue.load_papers(session, record_ids)
+            session.commit()
+
+            stop_event = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat_loop, args=(record_ids, stop_event), daemon=True)
+            heartbeat.start()
+            try:
+                for future in self.downloader.download_papers(papers):
+                    future.result()
+            finally:
+                stop_event.set()
+                heartbeat.join()
+                self.queue.release(session, self.worker_id, record_ids)
+            return len(record_ids)
+        finally:
+            session.close()
+
+    def run(self, until_empty=False):
+        """持续处理队列，until_empty为True时队列为空即退出"""
+        processed = 0
+        while True:
+            count = self.run_batch()
+            processed += count
+            if count and METRICS_FILE:
+                metrics.write_prometheus(METRICS_FILE)
+            if count == 0:
+                if until_empty:
+                    return processed
+                time.sleep(self.poll_interval)
+
+# 创建全局下载队列实例
+download_queue = DownloadQueue()
@@ -0,0 +1,201 @@
+import os
+import queue
+import socket
+import itertools
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from .db_utils import db_manager, Paper, parse_category
+from .download_queue import download_queue
+from .metrics import DOWNLOAD_SCHEDULER_PENDING
+from ..settings import (DOWNLOAD_SCHEDULER_QUEUE_SIZE, DOWNLOAD_PRIORITY, DOWNLOAD_PRIORITY_CATEGORIES,
+                        DOWNLOAD_PER_HOST_CONCURRENCY)
+
+PRIORITY_POLICIES = ('newest', 'category', 'fifo')
+# 停止调度线程的标记，排在所有论文之后
+_STOP = (float('inf'),)
+
+class DownloadScheduler:
+    """有界的优先级下载调度器，使下载与爬取同时进行
+
+    队列中只保存 (优先级, 序号, arxiv_id)，调度线程取出后才从数据库加载论文并交给下载器。
+    交给下载器的论文数不超过 concurrency 的两倍，使下载线程结束一篇后立即有下一篇可下载，
+    其余论文按优先级在队列中等待。
+    队列满时 offer 返回False、submit 阻塞，由调用方暂停生产实现背压。
+    下载前与独立的下载worker一样在 paper_downloads 中领取租约，下载期间续期，结束后释放，
+    已被其他worker领取或已完成的论文直接跳过，同一篇论文不会被两个进程同时下载。
+    """
+
+    def __init__(self, downloader, queue_size=DOWNLOAD_SCHEDULER_QUEUE_SIZE, policy=DOWNLOAD_PRIORITY,
+                 categories=DOWNLOAD_PRIORITY_CATEGORIES, concurrency=None, task_queue=None, worker_id=None):
+        if policy not in PRIORITY_POLICIES:
+            raise ValueError(f"不支持的下载优先级策略: {policy}")
+        self.downloader = downloader
+        self.policy = policy
+        self.categories = categories.split(',') if isinstance(categories, str) else list(categories)
+        # asyncio引擎实际并发受单主机连接数限制，线程引擎受线程池大小限制
+        self.concurrency = concurrency or (DOWNLOAD_PER_HOST_CONCURRENCY if hasattr(downloader, 'max_concurrency')
+                                           else downloader.max_workers)
+        self.download_queue = task_queue or download_queue
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-pipeline'
+        self.queue = queue.PriorityQueue(maxsize=queue_size)
+        # 下载结束的 (下载记录ID, 是否成功)，由租约线程释放租约
+        self.finished = queue.Queue()
+        # 正在下载、需要续期租约的下载记录ID
+        self.leased = set()
+        self.slots = threading.BoundedSemaphore(self.concurrency * 2)
+        self.sequence = itertools.count()
+        self.results = Counter()
+        self.results_lock = threading.Lock()
+        self.thread = None
+        self.lease_thread = None
+        self.thread_lock = threading.Lock()
+
+    def priority(self, paper_data):
+        """计算论文的优先级，值越小越先下载"""
+        published = paper_data.get('published_date')
+        newest = -published.timestamp() if isinstance(published, datetime) else 0.0
+        if self.policy == 'newest':
+            return (newest,)
+        if self.policy == 'category':
+            codes = [parse_category(category)[0] for category in paper_data.get('categories') or []]
+            rank = min((self.categories.index(code) for code in codes if code in self.categories),
+                       default=len(self.categories))
+            return (rank, newest)
+        # fifo: 只按入队序号排序
+        return (0,)
+
+    def _ensure_started(self):
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._dispatch, name='download-scheduler', daemon=True)
+                self.thread.start()
+                self.lease_thread = threading.Thread(target=self._maintain_leases, name='download-leases',
+                                                     daemon=True)
+                self.lease_thread.start()
+
+    def offer(self, paper_data):
+        """不阻塞地加入队列，队列已满时返回False"""
+        self._ensure_started()
+        DOWNLOAD_SCHEDULER_PENDING.inc()
+        try:
+            self.queue.put_nowait((self.priority(paper_data), next(self.sequence), paper_data['arxiv_id']))
+        except queue.Full:
+            DOWNLOAD_SCHEDULER_PENDING.dec()
+            return False
+        return True
+
+    def submit(self, paper_data, timeout=None):
+        """加入队列，队列已满时阻塞等待"""
+        self._ensure_started()
+        DOWNLOAD_SCHEDULER_PENDING.inc()
+        try:
+            self.queue.put((self.priority(paper_data), next(self.sequence), paper_data['arxiv_id']), timeout=timeout)
+        except queue.Full:
+            DOWNLOAD_SCHEDULER_PENDING.dec()
+            raise
+
+    def _claim_paper(self, arxiv_id):
+        """为论文创建下载任务并领取租约，返回 (下载记录ID, 论文)，论文不存在或任务已被领取时返回None"""
+        # 提交后不过期属性，论文对象交给下载线程后仍可读取
+        session = db_manager.Session(expire_on_commit=False)
+        try:
+            paper = session.query(Paper).filter_by(arxiv_id=arxiv_id).first()
+            if paper is None:
+                return None
+            self.download_queue.enqueue(session, [paper.id])
+            record_ids = self.download_queue.claim(session, self.worker_id, 1, paper_ids=[paper.id])
+            return (record_ids[0], paper) if record_ids else None
+        finally:
+            session.close()
+
+    def _dispatch(self):
+        """按优先级取出论文，领取租约并有空闲下载槽时交给下载器"""
+        while True:
+            priority, _, arxiv_id = self.queue.get()
+            if priority == _STOP:
+                self.queue.task_done()
+                return
+            DOWNLOAD_SCHEDULER_PENDING.dec()
+            self.slots.acquire()
+            try:
+                claimed = self._claim_paper(arxiv_id)
+                result = 'skipped'
+            except Exception:
+                claimed, result = None, 'failed'
+            if claimed is None:
+                with self.results_lock:
+                    self.results[result] += 1
+                self.slots.release()
+                self.queue.task_done()
+                continue
+            record_id, paper = claimed
+            with self.results_lock:
+                self.leased.add(record_id)
+            try:
+                future = self.downloader.download_papers([paper])[0]
+            except Exception:
+                self.finished.put((record_id, False))
+                continue
+            future.add_done_callback(lambda future, record_id=record_id: self._on_done(record_id, future))
+
+    def _on_done(self, record_id, future):
+        """下载结束后交给租约线程，回调可能在asyncio引擎的事件循环中执行，这里不访问数据库"""
+        try:
+            success = future.exception() is None and future.result()[0]
+        except Exception:
+            success = False
+        self.finished.put((record_id, success))
+
+    def _maintain_leases(self):
+        """定期续期正在下载的任务的租约，释放已结束任务的租约并释放下载槽"""
+        interval = self.download_queue.lease_seconds / 3
+        next_heartbeat = time.monotonic() + interval
+        session = db_manager.get_session()
+        try:
+            while True:
+                try:
+                    item = self.finished.get(timeout=max(next_heartbeat - time.monotonic(), 0))
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    return
+                if item is not None:
+                    record_id, success = item
+                    try:
+                        self.download_queue.release(session, self.worker_id, [record_id])
+                    except Exception:
+                        session.rollback()
+                    with self.results_lock:
+                        self.leased.discard(record_id)
+                        self.results['completed' if success else 'failed'] += 1
+                    self.slots.release()
+                    self.queue.task_done()
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + interval
+                    with self.results_lock:
+                        record_ids = list(self.leased)
+                    try:
+                        self.download_queue.heartbeat(session, self.worker_id, record_ids)
+                    except Exception:
+                        session.rollback()
+        finally:
+            session.close()
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def close(self):
+        """等待已加入的论文全部下载完成后停止调度线程，返回 {'completed': n, 'failed': n, 'skipped': n}"""
+        with self.thread_lock:
+            thread, self.thread = self.thread, None
+            lease_thread, self.lease_thread = self.lease_thread, None
+        if thread is not None:
+            self.queue.join()
+            self.queue.put((_STOP, next(self.sequence), None))
+            thread.join()
+            self.finished.put(_STOP)
+            lease_thread.join()
+        with self.results_lock:
+            return dict(self.results)
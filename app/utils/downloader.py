@@ -1,4 +1,5 @@
 import os
+import json
 import time
 import threading
 import requests
@@ -6,90 +7,252 @@ from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from .db_utils import db_manager
+from .progress import progress_tracker
+from .pdf_store import PdfStore
+from .rate_limiter import get_rate_limiter
+from .metrics import (DOWNLOAD_BYTES, DOWNLOAD_SPEED, DOWNLOAD_SECONDS, DOWNLOAD_RETRIES,
+                      DOWNLOAD_RESULTS, DOWNLOAD_QUEUE_DEPTH)
 from ..models.paper_download import PaperDownload
 from ..settings import (PAPERS_FOLDER, DOWNLOAD_MAX_WORKERS, DOWNLOAD_CHUNK_SIZE,
-                      DOWNLOAD_RETRY_TIMES, DOWNLOAD_RETRY_DELAY, DOWNLOAD_DELAY)
+                      DOWNLOAD_RETRY_TIMES, DOWNLOAD_RETRY_DELAY, DOWNLOAD_ENGINE,
+                      DOWNLOAD_TIMEOUT)
 
 class PaperDownloader:
     def __init__(self):
         self.max_workers = DOWNLOAD_MAX_WORKERS
         self.chunk_size = DOWNLOAD_CHUNK_SIZE
-        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # 线程池和下载目录在第一次下载时创建
+        self._executor = None
+        self.executor_lock = threading.Lock()
         self.base_dir = Path(PAPERS_FOLDER)
-        self.base_dir.mkdir(exist_ok=True)
         self.download_semaphore = threading.Semaphore(self.max_workers)
+        self._store = None
+
+    @property
+    def executor(self):
+        with self.executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def close(self):
+        """关闭线程池，之后再次下载时重新创建"""
+        with self.executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    @property
+    def store(self):
+        """与 base_dir 对应的内容寻址存储"""
+        if self._store is None or self._store.base_dir != self.base_dir:
+            self._store = PdfStore(self.base_dir)
+        return self._store
 
     def get_download_path(self, paper):
         """根据论文创建时间生成下载路径"""
         date_dir = paper.created_at.strftime('%Y-%m-%d')
         save_dir = self.base_dir / date_dir
-        save_dir.mkdir(exist_ok=True)
+        save_dir.mkdir(parents=True, exist_ok=True)
         return str(save_dir / f"{paper.arxiv_id}.pdf")
 
+    def _is_downloaded(self, download_record):
+        """下载记录已完成且文件仍完整时无需重复下载，只检查文件元数据不读取内容"""
+        return (download_record.download_status == 'completed'
+                and bool(download_record.download_path)
+                and self.store.is_intact(download_record.download_path, download_record.content_hash,
+                                         download_record.file_size))
+
+    def _load_resume_state(self, temp_path):
+        """读取临时文件的续传校验信息，没有校验信息的临时文件无法安全续传，直接删除"""
+        meta_path = temp_path + '.meta'
+        if os.path.exists(temp_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path) as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        self._discard_partial(temp_path)
+        return {}
+
+    def _save_resume_state(self, temp_path, state):
+        with open(temp_path + '.meta', 'w') as f:
+            json.dump(state, f)
+
+    def _discard_partial(self, temp_path):
+        """删除临时文件及其续传校验信息"""
+        for path in (temp_path, temp_path + '.meta'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _resume_headers(self, temp_path, state):
+        """根据已下载的字节数构造 Range/If-Range 请求头，返回 (请求头, 已下载字节数)"""
+        if not state:
+            return {}, 0
+        offset = os.path.getsize(temp_path)
+        headers = {'Range': f'bytes={offset}-'}
+        # 弱ETag不能用于If-Range，退回使用Last-Modified
+        etag = state.get('etag')
+        validator = etag if etag and not etag.startswith('W/') else state.get('last_modified')
+        if validator:
+            headers['If-Range'] = validator
+        return headers, offset
+
+    def _check_resume(self, status, headers, state, offset):
+        """校验服务器的续传响应，返回 (是否追加写入, 文件总大小)
+
+        206 响应的总大小与记录不一致时说明远端文件已变化，抛出异常并从头下载。
+        """
+        if status == 206:
+            content_range = headers.get('content-range', '')
+            total_size = int(content_range.rsplit('/', 1)[-1]) if '/' in content_range else 0
+            if state.get('total_size') and total_size != state['total_size']:
+                raise IOError(f"远端文件大小已变化: {state['total_size']} -> {total_size}")
+            if not content_range.startswith(f'bytes {offset}-'):
+                raise IOError(f"续传范围不匹配: {content_range}")
+            return True, total_size
+        # 服务器忽略Range或文件已变化时返回完整内容
+        return False, int(headers.get('content-length', 0))
+
+    def _transfer(self, paper, temp_path):
+        """下载一次，存在有效的临时文件时从断点续传
+
+        边下载边计算哈希，返回 (本次传输的字节数, 文件SHA-256, 文件大小)。
+        """
+        state = self._load_resume_state(temp_path)
+        headers, offset = self._resume_headers(temp_path, state)
+        # 与爬虫共享同一主机的令牌桶，按服务器的响应调整速率
+        limiter = get_rate_limiter(paper.pdf_url)
+        if limiter is not None:
+            limiter.acquire()
+        requested = time.monotonic()
+        response = requests.get(paper.pdf_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        if limiter is not None:
+            limiter.feedback(response.status_code, time.monotonic() - requested, response.headers.get('Retry-After'))
+        with response:
+            # 临时文件已包含完整内容
+            if response.status_code == 416 and offset and offset == state.get('total_size'):
+                return 0, self.store.hash_file(temp_path), offset
+            if response.status_code == 416:
+                # 续传位置超出远端文件或缺少文件总大小，保留临时文件会一直发送同样的Range
+                self._discard_partial(temp_path)
+            response.raise_for_status()
+            try:
+                append, total_size = self._check_resume(response.status_code, response.headers, state, offset)
+            except IOError:
+                self._discard_partial(temp_path)
+                raise
+            if not append:
+                offset = 0
+            self._save_resume_state(temp_path, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'total_size': total_size,
+            })
+
+            downloaded_size = offset
+            hasher = self.store.hasher(temp_path if append else None)
+            with open(temp_path, 'ab' if append else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        downloaded_size += len(chunk)
+                        DOWNLOAD_BYTES.inc(len(chunk))
+                        # 进度只更新到内存，由进度跟踪器按间隔合并写库
+                        progress_tracker.update(paper.id, downloaded_size, total_size)
+
+        if total_size and downloaded_size != total_size:
+            raise IOError(f"下载不完整: {downloaded_size}/{total_size} 字节")
+        return downloaded_size - offset, hasher.hexdigest(), downloaded_size
+
+    def _observe_download(self, status, started, received=0):
+        """记录单篇论文的下载结果、耗时和速度"""
+        elapsed = time.perf_counter() - started
+        DOWNLOAD_RESULTS.inc(status=status)
+        DOWNLOAD_SECONDS.observe(elapsed, status=status)
+        if status == 'completed' and received and elapsed > 0:
+            DOWNLOAD_SPEED.observe(received / elapsed)
+
+    def _mark_failed(self, paper_id, error):
+        """没有开始下载就结束的论文把记录标记为failed，避免领取后一直停留在downloading，已完成的记录不修改"""
+        session = db_manager.get_session()
+        try:
+            session.query(PaperDownload).filter(
+                PaperDownload.paper_id == paper_id,
+                PaperDownload.download_status != 'completed'
+            ).update({
+                PaperDownload.download_status: 'failed',
+                PaperDownload.download_error: error,
+            }, synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
     def download_paper(self, paper):
         """下载单个论文"""
         if not paper.pdf_url:
+            self._mark_failed(paper.id, "PDF URL不存在")
             return False, "PDF URL不存在"
 
         session = db_manager.get_session()
+        download_record = None
+        started = time.perf_counter()
         try:
             # 创建或获取下载记录
             download_record = session.query(PaperDownload).filter_by(paper_id=paper.id).first()
             if not download_record:
                 download_record = PaperDownload(paper_id=paper.id)
                 session.add(download_record)
+            elif self._is_downloaded(download_record):
+                return True, "论文已下载"
             
             # 更新下载状态为downloading
             download_record.download_status = 'downloading'
             download_record.download_progress = 0
             download_record.download_path = self.get_download_path(paper)
             session.commit()
+            progress_tracker.start(paper.id, download_record.id)
+            temp_path = download_record.download_path + '.tmp'
+            received = 0
 
             # 使用信号量控制并发下载数量
             with self.download_semaphore:
-                # 添加重试机制
+                # 重试覆盖整个传输过程，失败后保留临时文件从断点继续，等待时间指数退避
                 for retry in range(DOWNLOAD_RETRY_TIMES):
                     try:
-                        # 发送请求获取文件大小
-                        response = requests.get(paper.pdf_url, stream=True)
-                        response.raise_for_status()
-                        total_size = int(response.headers.get('content-length', 0))
+                        transferred, content_hash, file_size = self._transfer(paper, temp_path)
+                        received += transferred
                         break
                     except Exception as e:
                         if retry < DOWNLOAD_RETRY_TIMES - 1:
-                            time.sleep(DOWNLOAD_RETRY_DELAY)
+                            DOWNLOAD_RETRIES.inc()
+                            time.sleep(DOWNLOAD_RETRY_DELAY * (2 ** retry))
                             continue
                         raise e
 
-            # 创建临时文件
-            temp_path = download_record.download_path + '.tmp'
-            downloaded_size = 0
-
-            with open(temp_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=self.chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        if total_size > 0:
-                            progress = (downloaded_size / total_size) * 100
-                            download_record.download_progress = progress
-                            session.commit()
-
-            # 下载完成后重命名文件
-            os.rename(temp_path, download_record.download_path)
+            # 下载完成后放入内容寻址存储，相同内容只保存一份
+            self.store.commit(temp_path, content_hash, download_record.download_path)
+            self._discard_partial(temp_path)
+            progress_tracker.finish(paper.id)
             download_record.download_status = 'completed'
             download_record.download_progress = 100
+            download_record.content_hash = content_hash
+            download_record.file_size = file_size
+            download_record.processed_at = None
             session.commit()
-            # 添加下载延迟
-            time.sleep(DOWNLOAD_DELAY)
+            self._observe_download('completed', started, received)
             return True, "下载成功"
 
         except Exception as e:
-            download_record.download_status = 'failed'
-            download_record.download_error = str(e)
-            session.commit()
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            # 保留临时文件，下次下载时从断点续传
+            progress_tracker.finish(paper.id)
+            session.rollback()
+            if download_record is not None:
+                download_record.download_status = 'failed'
+                download_record.download_error = str(e)[:500]
+                session.commit()
+                self._observe_download('failed', started)
             return False, str(e)
 
         finally:
@@ -103,8 +266,14 @@ class PaperDownloader:
             # 因为Paper模型没有download_status字段
             # download_paper方法会创建或获取PaperDownload记录并处理状态
             future = self.executor.submit(self.download_paper, paper)
+            DOWNLOAD_QUEUE_DEPTH.inc()
+            future.add_done_callback(lambda _: DOWNLOAD_QUEUE_DEPTH.dec())
             futures.append(future)
         return futures
 
-# 创建全局下载器实例
-paper_downloader = PaperDownloader()
\ No newline at end of file
+# 根据配置创建全局下载器实例
+if DOWNLOAD_ENGINE == 'asyncio':
+    from .async_downloader import AsyncPaperDownloader
+    paper_downloader = AsyncPaperDownloader()
+else:
+    paper_downloader = PaperDownloader()
\ No newline at end of file
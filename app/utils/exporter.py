@@ -0,0 +1,190 @@
+import os
+import gzip
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import select, or_, BigInteger, Integer, Float, Boolean, DateTime
+from .db_utils import Paper
+from ..models.paper_download import PaperDownload
+from ..settings import EXPORT_DIR, EXPORT_CHUNK_SIZE, EXPORT_FORMAT, EXPORT_OVERLAP_SECONDS
+
+# 可导出的表
+EXPORT_TABLES = {
+    'papers': Paper.__table__,
+    'paper_downloads': PaperDownload.__table__,
+}
+FORMAT_EXTENSIONS = {'jsonl': 'jsonl', 'jsonl.gz': 'jsonl.gz', 'parquet': 'parquet', 'arrow': 'arrow'}
+# 增量导出的水位线文件，保存在导出目录中
+STATE_FILE = 'export_state.json'
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+class JsonlWriter:
+    """逐行写入JSON，可选gzip压缩"""
+
+    def __init__(self, path, columns, compress=False):
+        self.columns = columns
+        self.file = gzip.open(path, 'wt', encoding='utf-8') if compress else open(path, 'w', encoding='utf-8')
+
+    def write_rows(self, rows):
+        self.file.writelines(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, default=_to_json) + '\n'
+                             for row in rows)
+
+    def close(self):
+        self.file.close()
+
+class ArrowWriter:
+    """按块写入Parquet或Arrow IPC文件，每块对应一个row group/record batch，需要安装pyarrow"""
+
+    def __init__(self, path, table, fmt):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("导出Parquet/Arrow格式需要先安装pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.columns = [column.name for column in table.columns]
+        self.schema = pa.schema([(column.name, self._arrow_type(column.type)) for column in table.columns])
+        if fmt == 'parquet':
+            self.writer = pq.ParquetWriter(str(path), self.schema, compression='zstd')
+        else:
+            self.sink = pa.OSFile(str(path), 'wb')
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+
+    def _arrow_type(self, column_type):
+        pa = self.pa
+        if isinstance(column_type, (Integer, BigInteger)):
+            return pa.int64()
+        if isinstance(column_type, Float):
+            return pa.float64()
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, DateTime):
+            return pa.timestamp('us')
+        return pa.string()
+
+    def write_rows(self, rows):
+        columns = list(zip(*rows))
+        batch = self.pa.record_batch([self.pa.array(values, type=field.type)
+                                      for values, field in zip(columns, self.schema)], schema=self.schema)
+        if hasattr(self.writer, 'write_batch'):
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write_table(self.pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.writer.close()
+        if hasattr(self, 'sink'):
+            self.sink.close()
+
+def open_writer(path, table, fmt):
+    if fmt in ('jsonl', 'jsonl.gz'):
+        return JsonlWriter(path, [column.name for column in table.columns], compress=fmt == 'jsonl.gz')
+    if fmt in ('parquet', 'arrow'):
+        return ArrowWriter(path, table, fmt)
+    raise ValueError(f"不支持的导出格式: {fmt}")
+
+def _row_key(row_id, updated_at):
+    """增量导出去重使用的行键 '<ID>@<updated_at>'"""
+    return f'{row_id}@{updated_at.isoformat()}'
+
+def _key_time(key):
+    return datetime.fromisoformat(key.split('@', 1)[1])
+
+def export_table(session, table_name, path, fmt=EXPORT_FORMAT, since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE,
+                 exclude=(), recent_since=None):
+    """把表中 updated_at 在 (since, until] 范围内的行流式写入文件，返回 (写入的行数, 近期行的键)
+
+    使用服务端游标按 chunk_size 分块读取，每块写完即释放，内存占用与表大小无关。
+    exclude 中的 (ID, updated_at) 键已在上次导出过，跳过；updated_at 晚于 recent_since 的行的键
+    作为近期行返回，供下一次导出去重。
+    """
+    table = EXPORT_TABLES[table_name]
+    id_index = list(table.columns).index(table.c.id)
+    updated_index = list(table.columns).index(table.c.updated_at)
+    exclude = set(exclude)
+    recent = []
+    query = select(*table.columns).order_by(table.c.updated_at, table.c.id)
+    if since is not None:
+        query = query.where(table.c.updated_at > since)
+    if until is not None:
+        # 全量导出时包含没有 updated_at 的旧数据
+        bound = table.c.updated_at <= until
+        query = query.where(bound if since is not None else or_(bound, table.c.updated_at.is_(None)))
+    result = session.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+
+    tmp_path = f'{path}.tmp'
+    writer = open_writer(tmp_path, table, fmt)
+    total = 0
+    try:
+        for rows in result.partitions():
+            if exclude:
+                rows = [row for row in rows if row[updated_index] is None
+                        or _row_key(row[id_index], row[updated_index]) not in exclude]
+            if recent_since is not None:
+                recent.extend(_row_key(row[id_index], row[updated_index]) for row in rows
+                              if row[updated_index] is not None and row[updated_index] > recent_since)
+            if rows:
+                writer.write_rows(rows)
+            total += len(rows)
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        result.close()
+    writer.close()
+    # 写完后再改名，下游作业不会读到不完整的文件
+    os.replace(tmp_path, path)
+    return total, recent
+
+class Exporter:
+    """按表导出到 out_dir，记录每张表上次导出到的 updated_at，增量导出只输出之后变化的行
+
+    updated_at 由写入方的时钟生成，早于水位线却在导出之后才提交的行会被漏掉，因此增量导出从水位线之前
+    overlap_seconds 秒开始读取，并跳过上次已导出的 (ID, updated_at)。
+    """
+
+    def __init__(self, out_dir=EXPORT_DIR, overlap_seconds=EXPORT_OVERLAP_SECONDS):
+        self.out_dir = Path(out_dir)
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.state_path = self.out_dir / STATE_FILE
+
+    def load_state(self):
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                return json.load(f)
+        return {}
+
+    def save_state(self, state):
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self, session, tables=tuple(EXPORT_TABLES), fmt=EXPORT_FORMAT, incremental=True,
+            chunk_size=EXPORT_CHUNK_SIZE):
+        """导出指定的表，返回 [(表名, 文件路径, 行数)]，增量导出没有变化的表不生成文件"""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        state = self.load_state()
+        # 以导出开始时间为上界，导出过程中写入的行留给下一次导出
+        until = datetime.utcnow()
+        stamp = until.strftime('%Y%m%dT%H%M%S')
+        exported = []
+        for table_name in tables:
+            table_state = state.get(table_name, {}) if incremental else {}
+            last = table_state.get('updated_at')
+            since = datetime.fromisoformat(last) - self.overlap if last else None
+            path = self.out_dir / f'{table_name}-{stamp}.{FORMAT_EXTENSIONS[fmt]}'
+            count, recent = export_table(session, table_name, path, fmt, since, until, chunk_size,
+                                         exclude=table_state.get('recent', ()), recent_since=until - self.overlap)
+            if count == 0 and since is not None:
+                os.remove(path)
+            else:
+                exported.append((table_name, str(path), count))
+            # 重叠窗口内的旧键仍需保留，直到它们落到下一次读取范围之外
+            recent.extend(key for key in table_state.get('recent', ()) if _key_time(key) > until - self.overlap)
+            state[table_name] = {'updated_at': until.isoformat(), 'rows': count, 'recent': sorted(set(recent))}
+            self.save_state(state)
+        return exported
@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 默认的耗时分桶(秒)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 下载速度分桶(字节/秒)
+THROUGHPUT_BUCKETS = (1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class Counter:
+    """单调递增计数器"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, None, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值，如队列深度"""
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    """固定分桶的直方图，记录观测值的分布、总和和次数"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}  # 标签 -> [各分桶计数, 总和, 次数]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块的执行耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels):
+        """返回 (次数, 总和)"""
+        with self.lock:
+            state = self.values.get(_label_key(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def quantile(self, q, **labels):
+        """根据分桶估算分位数，返回所在分桶的上界"""
+        with self.lock:
+            state = self.values.get(_label_key(labels))
+            if not state or not state[2]:
+                return 0.0
+            target = q * state[2]
+            cumulative = 0
+            for bound, count in zip(self.buckets, state[0]):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+            return float('inf')
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f'{self.name}_bucket', key, {'le': repr(float(bound))}, cumulative))
+                samples.append((f'{self.name}_bucket', key, {'le': '+Inf'}, count))
+                samples.append((f'{self.name}_sum', key, None, total))
+                samples.append((f'{self.name}_count', key, None, count))
+        return samples
+
+
+class MetricsRegistry:
+    """进程内指标注册表，可导出为Prometheus文本格式"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.http_server = None
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def summaries(self):
+        """按指标和标签汇总当前值，直方图给出 count/avg/p50/p95"""
+        result = {}
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            with metric.lock:
+                keys = list(metric.values)
+            for key in keys:
+                name = metric.name + (_format_labels(key).replace('"', '') if key else '')
+                labels = dict(key)
+                if isinstance(metric, Histogram):
+                    count, total = metric.summary(**labels)
+                    result[name] = {
+                        'count': count,
+                        'avg': total / count if count else 0.0,
+                        'p50': metric.quantile(0.5, **labels),
+                        'p95': metric.quantile(0.95, **labels),
+                    }
+                else:
+                    result[name] = {'value': metric.value(**labels)}
+        return result
+
+    def render_prometheus(self):
+        """按Prometheus文本格式输出所有指标"""
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, extra, value in metric.samples():
+                lines.append(f'{name}{_format_labels(key, extra)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """原子地写入Prometheus文本文件，可供node_exporter的textfile采集器读取"""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port, host='0.0.0.0'):
+        """在后台线程中提供 /metrics 接口"""
+        if self.http_server is not None:
+            return self.http_server
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.http_server.daemon_threads = True
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        return self.http_server
+
+# 创建全局指标注册表
+metrics = MetricsRegistry()
+
+# 各热点路径使用的指标
+LISTING_FETCH_SECONDS = metrics.histogram('paperspider_listing_fetch_seconds', '列表页下载耗时')
+LISTING_PARSE_SECONDS = metrics.histogram('paperspider_listing_parse_seconds', '单个列表页解析耗时')
+LISTING_ENTRIES = metrics.counter('paperspider_listing_entries_total', '解析到的列表条目数')
+DB_QUERY_SECONDS = metrics.histogram('paperspider_db_query_seconds', '数据库语句执行耗时')
+DB_COMMIT_SECONDS = metrics.histogram('paperspider_db_commit_seconds', '数据库提交耗时')
+DOWNLOAD_BYTES = metrics.counter('paperspider_download_bytes_total', '下载的PDF字节数')
+DOWNLOAD_SPEED = metrics.histogram('paperspider_download_bytes_per_second', '单篇论文的下载速度',
+                                   buckets=THROUGHPUT_BUCKETS)
+DOWNLOAD_SECONDS = metrics.histogram('paperspider_download_seconds', '单篇论文的下载耗时')
+DOWNLOAD_RETRIES = metrics.counter('paperspider_download_retries_total', '下载重试次数')
+DOWNLOAD_RESULTS = metrics.counter('paperspider_downloads_total', '按结果统计的下载次数')
+DOWNLOAD_QUEUE_DEPTH = metrics.gauge('paperspider_download_queue_depth', '已提交尚未完成的下载任务数')
+DOWNLOAD_SCHEDULER_PENDING = metrics.gauge('paperspider_download_scheduler_pending', '调度器中等待下载的论文数')
+PDF_PROCESS_RESULTS = metrics.counter('paperspider_pdf_processed_total', '按结果统计的PDF处理数')
+PDF_PROCESS_SECONDS = metrics.histogram('paperspider_pdf_process_seconds', '单个PDF的校验和文本提取耗时')
@@ -0,0 +1,118 @@
+import time
+from sqlalchemy import inspect, text, func, Index
+from .db_utils import Base, Paper
+
+def add_missing_columns(engine, logger=print):
+    """为已存在的表补充模型中新增的列(create_all不会修改已有表)"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger(f"已添加列 {table.name}.{column.name}")
+
+def use_binary_collation(engine, logger=print):
+    """MySQL上把作者名和分类代码改为区分大小写和重音的排序规则，与模型定义一致"""
+    if engine.dialect.name != 'mysql':
+        return
+    from .db_utils import Author, Category
+    with engine.begin() as conn:
+        for column in (Author.__table__.c.name, Category.__table__.c.code):
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(text(f'ALTER TABLE {column.table.name} MODIFY {column.name} {column_type} NOT NULL'))
+            logger(f"已将 {column.table.name}.{column.name} 改为二进制排序规则")
+
+def backfill_defaults(engine, logger=print):
+    """把有固定默认值的列中的NULL改为默认值
+
+    ADD COLUMN 不带默认值，已有行的新列为NULL，例如 paper_downloads.attempts 为NULL时
+    attempts < max_attempts 不成立，这些下载记录永远不会被领取。
+    """
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for column in table.columns:
+                default = column.default
+                if default is None or not default.is_scalar:
+                    continue
+                result = conn.execute(table.update().where(column.is_(None)).values({column.name: default.arg}))
+                if result.rowcount:
+                    logger(f"已为 {table.name}.{column.name} 回填 {result.rowcount} 行默认值")
+
+def _has_unique(inspector, table_name, column_name):
+    constraints = inspector.get_unique_constraints(table_name)
+    indexes = [index for index in inspector.get_indexes(table_name) if index.get('unique')]
+    return any(item['column_names'] == [column_name] for item in constraints + indexes)
+
+def dedupe_paper_downloads(manager, logger=print):
+    """删除同一论文的重复下载记录并补建 paper_id 唯一索引
+
+    每篇论文保留一条记录: 优先保留已完成的，其次保留ID最大的。
+    """
+    from ..models.paper_download import PaperDownload
+    inspector = inspect(manager.engine)
+    if _has_unique(inspector, PaperDownload.__tablename__, 'paper_id'):
+        return 0
+    session = manager.get_session()
+    removed = 0
+    try:
+        duplicated = [row[0] for row in session.query(PaperDownload.paper_id)
+                      .group_by(PaperDownload.paper_id).having(func.count(PaperDownload.id) > 1)]
+        for paper_id in duplicated:
+            records = session.query(PaperDownload.id, PaperDownload.download_status) \
+                .filter_by(paper_id=paper_id).all()
+            keep = max(records, key=lambda record: (record.download_status == 'completed', record.id))
+            removed += session.query(PaperDownload).filter(
+                PaperDownload.paper_id == paper_id, PaperDownload.id != keep.id
+            ).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+    Index('uq_paper_downloads_paper_id', PaperDownload.__table__.c.paper_id, unique=True).create(bind=manager.engine)
+    logger(f"已删除 {removed} 条重复的下载记录并创建 paper_id 唯一索引")
+    return removed
+
+def create_missing_indexes(engine, logger=print):
+    """为已存在的表创建模型中新增的索引"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    logger("索引检查完成")
+
+def backfill_links(manager, chunk_size=1000, start_id=0, logger=print):
+    """按主键顺序分批为已有论文生成作者/分类关联，每批单独提交，可通过start_id从中断处继续"""
+    session = manager.get_session()
+    last_id = start_id
+    total = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            rows = session.query(Paper.id, Paper.arxiv_id, Paper.authors, Paper.categories).filter(
+                Paper.id > last_id
+            ).order_by(Paper.id).limit(chunk_size).all()
+            if not rows:
+                break
+            manager.sync_links(session, [row._asdict() for row in rows])
+            session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+            logger(f"已迁移 {total} 篇论文 (最后ID {last_id}, {total / (time.perf_counter() - started):.0f} 篇/秒)")
+        return total
+    finally:
+        session.close()
+
+def migrate(manager, chunk_size=1000, start_id=0, logger=print):
+    """升级数据库结构并回填规范化的作者/分类关联"""
+    manager.create_tables()
+    add_missing_columns(manager.engine, logger)
+    use_binary_collation(manager.engine, logger)
+    backfill_defaults(manager.engine, logger)
+    create_missing_indexes(manager.engine, logger)
+    dedupe_paper_downloads(manager, logger)
+    return backfill_links(manager, chunk_size, start_id, logger)
@@ -0,0 +1,45 @@
+"""常用论文查询，基于规范化的作者/分类关联表和日期索引，避免全表扫描和字符串匹配"""
+from datetime import datetime, timedelta
+from .db_utils import Paper, Author, PaperAuthor, Category, PaperCategory, parse_category
+
+def papers_by_author(session, name, limit=100):
+    """按作者姓名查询论文，按发布日期倒序"""
+    return session.query(Paper).join(PaperAuthor, PaperAuthor.paper_id == Paper.id) \
+        .join(Author, Author.id == PaperAuthor.author_id) \
+        .filter(Author.name == name) \
+        .order_by(Paper.published_date.desc()).limit(limit).all()
+
+def papers_in_category(session, category, since=None, primary_only=False, limit=100):
+    """按分类查询论文，category可以是 'cs.CL' 或 'Computation and Language (cs.CL)'"""
+    code, _ = parse_category(category)
+    query = session.query(Paper).join(PaperCategory, PaperCategory.paper_id == Paper.id) \
+        .join(Category, Category.id == PaperCategory.category_id) \
+        .filter(Category.code == code)
+    if primary_only:
+        query = query.filter(PaperCategory.is_primary.is_(True))
+    if since is not None:
+        query = query.filter(Paper.published_date >= since)
+    return query.order_by(Paper.published_date.desc()).limit(limit).all()
+
+def papers_published_between(session, start, end, columns=None):
+    """查询发布日期在 [start, end) 范围内的论文，可只查询指定列"""
+    query = session.query(*columns) if columns else session.query(Paper)
+    return query.filter(Paper.published_date >= start, Paper.published_date < end)
+
+def papers_published_on(session, day, columns=None):
+    """查询某一天发布的论文"""
+    start = datetime(day.year, day.month, day.day)
+    return papers_published_between(session, start, start + timedelta(days=1), columns)
+
+def paper_authors(session, paper_id):
+    """按作者顺序返回论文的作者姓名"""
+    return [row[0] for row in session.query(Author.name)
+            .join(PaperAuthor, PaperAuthor.author_id == Author.id)
+            .filter(PaperAuthor.paper_id == paper_id).order_by(PaperAuthor.position)]
+
+def paper_categories(session, paper_id):
+    """返回论文的分类代码，主分类在前"""
+    return [row[0] for row in session.query(Category.code)
+            .join(PaperCategory, PaperCategory.category_id == Category.id)
+            .filter(PaperCategory.paper_id == paper_id)
+            .order_by(PaperCategory.is_primary.desc(), Category.code)]
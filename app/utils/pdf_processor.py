@@ -0,0 +1,212 @@
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from .pdf_store import PdfStore
+from .metrics import PDF_PROCESS_RESULTS, PDF_PROCESS_SECONDS
+from ..models.paper_download import PaperDownload
+from ..settings import PDF_PROCESS_WORKERS, PDF_PROCESS_BATCH_SIZE, PDF_TEXT_ENGINE
+
+# 文件头必须出现在前1024字节内，startxref 和 %%EOF 必须出现在最后2048字节内
+HEADER_WINDOW = 1024
+TRAILER_WINDOW = 2048
+TRAILER_RE = re.compile(rb'startxref\s+(\d+)\s+%%EOF')
+XREF_RE = re.compile(rb'\s*(?:xref|\d+\s+\d+\s+obj)\b')
+OBJ_RE = re.compile(rb'\d+\s+\d+\s+obj\b')
+STREAM_RE = re.compile(rb'stream\r?\n')
+PAGE_RE = re.compile(rb'/Type\s*/Page\b')
+SKIP_STREAM_RE = re.compile(rb'/Subtype\s*/Image|/Type\s*/(?:XRef|Metadata|EmbeddedFile)|/Length1')
+# 内容流中的文本记号: 字符串、TJ数组中两个字符串之间小于-200的字距调整(视为单词间的空格)，以及换行操作 T*/Td/TD/ET
+TEXT_TOKEN_RE = re.compile(rb'\(((?:[^()\\]+|\\.)*)\)'
+                           rb'|(-(?:[2-9]\d\d|[1-9]\d{3,})(?:\.\d*)?)(?=\s*\()'
+                           rb'|(?<![A-Za-z*])(T\*|Td|TD|ET)(?![A-Za-z*])', re.S)
+ESCAPE_RE = re.compile(rb'\\(?:([0-7]{1,3})|(.))', re.S)
+ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+class InvalidPdfError(ValueError):
+    """PDF结构无效，需要重新下载"""
+
+def _unescape(value):
+    if b'\\' not in value:
+        return value
+
+    def replace(match):
+        octal, char = match.groups()
+        if octal:
+            return bytes([int(octal, 8) & 0xFF])
+        # 反斜杠加换行表示续行
+        return ESCAPES.get(char, char if char != b'\n' else b'')
+    return ESCAPE_RE.sub(replace, value)
+
+def _stream_text(content):
+    """从内容流中提取文本，只识别单字节标准编码的字符串"""
+    text = b''.join(string or (b' ' if kerning else b'\n' if newline else b'')
+                    for string, kerning, newline in TEXT_TOKEN_RE.findall(content))
+    # 转义序列不会跨越字符串，拼接后一次性还原
+    return _unescape(text).decode('latin-1').strip()
+
+def _objects(raw):
+    """依次返回对象的 (字典部分, 流数据)，没有流的对象流数据为None"""
+    pos = 0
+    while True:
+        match = OBJ_RE.search(raw, pos)
+        if match is None:
+            return
+        end = raw.find(b'endobj', match.end())
+        if end < 0:
+            return
+        body = raw[match.end():end]
+        pos = end + 6
+        stream = STREAM_RE.search(body)
+        if stream is None:
+            yield body, None
+            continue
+        stream_end = body.rfind(b'endstream')
+        if stream_end < stream.end():
+            raise InvalidPdfError('流缺少endstream')
+        yield body[:stream.start()], body[stream.end():stream_end].rstrip(b'\r\n')
+
+def read_builtin(path):
+    """不依赖第三方库的简单解析: 校验文件头、文件尾和交叉引用偏移，统计页数并提取未加密内容流中的文本"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if raw.find(b'%PDF-', 0, HEADER_WINDOW) < 0:
+        raise InvalidPdfError('缺少PDF文件头')
+    trailer = None
+    for trailer in TRAILER_RE.finditer(raw, max(0, len(raw) - TRAILER_WINDOW)):
+        pass
+    if trailer is None:
+        raise InvalidPdfError('缺少startxref/%%EOF，文件可能被截断')
+    offset = int(trailer.group(1))
+    if offset >= len(raw) or not XREF_RE.match(raw, offset):
+        raise InvalidPdfError(f'交叉引用表偏移无效: {offset}')
+
+    page_count = 0
+    texts = []
+    for dictionary, data in _objects(raw):
+        page_count += len(PAGE_RE.findall(dictionary))
+        if data is None or SKIP_STREAM_RE.search(dictionary):
+            continue
+        if b'/FlateDecode' in dictionary:
+            try:
+                data = zlib.decompressobj().decompress(data)
+            except zlib.error as e:
+                raise InvalidPdfError(f'流数据损坏: {e}')
+        elif b'/Filter' in dictionary:
+            # 其他压缩方式的流不提取文本
+            continue
+        if b'/ObjStm' in dictionary:
+            # 对象流中的页面对象
+            page_count += len(PAGE_RE.findall(data))
+        elif b'BT' in data:
+            texts.append(_stream_text(data))
+    if page_count == 0:
+        raise InvalidPdfError('没有页面')
+    return page_count, '\n'.join(texts)
+
+def read_pypdf(path):
+    """使用pypdf校验结构并提取文本，支持字体编码映射，速度较慢"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("使用pypdf提取文本需要先安装pypdf: pip install pypdf")
+    reader = PdfReader(path, strict=True)
+    pages = [page.extract_text() or '' for page in reader.pages]
+    if not pages:
+        raise InvalidPdfError('没有页面')
+    return len(pages), '\n'.join(pages)
+
+PDF_ENGINES = {'builtin': read_builtin, 'pypdf': read_pypdf}
+
+def text_path_for(download_path):
+    """纯文本与论文PDF放在同一目录，扩展名为 .txt"""
+    return os.path.splitext(download_path)[0] + '.txt'
+
+def process_pdf(path, engine=PDF_TEXT_ENGINE):
+    """在子进程中校验单个PDF并写入纯文本文件，返回 (是否有效, 页数, 文本路径或错误信息, 耗时)"""
+    started = time.perf_counter()
+    try:
+        page_count, text = PDF_ENGINES[engine](path)
+    except ImportError:
+        raise
+    except Exception as e:
+        # 第三方解析库对损坏文件会抛出各种异常，一律视为无效
+        return False, None, str(e)[:200], time.perf_counter() - started
+    text_path = text_path_for(path)
+    tmp_path = text_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, text_path)
+    return True, page_count, text_path, time.perf_counter() - started
+
+class PdfProcessor:
+    """下载完成后的处理阶段
+
+    按主键顺序分批读取已下载但尚未处理的记录，在进程池中校验PDF结构、统计页数并提取纯文本，
+    每批结果合并为一次批量UPDATE。无效的PDF删除文件并标记为failed，由下载worker重新下载。
+    读取下一批记录并提交到进程池后才回写上一批，回写数据库时进程池不空闲。
+    """
+
+    def __init__(self, max_workers=PDF_PROCESS_WORKERS, engine=PDF_TEXT_ENGINE, store=None):
+        if engine not in PDF_ENGINES:
+            raise ValueError(f"不支持的PDF解析引擎: {engine}")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.engine = engine
+        self.store = store or PdfStore()
+
+    def _next_batch(self, session, last_id, batch_size):
+        return session.query(
+            PaperDownload.id, PaperDownload.download_path, PaperDownload.content_hash
+        ).filter(
+            PaperDownload.download_status == 'completed',
+            PaperDownload.processed_at.is_(None),
+            PaperDownload.download_path.isnot(None),
+            PaperDownload.id > last_id
+        ).order_by(PaperDownload.id).limit(batch_size).all()
+
+    def _record(self, session, rows, results):
+        """批量回写一批处理结果，返回 {'valid': n, 'invalid': n}"""
+        now = datetime.utcnow()
+        mappings = []
+        counts = Counter()
+        for row, (valid, page_count, detail, elapsed) in zip(rows, results):
+            PDF_PROCESS_SECONDS.observe(elapsed)
+            if valid:
+                mappings.append({'id': row.id, 'page_count': page_count, 'text_path': detail,
+                                 'processed_at': now})
+            else:
+                self.store.remove(row.download_path, row.content_hash)
+                mappings.append({'id': row.id, 'download_status': 'failed', 'download_error': f'PDF无效: {detail}',
+                                 'download_progress': 0, 'page_count': None, 'text_path': None,
+                                 'processed_at': now})
+            status = 'valid' if valid else 'invalid'
+            PDF_PROCESS_RESULTS.inc(status=status)
+            counts[status] += 1
+        session.bulk_update_mappings(PaperDownload, mappings)
+        session.commit()
+        return counts
+
+    def run(self, session, batch_size=PDF_PROCESS_BATCH_SIZE):
+        """处理所有已下载但尚未处理的PDF，返回 {'valid': n, 'invalid': n}"""
+        counts = Counter()
+        # 每个进程一次领取若干个文件，减少进程间通信
+        chunksize = max(1, batch_size // (self.max_workers * 4))
+        last_id = 0
+        pending = None
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                rows = self._next_batch(session, last_id, batch_size)
+                submitted = None
+                if rows:
+                    submitted = rows, executor.map(process_pdf, [row.download_path for row in rows],
+                                                   repeat(self.engine), chunksize=chunksize)
+                    last_id = rows[-1].id
+                if pending is not None:
+                    counts.update(self._record(session, *pending))
+                if submitted is None:
+                    return dict(counts)
+                pending = submitted
@@ -0,0 +1,104 @@
+import os
+import shutil
+import hashlib
+from pathlib import Path
+from ..settings import PAPERS_FOLDER
+
+# 计算已有文件哈希时每次读取的字节数
+HASH_READ_SIZE = 1024 * 1024
+
+class PdfStore:
+    """内容寻址的PDF存储
+
+    文件按SHA-256存放在 objects/<哈希前2位>/<哈希3-4位>/<哈希>.pdf，每篇论文的 <日期>/<arxiv_id>.pdf
+    是指向对象的硬链接。内容相同的论文共享同一个对象，重新下载得到不同内容时只替换论文的链接，不覆盖已有对象。
+    """
+
+    def __init__(self, base_dir=PAPERS_FOLDER):
+        self.base_dir = Path(base_dir)
+        self.objects_dir = self.base_dir / 'objects'
+
+    def object_path(self, content_hash):
+        return self.objects_dir / content_hash[:2] / content_hash[2:4] / f'{content_hash}.pdf'
+
+    def hasher(self, prefix_path=None):
+        """创建流式哈希对象，续传时先读入临时文件中已下载的部分"""
+        hasher = hashlib.sha256()
+        if prefix_path:
+            with open(prefix_path, 'rb') as f:
+                for block in iter(lambda: f.read(HASH_READ_SIZE), b''):
+                    hasher.update(block)
+        return hasher
+
+    def hash_file(self, path):
+        return self.hasher(path).hexdigest()
+
+    def commit(self, temp_path, content_hash, link_path):
+        """把下载完成的临时文件放入存储并链接到论文路径，返回对象路径"""
+        object_path = self.object_path(content_hash)
+        if object_path.exists():
+            # 内容已存在，丢弃重复的数据
+            os.remove(temp_path)
+        else:
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, object_path)
+        self._link(object_path, Path(link_path))
+        return str(object_path)
+
+    def _link(self, object_path, link_path):
+        """原子地把论文路径指向对象，不支持硬链接的文件系统退回复制"""
+        if link_path.exists() and os.path.samefile(object_path, link_path):
+            return
+        tmp_link = link_path.with_name(link_path.name + '.link')
+        if tmp_link.exists():
+            os.remove(tmp_link)
+        try:
+            os.link(object_path, tmp_link)
+        except OSError:
+            shutil.copyfile(object_path, tmp_link)
+        os.replace(tmp_link, link_path)
+
+    def is_intact(self, link_path, content_hash=None, size=None):
+        """只通过stat判断论文文件存在且完整，不读取文件内容
+
+        记录了大小和哈希时要求文件大小一致且对应的对象仍然存在，旧记录只检查文件是否存在。
+        """
+        try:
+            link_stat = os.stat(link_path)
+        except OSError:
+            return False
+        if size is not None and link_stat.st_size != size:
+            return False
+        if content_hash:
+            try:
+                object_stat = os.stat(self.object_path(content_hash))
+            except OSError:
+                return False
+            return object_stat.st_size == link_stat.st_size
+        return True
+
+    def remove(self, link_path, content_hash=None):
+        """删除损坏的论文文件，对象不再被其他论文链接时一并删除
+
+        其他论文仍链接同一对象时保留对象，只删除本论文的链接；重新下载时写入新的对象而不是链接回损坏的内容。
+        """
+        try:
+            os.remove(link_path)
+        except FileNotFoundError:
+            pass
+        if not content_hash:
+            return
+        object_path = self.object_path(content_hash)
+        try:
+            # 只剩对象自身这一个链接
+            if os.stat(object_path).st_nlink <= 1:
+                os.remove(object_path)
+        except FileNotFoundError:
+            pass
+
+    def verify(self, link_path, content_hash):
+        """重新计算哈希做完整校验，用于定期巡检"""
+        try:
+            return self.hash_file(link_path) == content_hash
+        except OSError:
+            return False
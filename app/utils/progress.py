@@ -0,0 +1,108 @@
+import time
+import threading
+from sqlalchemy import bindparam
+from .db_utils import db_manager
+from ..models.paper_download import PaperDownload
+from ..settings import PROGRESS_FLUSH_INTERVAL, PROGRESS_FLUSH_PERCENT
+
+class ProgressTracker:
+    """下载进度跟踪器
+
+    进度只在内存中更新，可随时通过 get/snapshot 实时查询；
+    数据库按时间间隔把所有进度变化超过阈值的下载记录合并成一次批量UPDATE写入。
+    最终状态仍由下载器在完成或失败时写入。
+    """
+
+    def __init__(self, flush_interval=PROGRESS_FLUSH_INTERVAL, flush_percent=PROGRESS_FLUSH_PERCENT):
+        self.flush_interval = flush_interval
+        self.flush_percent = flush_percent
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.entries = {}  # paper_id -> 进度信息
+        self.last_flush = time.monotonic()
+        self.db_writes = 0  # 实际执行的批量UPDATE次数
+
+    def start(self, paper_id, record_id):
+        """登记一个开始下载的论文"""
+        with self.lock:
+            self.entries[paper_id] = {
+                'record_id': record_id,
+                'downloaded': 0,
+                'total': 0,
+                'progress': 0.0,
+                'flushed_progress': 0.0,
+            }
+
+    def update(self, paper_id, downloaded, total, flush=True):
+        """更新内存中的下载进度，返回是否到了写库时间
+
+        flush为True时在当前线程合并写库，事件循环中调用时传False并自行在线程池中调用 flush。
+        """
+        with self.lock:
+            entry = self.entries.get(paper_id)
+            if entry is None:
+                return False
+            entry['downloaded'] = downloaded
+            entry['total'] = total
+            if total > 0:
+                entry['progress'] = (downloaded / total) * 100
+            due = time.monotonic() - self.last_flush >= self.flush_interval
+            if due:
+                # 每个间隔只有一个调用方负责写库
+                self.last_flush = time.monotonic()
+        if due and flush:
+            self.flush()
+        return due
+
+    def finish(self, paper_id):
+        """下载结束后移出跟踪器，最终状态由调用方写入"""
+        with self.lock:
+            return self.entries.pop(paper_id, None)
+
+    def get(self, paper_id):
+        """查询单篇论文的实时下载进度"""
+        with self.lock:
+            entry = self.entries.get(paper_id)
+            return dict(entry) if entry else None
+
+    def snapshot(self):
+        """查询所有进行中下载的实时进度"""
+        with self.lock:
+            return {paper_id: dict(entry) for paper_id, entry in self.entries.items()}
+
+    def flush(self):
+        """将进度变化超过阈值的记录合并为一次批量UPDATE写入数据库"""
+        # 已有线程在写库时直接返回，由它负责合并写入
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                self.last_flush = time.monotonic()
+                params = []
+                for entry in self.entries.values():
+                    if entry['progress'] - entry['flushed_progress'] >= self.flush_percent:
+                        entry['flushed_progress'] = entry['progress']
+                        params.append({'record_id': entry['record_id'], 'progress': entry['progress']})
+            if not params:
+                return
+
+            # 只更新仍处于downloading状态的记录，避免覆盖已写入的最终状态
+            table = PaperDownload.__table__
+            stmt = table.update().where(
+                table.c.id == bindparam('record_id'),
+                table.c.download_status == 'downloading'
+            ).values(download_progress=bindparam('progress'))
+            session = db_manager.get_session()
+            try:
+                session.execute(stmt, params)
+                session.commit()
+                self.db_writes += 1
+            except Exception:
+                session.rollback()
+            finally:
+                session.close()
+        finally:
+            self.flush_lock.release()
+
+# 创建全局进度跟踪器实例
+progress_tracker = ProgressTracker()
@@ -0,0 +1,148 @@
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+from ..settings import (RATE_LIMIT_ENABLED, RATE_LIMIT_STATE_DIR, RATE_LIMIT_INITIAL_RATE, RATE_LIMIT_MIN_RATE,
+                        RATE_LIMIT_MAX_RATE, RATE_LIMIT_BURST, RATE_LIMIT_INCREASE, RATE_LIMIT_TARGET_LATENCY)
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只在进程内共享限速状态
+    fcntl = None
+
+# 表示服务器过载、需要降低请求速率的状态码
+THROTTLE_STATUSES = (429, 503)
+
+def parse_retry_after(value):
+    """解析Retry-After响应头中的秒数，HTTP日期格式返回None"""
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """按主机共享的自适应令牌桶
+
+    令牌桶状态保存在 state_dir 下的JSON文件中，通过文件锁在爬虫、下载线程和多个进程之间共享。
+    速率调整类似TCP拥塞控制: 第一次被限流前每个正常响应把速率提高10%(慢启动)，之后每个正常响应增加
+    increase 次/秒，令牌有剩余(请求量未达到速率上限)时不提高；遇到429/503时速率减半并记为新的慢启动阈值，
+    同一窗口内只减半一次，同时遵守Retry-After暂停发起请求；响应时间超过目标值时速率降低20%。
+    state_dir为None时只在进程内共享。
+    """
+
+    def __init__(self, key, rate=RATE_LIMIT_INITIAL_RATE, min_rate=RATE_LIMIT_MIN_RATE, max_rate=RATE_LIMIT_MAX_RATE,
+                 burst=RATE_LIMIT_BURST, increase=RATE_LIMIT_INCREASE, target_latency=RATE_LIMIT_TARGET_LATENCY,
+                 state_dir=RATE_LIMIT_STATE_DIR):
+        self.key = key
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.target_latency = target_latency
+        self.path = Path(state_dir) / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.json" if state_dir else None
+        self.lock = threading.Lock()
+        self.state = None  # 不使用状态文件时的进程内状态
+
+    def _initial_state(self):
+        return {'rate': self.initial_rate, 'tokens': float(self.burst), 'updated': time.time(),
+                'threshold': self.max_rate}
+
+    @contextmanager
+    def _shared_state(self):
+        """在锁内读取并写回令牌桶状态"""
+        with self.lock:
+            if self.path is None or fcntl is None:
+                if self.state is None:
+                    self.state = self._initial_state()
+                yield self.state
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or 'null') or self._initial_state()
+                    except ValueError:
+                        state = self._initial_state()
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self):
+        """预订一个令牌，返回发起请求前需要等待的秒数"""
+        now = time.time()
+        with self._shared_state() as state:
+            # updated 可能在将来，表示服务器要求暂停到该时刻
+            elapsed = max(0.0, now - state['updated'])
+            state['tokens'] = min(self.burst, state['tokens'] + elapsed * state['rate']) - 1
+            state['updated'] = max(now, state['updated'])
+            return (state['updated'] - now) + max(0.0, -state['tokens']) / state['rate']
+
+    def acquire(self):
+        """阻塞直到可以发起请求，返回实际等待的秒数"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def feedback(self, status, latency=None, retry_after=None):
+        """根据响应调整共享速率"""
+        now = time.time()
+        with self._shared_state() as state:
+            rate = state['rate']
+            if status in THROTTLE_STATUSES:
+                pause = parse_retry_after(retry_after)
+                # 同一时间窗口内的多个429来自已发出的请求，只降速一次
+                if now >= state.get('backoff_until', 0):
+                    rate = max(self.min_rate, rate / 2)
+                    state['threshold'] = rate
+                    state['backoff_until'] = now + max(pause or 0, 1 / rate)
+                # 暂停期间不累积令牌
+                state['updated'] = max(state['updated'], now + (pause if pause is not None else 1 / rate))
+                state['tokens'] = min(state['tokens'], 0.0)
+            elif status < 400:
+                if latency is not None and latency > self.target_latency:
+                    rate = rate * 0.8
+                elif state['tokens'] >= 1:
+                    # 令牌有剩余说明请求量低于当前速率，不再提高
+                    pass
+                elif rate < state.get('threshold', self.max_rate):
+                    rate = min(rate * 1.1, state.get('threshold', self.max_rate))
+                else:
+                    rate = rate + self.increase
+            state['rate'] = min(self.max_rate, max(self.min_rate, rate))
+            return state['rate']
+
+    def rate(self):
+        with self._shared_state() as state:
+            return state['rate']
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def set_enabled(enabled):
+    """在进程内开启或关闭限速，爬虫设置 RATE_LIMIT_ENABLED=False 时同一进程中的PDF下载也不再限速"""
+    global RATE_LIMIT_ENABLED
+    RATE_LIMIT_ENABLED = enabled
+
+def get_rate_limiter(url):
+    """返回URL所在主机的限速器，关闭限速时返回None"""
+    if not RATE_LIMIT_ENABLED:
+        return None
+    host = urlparse(url).netloc or url
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = RateLimiter(host)
+        return limiter
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+from .db_utils import Paper, as_list
+from ..settings import SEARCH_INDEX_PATH
+
+# 各列在BM25排序中的权重，依次为 title, abstract, authors, categories
+COLUMN_WEIGHTS = (10.0, 1.0, 5.0, 2.0)
+
+class SearchIndex:
+    """基于SQLite FTS5的本地全文检索索引
+
+    对论文的标题、摘要、作者和分类建立倒排索引，按BM25排序返回arxiv_id。
+    索引保存在独立的SQLite文件中，与业务数据库类型无关；首次使用时才打开连接。
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self._create_tables()
+        return self.conn
+
+    def _create_tables(self):
+        # paper_docs 为每篇论文分配固定的rowid，更新时按rowid替换索引内容
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS paper_docs (
+                id INTEGER PRIMARY KEY,
+                arxiv_id TEXT NOT NULL UNIQUE
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, abstract, authors, categories,
+                tokenize = 'porter unicode61'
+            );
+        ''')
+
+    def _document(self, paper_data):
+        """将论文数据转换为索引文档，兼容PaperItem字典和数据库中的存储格式"""
+        authors = as_list(paper_data.get('authors'))
+        categories = as_list(paper_data.get('categories'))
+        return (paper_data.get('title') or '', paper_data.get('abstract') or '',
+                ' '.join(authors), ' '.join(categories))
+
+    def _write(self, conn, papers_data):
+        for paper_data in papers_data:
+            arxiv_id = paper_data['arxiv_id']
+            conn.execute('INSERT OR IGNORE INTO paper_docs (arxiv_id) VALUES (?)', (arxiv_id,))
+            rowid = conn.execute('SELECT id FROM paper_docs WHERE arxiv_id = ?', (arxiv_id,)).fetchone()[0]
+            conn.execute('DELETE FROM papers_fts WHERE rowid = ?', (rowid,))
+            conn.execute('INSERT INTO papers_fts (rowid, title, abstract, authors, categories) '
+                         'VALUES (?, ?, ?, ?, ?)', (rowid,) + self._document(paper_data))
+
+    def add_papers(self, papers_data):
+        """增量添加或更新一批论文，整批在一个事务中提交"""
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                self._write(conn, papers_data)
+
+    def search(self, query, limit=20, raw=False):
+        """检索论文，返回按相关度排序的 [(arxiv_id, score), ...]
+
+        默认将查询拆分为关键词后按AND匹配，raw=True时直接使用FTS5查询语法。
+        """
+        if not raw:
+            terms = query.split()
+            if not terms:
+                return []
+            query = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        with self.lock:
+            conn = self._connect()
+            rows = conn.execute(
+                f'SELECT d.arxiv_id, bm25(papers_fts, {weights}) AS score '
+                'FROM papers_fts JOIN paper_docs d ON d.id = papers_fts.rowid '
+                'WHERE papers_fts MATCH ? ORDER BY score LIMIT ?',
+                (query, limit)
+            ).fetchall()
+        # bm25越小越相关，取负数使分数越大越相关
+        return [(arxiv_id, -score) for arxiv_id, score in rows]
+
+    def rebuild(self, session, chunk_size=1000):
+        """清空索引后分批流式读取papers表重建，返回索引的论文数"""
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM papers_fts')
+                conn.execute('DELETE FROM paper_docs')
+            total = 0
+            batch = []
+            query = session.query(Paper.arxiv_id, Paper.title, Paper.abstract, Paper.authors,
+                                  Paper.categories).yield_per(chunk_size)
+            for row in query:
+                batch.append(row._asdict())
+                if len(batch) >= chunk_size:
+                    with conn:
+                        self._write(conn, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                with conn:
+                    self._write(conn, batch)
+                total += len(batch)
+            with conn:
+                conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('optimize')")
+            return total
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+# 创建全局检索索引实例
+search_index = SearchIndex()
@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import zlib
+import importlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+from .db_utils import Paper
+from ..settings import (EMBEDDER_CLASS, EMBEDDING_DIM, VECTOR_INDEX_BACKEND, VECTOR_INDEX_PATH,
+                      VECTOR_INDEX_NLIST, VECTOR_INDEX_NPROBE, MILVUS_URI, MILVUS_COLLECTION)
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只在进程内加锁
+    fcntl = None
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class HashingEmbedder:
+    """离线特征哈希向量化器
+
+    将一元词和二元词组通过带符号哈希映射到固定维度，按 log(1+tf) 加权后做L2归一化，
+    不需要训练和外部模型，可按批次整体向量化。
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        return tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        """将一批文本转换为 (n, dim) 的float32矩阵"""
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                key = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+                counts[key] = counts.get(key, 0) + 1
+            for (col, sign), count in counts.items():
+                rows.append(row)
+                cols.append(col)
+                values.append(sign * np.log1p(count))
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)),
+                  np.array(values, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+class LocalAnnIndex:
+    """基于内存映射文件的IVF近似最近邻索引
+
+    向量以float32追加写入 vectors.f32，每个向量对应的论文ID写入 paper_ids.i64，
+    所属聚类写入 lists.i32。向量数达到训练阈值后用k-means训练聚类中心，
+    检索时只读取 nprobe 个最近聚类中的向量，不需要把全部向量载入内存。
+    向量ID即其在文件中的行号。多个进程共用同一目录时通过 index.lock 文件锁串行追加，
+    加锁后重新读取元数据，不会分配到相同的向量ID。
+    """
+
+    def __init__(self, path=VECTOR_INDEX_PATH, dim=EMBEDDING_DIM, nlist=VECTOR_INDEX_NLIST,
+                 nprobe=VECTOR_INDEX_NPROBE):
+        self.path = path
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.vectors_path = os.path.join(path, 'vectors.f32')
+        self.ids_path = os.path.join(path, 'paper_ids.i64')
+        self.lists_path = os.path.join(path, 'lists.i32')
+        self.centroids_path = os.path.join(path, 'centroids.npy')
+        self.lock_path = os.path.join(path, 'index.lock')
+        self.meta = {'dim': dim, 'count': 0, 'trained': False}
+        self.centroids = None
+        self._load_meta()
+
+    def _load_meta(self):
+        """重新读取元数据，其他进程可能已追加向量或训练了聚类中心"""
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if meta['dim'] != self.dim:
+            raise ValueError(f"向量索引维度为 {meta['dim']}，与配置的 {self.dim} 不一致")
+        if meta['trained'] and self.centroids is None:
+            self.centroids = np.load(self.centroids_path)
+        self.meta = meta
+
+    @contextmanager
+    def _locked(self, shared=False):
+        """加进程内锁和跨进程文件锁，并重新读取元数据"""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    self._load_meta()
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @property
+    def count(self):
+        return self.meta['count']
+
+    def _save_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _memmap(self, path, dtype, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+    def _vectors(self):
+        return self._memmap(self.vectors_path, np.float32, (self.count, self.dim))
+
+    def _lists(self):
+        return self._memmap(self.lists_path, np.int32, (self.count,))
+
+    def _paper_ids(self):
+        return self._memmap(self.ids_path, np.int64, (self.count,))
+
+    def _assign(self, vectors):
+        """返回每个向量最近的聚类编号"""
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def add(self, vectors, paper_ids):
+        """追加一批向量，返回分配的向量ID列表"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._locked():
+            start = self.count
+            lists = self._assign(vectors) if self.meta['trained'] else np.full(len(vectors), -1, dtype=np.int32)
+            # 先追加数据文件，最后更新元数据，中途中断时多余的数据会被忽略并覆盖
+            for path, data in ((self.vectors_path, vectors),
+                               (self.ids_path, np.asarray(paper_ids, dtype=np.int64)),
+                               (self.lists_path, lists)):
+                with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                    f.seek(start * data.itemsize * (data.shape[1] if data.ndim > 1 else 1))
+                    f.write(data.tobytes())
+                    f.truncate()
+            self.meta['count'] = start + len(vectors)
+            self._save_meta()
+            if not self.meta['trained'] and self.count >= self.nlist * 39:
+                self._train()
+            return list(range(start, self.count))
+
+    def _train(self, sample_size=50000, iterations=10, chunk_size=50000):
+        """用k-means训练聚类中心并重新分配所有向量"""
+        vectors = self._vectors()
+        rng = np.random.default_rng(0)
+        sample = np.asarray(vectors[np.sort(rng.choice(self.count, min(sample_size, self.count), replace=False))])
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(self.nlist):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self.centroids = centroids.astype(np.float32)
+        np.save(self.centroids_path, self.centroids)
+
+        lists = np.memmap(self.lists_path, dtype=np.int32, mode='r+', shape=(self.count,))
+        for start in range(0, self.count, chunk_size):
+            lists[start:start + chunk_size] = self._assign(np.asarray(vectors[start:start + chunk_size]))
+        lists.flush()
+        self.meta['trained'] = True
+        self._save_meta()
+
+    def search(self, vector, k=10, chunk_size=100000):
+        """返回与查询向量最相似的 [(论文ID, 相似度), ...]"""
+        with self._locked(shared=True):
+            if self.count == 0:
+                return []
+            vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+            vectors = self._vectors()
+            paper_ids = self._paper_ids()
+            if self.meta['trained']:
+                probes = np.argsort(-(self.centroids @ vector))[:self.nprobe]
+                candidates = np.nonzero(np.isin(self._lists(), probes))[0]
+            else:
+                candidates = np.arange(self.count)
+
+            best_rows, best_scores = [], []
+            for start in range(0, len(candidates), chunk_size):
+                rows = candidates[start:start + chunk_size]
+                scores = np.asarray(vectors[rows]) @ vector
+                top = np.argsort(-scores)[:k * 2]
+                best_rows.append(rows[top])
+                best_scores.append(scores[top])
+            rows = np.concatenate(best_rows)
+            scores = np.concatenate(best_scores)
+
+            # 同一论文被重复向量化时只保留得分最高的一条
+            results = {}
+            for index in np.argsort(-scores):
+                paper_id = int(paper_ids[rows[index]])
+                if paper_id not in results:
+                    results[paper_id] = float(scores[index])
+                if len(results) >= k:
+                    break
+            return list(results.items())
+
+
+class MilvusIndex:
+    """Milvus向量库适配器，接口与LocalAnnIndex一致，需要安装pymilvus"""
+
+    def __init__(self, uri=MILVUS_URI, collection=MILVUS_COLLECTION, dim=EMBEDDING_DIM):
+        try:
+            from pymilvus import MilvusClient
+        except ImportError:
+            raise ImportError("使用Milvus向量库需要先安装pymilvus: pip install pymilvus")
+        self.client = MilvusClient(uri=uri)
+        self.collection = collection
+        if not self.client.has_collection(collection):
+            self.client.create_collection(collection, dimension=dim, metric_type='IP', auto_id=True)
+
+    def add(self, vectors, paper_ids):
+        result = self.client.insert(self.collection, [
+            {'vector': vector.tolist(), 'paper_id': int(paper_id)}
+            for vector, paper_id in zip(vectors, paper_ids)
+        ])
+        return list(result['ids'])
+
+    def search(self, vector, k=10):
+        hits = self.client.search(self.collection, data=[np.asarray(vector).tolist()], limit=k,
+                                  output_fields=['paper_id'])[0]
+        return [(hit['entity']['paper_id'], hit['distance']) for hit in hits]
+
+
+def load_embedder(path=EMBEDDER_CLASS):
+    """按 模块路径.类名 加载向量化器"""
+    module_path, class_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_path), class_name)()
+
+
+def create_vector_index(backend=VECTOR_INDEX_BACKEND):
+    if backend == 'milvus':
+        return MilvusIndex()
+    return LocalAnnIndex()
+
+
+class EmbeddingStage:
+    """为尚未向量化的论文批量生成向量，写入向量索引并批量回写 Paper.vector_id"""
+
+    def __init__(self, embedder=None, index=None):
+        self.embedder = embedder or load_embedder()
+        self.index = index or create_vector_index()
+
+    def _text(self, title, abstract):
+        return f'{title or ""}\n{abstract or ""}'
+
+    def run(self, session, batch_size=512):
+        """按主键顺序分批处理 vector_id 为空的论文，返回处理的论文数"""
+        total = 0
+        last_id = 0
+        while True:
+            rows = session.query(Paper.id, Paper.title, Paper.abstract).filter(
+                Paper.vector_id.is_(None), Paper.id > last_id
+            ).order_by(Paper.id).limit(batch_size).all()
+            if not rows:
+                return total
+            vectors = self.embedder.embed([self._text(row.title, row.abstract) for row in rows])
+            vector_ids = self.index.add(vectors, [row.id for row in rows])
+            session.bulk_update_mappings(Paper, [
+                {'id': row.id, 'vector_id': str(vector_id)} for row, vector_id in zip(rows, vector_ids)
+            ])
+            session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+
+    def similar(self, session, text, k=10):
+        """检索与文本最相似的论文，返回 [(arxiv_id, 相似度), ...]"""
+        hits = self.index.search(self.embedder.embed([text])[0], k)
+        id_map = dict(session.query(Paper.id, Paper.arxiv_id).filter(Paper.id.in_([h[0] for h in hits])))
+        return [(id_map[paper_id], score) for paper_id, score in hits if paper_id in id_map]
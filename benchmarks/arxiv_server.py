@@ -0,0 +1,224 @@
+"""本地arXiv替身服务器，用于离线基准测试
+
+提供 /list/{category}/recent?skip=&show= 分页列表页、/pdf/{arxiv_id}.pdf 单页PDF
+(支持 Range/If-Range 断点续传)，以及回放 fixtures/oai_page*.xml 的 /oai 接口。可配置每个分类的条目数、PDF大小、响应延迟、
+返回503的概率、传输中途断开连接的概率，以及超过后返回429的每秒请求数上限。
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from .listing_fixture import make_arxiv_ids, render_listing
+from .pdf_fixture import make_sized_pdf
+
+PDF_PATH = re.compile(r'^/pdf/(?P<arxiv_id>[^/]+)\.pdf$')
+LIST_PATH = re.compile(r'^/list/(?P<category>[^/]+)/recent$')
+FIXTURES_DIR = Path(__file__).with_name('fixtures')
+RANGE_HEADER = re.compile(r'^bytes=(\d+)-$')
+
+
+def make_pdf_bytes(size):
+    """生成指定大小、结构有效的单页PDF"""
+    return make_sized_pdf(size)
+
+
+class ArxivHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive
+
+    def do_GET(self):
+        config = self.server.config
+        if config['latency']:
+            time.sleep(config['latency'])
+        if not self.server.allow_request():
+            self.send_body(b'Too Many Requests', 'text/plain', status=429, headers={'Retry-After': '1'})
+            return
+        if random.random() < config['error_rate']:
+            self.send_body(b'Service Unavailable', 'text/plain', status=503)
+            return
+        url = urlparse(self.path)
+        list_match = LIST_PATH.match(url.path)
+        if list_match:
+            self.send_listing(list_match.group('category'), parse_qs(url.query))
+        elif PDF_PATH.match(url.path):
+            self.send_pdf()
+        elif url.path == '/oai':
+            self.send_oai(parse_qs(url.query))
+        else:
+            self.send_error(404)
+
+    def send_listing(self, category, query):
+        # 真实的列表页较大，生成和传输都比PDF请求慢
+        if self.server.config['listing_latency']:
+            time.sleep(self.server.config['listing_latency'])
+        arxiv_ids = self.server.category_ids(category)
+        skip = int(query.get('skip', ['0'])[0])
+        show = int(query.get('show', ['250'])[0])
+        body = render_listing(category, arxiv_ids[skip:skip + show], date=self.server.listing_date,
+                              total=len(arxiv_ids), skip=skip, seed=skip, versions=self.server.versions)
+        self.server.count_request('listing')
+        self.send_body(body, 'text/html; charset=utf-8')
+
+    def send_oai(self, query):
+        """按顺序回放录制的OAI-PMH响应，第N页的续传令牌指向第N+1页"""
+        pages = sorted(FIXTURES_DIR.glob('oai_page*.xml'))
+        self.server.record_oai(query)
+        token = query.get('resumptionToken', [None])[0]
+        index = 0
+        if token:
+            tokens = [re.search(rb'<resumptionToken[^>]*>([^<]*)<', page.read_bytes()).group(1).decode()
+                      for page in pages]
+            if token not in tokens:
+                body = (b'<?xml version="1.0" encoding="UTF-8"?><OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+                        b'<error code="badResumptionToken">expired</error></OAI-PMH>')
+                self.send_body(body, 'text/xml')
+                return
+            index = tokens.index(token) + 1
+        self.send_body(pages[index].read_bytes(), 'text/xml')
+
+    def send_pdf(self):
+        self.server.count_request('pdf')
+        body = self.server.pdf_bytes
+        etag = self.server.pdf_etag
+        start = 0
+        match = RANGE_HEADER.match(self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match and (if_range is None or if_range == etag):
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body) - start))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        payload = body[start:]
+        if random.random() < self.server.config['drop_rate']:
+            # 模拟链路中断: 只发送部分内容后直接断开连接
+            cut = random.randint(1, max(len(payload) - 1, 1))
+            self.wfile.write(payload[:cut])
+            self.server.bytes_sent_add(cut)
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+        self.server.bytes_sent_add(len(payload))
+
+    def send_body(self, body, content_type, status=200, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ArxivServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, pdf_size=512 * 1024, latency=0.0, drop_rate=0.0,
+                 error_rate=0.0, entries_per_category=300, listing_date=None, rate_limit=0, listing_latency=0.0):
+        super().__init__((host, port), ArxivHandler)
+        self.config = {'pdf_size': pdf_size, 'latency': latency, 'drop_rate': drop_rate,
+                       'error_rate': error_rate, 'entries_per_category': entries_per_category,
+                       'rate_limit': rate_limit, 'listing_latency': listing_latency}
+        self.pdf_bytes = make_pdf_bytes(pdf_size)
+        self.pdf_etag = f'"pdf-{pdf_size}"'
+        # 列表页默认使用当天日期，与爬虫按发布日期入队下载的逻辑一致
+        self.listing_date = listing_date or datetime.utcnow()
+        self.categories = {}
+        self.bytes_sent = 0
+        self.requests = {'listing': 0, 'pdf': 0, 'throttled': 0}
+        # 修订过的论文 {arxiv_id: 最新版本号}，列表页的HTML链接带上对应版本
+        self.versions = {}
+        # 收到的OAI-PMH请求参数，按到达顺序记录
+        self.oai_requests = []
+        self.stats_lock = threading.Lock()
+        # 服务器端令牌桶，容量为1秒的请求数
+        self.throttle_tokens = float(rate_limit)
+        self.throttle_updated = time.monotonic()
+
+    def category_ids(self, category):
+        """每个分类使用互不重叠的论文ID区间"""
+        with self.stats_lock:
+            if category not in self.categories:
+                count = self.config['entries_per_category']
+                self.categories[category] = make_arxiv_ids(count, start=len(self.categories) * count + 1)
+            return self.categories[category]
+
+    def allow_request(self):
+        """超过每秒请求数上限时返回False"""
+        rate = self.config['rate_limit']
+        if not rate:
+            return True
+        with self.stats_lock:
+            now = time.monotonic()
+            self.throttle_tokens = min(rate, self.throttle_tokens + (now - self.throttle_updated) * rate)
+            self.throttle_updated = now
+            if self.throttle_tokens >= 1:
+                self.throttle_tokens -= 1
+                return True
+            self.requests['throttled'] += 1
+            return False
+
+    def count_request(self, kind):
+        with self.stats_lock:
+            self.requests[kind] += 1
+
+    def record_oai(self, query):
+        with self.stats_lock:
+            self.oai_requests.append({key: values[0] for key, values in query.items()})
+
+    def bytes_sent_add(self, count):
+        with self.stats_lock:
+            self.bytes_sent += count
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """在后台线程中启动服务器"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pdf-size', type=int, default=512 * 1024)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--listing-latency', type=float, default=0.0, help='列表页额外的响应延迟(秒)')
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--entries', type=int, default=300, help='每个分类的条目数')
+    parser.add_argument('--rate-limit', type=float, default=0, help='每秒请求数上限，0表示不限制')
+    args = parser.parse_args()
+    server = ArxivServer(port=args.port, pdf_size=args.pdf_size, latency=args.latency,
+                         drop_rate=args.drop_rate, error_rate=args.error_rate,
+                         entries_per_category=args.entries, rate_limit=args.rate_limit,
+                         listing_latency=args.listing_latency)
+    print(f'serving on {server.base_url}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""对比线程引擎与asyncio引擎在本地PDF服务器上的下载吞吐量
+
+用法: python -m benchmarks.bench_download --papers 200 --pdf-size 524288 --latency 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+
+def create_papers(manager, count, base_url, offset):
+    """在基准数据库中创建指向本地服务器的论文记录"""
+    from app.utils.db_utils import Paper
+    # 提交后不过期属性，论文对象脱离会话后仍可供下载线程读取
+    session = manager.Session(expire_on_commit=False)
+    papers = []
+    for i in range(count):
+        arxiv_id = f'2501.{offset + i:05d}'
+        papers.append(Paper(
+            arxiv_id=arxiv_id,
+            title=f'Benchmark paper {arxiv_id}',
+            authors='[]',
+            abstract='',
+            pdf_url=f'{base_url}/pdf/{arxiv_id}.pdf',
+            published_date=datetime(2025, 1, 1),
+            created_at=datetime(2025, 1, 1),
+        ))
+    session.add_all(papers)
+    session.commit()
+    session.close()
+    return papers
+
+
+def run_engine(downloader, papers, papers_dir):
+    downloader.base_dir = papers_dir
+    start = time.perf_counter()
+    futures = downloader.download_papers(papers)
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for success, _ in results if success)
+    return elapsed, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--papers', type=int, default=100)
+    parser.add_argument('--pdf-size', type=int, default=512 * 1024)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--no-politeness', action='store_true',
+                        help='关闭限速和单主机并发限制，只比较引擎本身的开销')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 必须在导入app模块前指定数据库，使全局db_manager指向SQLite
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from pathlib import Path
+        from app.utils.db_utils import db_manager
+        from app.utils.downloader import PaperDownloader
+        from app.utils.async_downloader import AsyncPaperDownloader
+        from .arxiv_server import ArxivServer
+
+        if args.no_politeness:
+            from app.utils import async_downloader as async_module, rate_limiter as rate_limiter_module
+            rate_limiter_module.RATE_LIMIT_ENABLED = False
+            async_module.DOWNLOAD_PER_HOST_CONCURRENCY = async_module.DOWNLOAD_ASYNC_MAX_CONCURRENCY
+
+        db_manager.create_tables()
+        server = ArxivServer(pdf_size=args.pdf_size, latency=args.latency).start()
+        total_mb = args.papers * args.pdf_size / (1024 * 1024)
+
+        for offset, (name, engine) in enumerate([('thread', PaperDownloader()),
+                                                 ('asyncio', AsyncPaperDownloader())]):
+            papers = create_papers(db_manager, args.papers, server.base_url, offset * args.papers)
+            papers_dir = Path(tmp) / name
+            papers_dir.mkdir()
+            elapsed, ok = run_engine(engine, papers, papers_dir)
+            print(f'{name}: {ok}/{args.papers} 成功, {elapsed:.2f}s, '
+                  f'{args.papers / elapsed:.1f} papers/sec, {total_mb / elapsed:.1f} MB/s')
+            engine.close()
+
+        server.shutdown()
+        db_manager.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""测量流式导出在不同表大小下的耗时和峰值内存
+
+每种规模先建好SQLite库，再在新的子进程中导出，报告导出行数、耗时和子进程的峰值RSS。
+流式导出的内存占用应与表大小无关，只取决于 --chunk-size。
+
+用法: python -m benchmarks.bench_export --sizes 20000,200000 --format jsonl
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+EXPORT_PROBE = '''
+import json, resource, sys, time
+from datetime import datetime
+from app.utils.db_utils import db_manager, Paper
+from app.utils.exporter import Exporter
+
+fmt, chunk_size, out_dir = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+session = db_manager.get_session()
+exporter = Exporter(out_dir)
+t = time.perf_counter()
+exported = exporter.run(session, tables=['papers'], fmt=fmt, chunk_size=chunk_size)
+elapsed = time.perf_counter() - t
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# 再修改少量论文，增量导出只应包含这些行
+with db_manager.engine.begin() as conn:
+    conn.execute(Paper.__table__.update().where(Paper.id <= 10).values(updated_at=datetime.utcnow()))
+incremental = exporter.run(session, tables=['papers'], fmt=fmt, chunk_size=chunk_size)
+session.close()
+print(json.dumps({'rows': exported[0][2], 'seconds': round(elapsed, 2),
+                  'rows_per_sec': round(exported[0][2] / elapsed),
+                  'peak_rss_mb': round(peak / 1024, 1), 'rss_growth_mb': round((peak - before) / 1024, 1),
+                  'incremental_rows': incremental[0][2] if incremental else 0}))
+'''
+
+
+def seed(db_url, count):
+    """用批量INSERT写入 count 篇论文"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine
+    from app.utils.db_utils import Base, Paper
+
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    base = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        for start in range(0, count, 10000):
+            conn.execute(Paper.__table__.insert(), [{
+                'arxiv_id': f'2501.{i:06d}', 'title': f'Benchmark paper {i}', 'authors': '["A", "B"]',
+                'abstract': 'x' * 800, 'categories': 'cs.AI', 'pdf_url': f'http://localhost/pdf/{i}.pdf',
+                'published_date': base, 'created_at': base, 'updated_at': base + timedelta(seconds=i),
+            } for i in range(start, min(start + 10000, count))])
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='20000,200000')
+    parser.add_argument('--format', default='jsonl')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    reports = []
+    for size in map(int, args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_url = f"sqlite:///{os.path.join(tmp, 'export.db')}"
+            seed(db_url, size)
+            env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT), DB_URL=db_url)
+            output = subprocess.run([sys.executable, '-c', EXPORT_PROBE, args.format,
+                                     str(args.chunk_size), os.path.join(tmp, 'exports')],
+                                    cwd=tmp, env=env, capture_output=True, text=True, check=True).stdout
+            reports.append(dict(json.loads(output.strip().splitlines()[-1]), format=args.format))
+    for report in reports:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""列表页解析基准测试，统计每秒解析的条目数和每页的内存分配
+
+默认使用按arXiv列表页结构生成的页面，也可以通过 --fixtures 传入保存的真实列表页HTML。
+用法: python -m benchmarks.bench_parse --pages 20
+      python -m benchmarks.bench_parse --fixtures saved/*.html
+"""
+import argparse
+import time
+import tracemalloc
+from app.spiders.listing_parser import parse_listing
+from .listing_fixture import make_arxiv_ids, render_listing
+
+
+def load_pages(args):
+    if args.fixtures:
+        pages = []
+        for path in args.fixtures:
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+        return pages
+    return [render_listing('cs.CL', make_arxiv_ids(args.entries, start=i * args.entries), seed=i)
+            for i in range(args.pages)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fixtures', nargs='*', help='保存的arXiv列表页HTML文件')
+    parser.add_argument('--pages', type=int, default=20, help='生成的页面数')
+    parser.add_argument('--entries', type=int, default=250, help='每个生成页面的条目数')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+
+    entries = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for body in pages:
+            entries += len(parse_listing(body)['entries'])
+    elapsed = time.perf_counter() - start
+
+    # 单独统计一轮的内存分配，避免tracemalloc拖慢计时
+    tracemalloc.start()
+    blocks = 0
+    peak = 0
+    for body in pages:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        parse_listing(body)
+        after = tracemalloc.take_snapshot()
+        blocks += sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    print(f'页面数: {len(pages)}, 条目数: {entries // args.repeat}')
+    print(f'解析速度: {entries / elapsed:.0f} entries/sec, {len(pages) * args.repeat / elapsed:.1f} pages/sec')
+    print(f'每页内存: 解析后驻留 {blocks / len(pages):.0f} 个内存块, 解析峰值 {peak / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""在本地PDF样本上测量下载后处理阶段的吞吐随进程数的变化
+
+生成多页PDF样本(其中一部分是HTML错误页或被截断的文件)，为每个文件创建已完成的下载记录，
+分别用当前进程串行处理和不同进程数的 PdfProcessor 处理，报告每秒处理的文件数、MB/s和相对单进程的加速比，
+并检查无效文件都被标记为failed。
+
+用法: python -m benchmarks.bench_pdf_process --papers 400 --pages 20 --workers 1,2,4
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+
+def write_corpus(papers_dir, count, pages, broken_every):
+    """写入样本文件，返回 [(路径, 是否有效)]"""
+    from .pdf_fixture import make_pdf, random_pages
+
+    os.makedirs(papers_dir, exist_ok=True)
+    corpus = []
+    for i in range(count):
+        path = os.path.join(papers_dir, f'2501.{i:05d}.pdf')
+        pdf = make_pdf(random_pages(pages, seed=i))
+        valid = not (broken_every and i % broken_every == broken_every - 1)
+        if not valid:
+            # 交替生成HTML错误页和被截断的文件
+            pdf = b'<html><body>503 Service Unavailable</body></html>' if i % 2 else pdf[:len(pdf) // 2]
+        with open(path, 'wb') as f:
+            f.write(pdf)
+        corpus.append((path, valid))
+    return corpus
+
+
+def reset_records(manager, corpus):
+    """为样本创建或重置为已完成、未处理的下载记录"""
+    from app.utils.db_utils import Paper
+    from app.models.paper_download import PaperDownload
+
+    session = manager.get_session()
+    session.query(PaperDownload).delete()
+    session.query(Paper).delete()
+    papers = [Paper(arxiv_id=os.path.basename(path)[:-4], title='', authors='[]', abstract='',
+                    published_date=datetime(2025, 1, 1)) for path, _ in corpus]
+    session.add_all(papers)
+    session.flush()
+    session.add_all([PaperDownload(paper_id=paper.id, download_status='completed', download_progress=100,
+                                   download_path=path) for paper, (path, _) in zip(papers, corpus)])
+    session.commit()
+    session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--papers', type=int, default=400)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--broken-every', type=int, default=20, help='每多少个文件中有一个无效文件，0表示全部有效')
+    parser.add_argument('--workers', default=None, help='逗号分隔的进程数，默认为1到CPU核数的2的幂')
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(value) for value in args.workers.split(',')]
+    else:
+        worker_counts = sorted({1, cpus} | {2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app.utils.db_utils import db_manager
+        from app.utils.pdf_processor import PdfProcessor, process_pdf
+        from app.utils.pdf_store import PdfStore
+        from app.models.paper_download import PaperDownload
+
+        db_manager.create_tables()
+        papers_dir = os.path.join(tmp, 'papers')
+        corpus = write_corpus(papers_dir, args.papers, args.pages, args.broken_every)
+        total_mb = sum(os.path.getsize(path) for path, _ in corpus) / 1024 / 1024
+        expected_invalid = sum(1 for _, valid in corpus if not valid)
+
+        reports = []
+        # 串行基线: 在当前进程中逐个处理，不回写数据库
+        start = time.perf_counter()
+        serial_valid = sum(1 for path, _ in corpus if process_pdf(path)[0])
+        serial = time.perf_counter() - start
+        reports.append({'mode': 'serial', 'valid': serial_valid, 'elapsed_sec': round(serial, 2),
+                        'pdfs_per_sec': round(len(corpus) / serial, 1), 'mb_per_sec': round(total_mb / serial, 1)})
+
+        baseline = None
+        for workers in worker_counts:
+            # 上一轮删除了无效文件，重新生成样本
+            corpus = write_corpus(papers_dir, args.papers, args.pages, args.broken_every)
+            reset_records(db_manager, corpus)
+            session = db_manager.get_session()
+            start = time.perf_counter()
+            counts = PdfProcessor(workers, store=PdfStore(papers_dir)).run(session, batch_size=args.batch_size)
+            elapsed = time.perf_counter() - start
+            failed = session.query(PaperDownload).filter_by(download_status='failed').count()
+            session.close()
+            baseline = baseline or elapsed
+            reports.append({
+                'mode': f'processes={workers}',
+                'valid': counts.get('valid', 0),
+                'invalid': counts.get('invalid', 0),
+                'marked_failed': failed,
+                'elapsed_sec': round(elapsed, 2),
+                'pdfs_per_sec': round(len(corpus) / elapsed, 1),
+                'mb_per_sec': round(total_mb / elapsed, 1),
+                'speedup': round(baseline / elapsed, 2),
+            })
+        db_manager.engine.dispose()
+
+    print(f"样本: {args.papers} 个文件, {total_mb:.1f} MB, 其中无效 {expected_invalid} 个, CPU核数 {cpus}")
+    for report in reports:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
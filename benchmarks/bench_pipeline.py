@@ -0,0 +1,69 @@
+"""对比逐条保存与批量写入两种方式在本地SQLite上的写入吞吐量
+
+用法: python -m benchmarks.bench_pipeline --rows 5000 --batch-size 100
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from app.utils.db_utils import DBManager
+
+
+def make_papers(count, offset=0):
+    """生成测试用论文数据"""
+    return [{
+        'arxiv_id': f'2501.{offset + i:05d}',
+        'title': f'Benchmark paper {offset + i}',
+        'authors': ['Alice', 'Bob'],
+        'institutions': [],
+        'abstract': 'lorem ipsum ' * 50,
+        'pdf_url': f'https://arxiv.org/pdf/2501.{offset + i:05d}.pdf',
+        'published_date': datetime(2025, 1, 1),
+        'categories': ['cs.CL', 'cs.AI'],
+    } for i in range(count)]
+
+
+def bench_per_item(manager, papers):
+    session = manager.get_session()
+    start = time.perf_counter()
+    for paper in papers:
+        manager.save_paper(session, paper)
+    elapsed = time.perf_counter() - start
+    session.close()
+    return len(papers) / elapsed
+
+
+def bench_batched(manager, papers, batch_size):
+    session = manager.get_session()
+    start = time.perf_counter()
+    for i in range(0, len(papers), batch_size):
+        manager.save_papers(session, papers[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    session.close()
+    return len(papers) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--db-url', default=None, help='默认使用临时SQLite文件')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = args.db_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        manager = DBManager(db_url)
+        manager.create_tables()
+
+        per_item = bench_per_item(manager, make_papers(args.rows))
+        batched = bench_batched(manager, make_papers(args.rows, offset=args.rows), args.batch_size)
+        manager.engine.dispose()
+
+    print(f"逐条保存: {per_item:.0f} rows/sec")
+    print(f"批量写入(batch={args.batch_size}): {batched:.0f} rows/sec")
+    print(f"加速比: {batched / per_item:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
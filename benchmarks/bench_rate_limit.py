@@ -0,0 +1,93 @@
+"""在限制每秒请求数的本地服务器上比较下载限速策略
+
+- fixed-delay: 旧策略，2个下载线程，每篇论文后固定等待1秒
+- unthrottled: 不限速，多线程直接请求，依靠重试退避处理429
+- adaptive: 共享的自适应令牌桶，根据429/Retry-After调整速率
+
+用法: python -m benchmarks.bench_rate_limit --papers 60 --server-rate 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def run(name, papers, server, workers, limiter=None, delay=0):
+    from app.utils import downloader as downloader_module, rate_limiter as rate_limiter_module
+
+    host = server.base_url.split('//', 1)[1]
+    rate_limiter_module._limiters.clear()
+    rate_limiter_module.RATE_LIMIT_ENABLED = limiter is not None
+    if limiter is not None:
+        rate_limiter_module._limiters[host] = limiter
+    downloader = downloader_module.PaperDownloader()
+    downloader.max_workers = workers
+    downloader.download_semaphore = downloader_module.threading.Semaphore(workers)
+    if delay:
+        download = downloader.download_paper
+
+        def delayed(paper):
+            result = download(paper)
+            time.sleep(delay)
+            return result
+        downloader.download_paper = delayed
+
+    throttled = server.requests['throttled']
+    start = time.perf_counter()
+    results = [future.result() for future in downloader.download_papers(papers)]
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for success, _ in results if success)
+    return {
+        'strategy': name,
+        'ok': ok,
+        'elapsed_sec': round(elapsed, 2),
+        'papers_per_sec': round(ok / elapsed, 2),
+        'throttled_429': server.requests['throttled'] - throttled,
+        'final_rate': round(limiter.rate(), 2) if limiter is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--papers', type=int, default=60)
+    parser.add_argument('--pdf-size', type=int, default=32 * 1024)
+    parser.add_argument('--server-rate', type=float, default=5, help='服务器允许的每秒请求数')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.chdir(tmp)
+        from app.utils import downloader as downloader_module
+        from app.utils.db_utils import db_manager
+        from app.utils.rate_limiter import RateLimiter
+        from .arxiv_server import ArxivServer
+        from .bench_download import create_papers
+
+        downloader_module.DOWNLOAD_RETRY_DELAY = 1
+        downloader_module.DOWNLOAD_RETRY_TIMES = 8
+        db_manager.create_tables()
+        server = ArxivServer(pdf_size=args.pdf_size, rate_limit=args.server_rate).start()
+        host = server.base_url.split('//', 1)[1]
+
+        reports = []
+        scenarios = [
+            ('fixed-delay', 2, None, 1),
+            ('unthrottled', args.workers, None, 0),
+            ('adaptive', args.workers, RateLimiter(host, max_rate=args.server_rate * 4,
+                                                   state_dir=os.path.join(tmp, 'ratelimit')), 0),
+        ]
+        for offset, (name, workers, limiter, delay) in enumerate(scenarios):
+            papers = create_papers(db_manager, args.papers, server.base_url, offset * args.papers)
+            # 每个场景开始前让服务器的令牌桶回满
+            time.sleep(1)
+            reports.append(run(name, papers, server, workers, limiter, delay))
+        server.shutdown()
+        db_manager.engine.dispose()
+
+    for report in reports:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
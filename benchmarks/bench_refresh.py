@@ -0,0 +1,91 @@
+"""测量重新爬取时的数据库写入量和修订论文的更新
+
+在本地arXiv替身服务器和SQLite上以非增量模式连续爬取三轮:
+1. 首次爬取，所有论文入库并下载PDF
+2. 列表页没有变化，应当不产生论文写入和下载
+3. 部分论文出现v2，只有这些论文被更新，其PDF重新下载
+
+每轮在独立子进程中运行爬虫，报告各轮产出的论文数、INSERT/UPDATE/DELETE语句数和PDF请求数。
+
+用法: python -m benchmarks.bench_refresh --entries 600 --revised 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+WRITE_OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def crawl(categories, base_url, tmp):
+    """在子进程中运行一次非增量爬取，返回 (耗时, Scrapy统计信息)"""
+    stats_file = os.path.join(tmp, 'stats.json')
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE='app.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    command = [sys.executable, '-m', 'scrapy', 'crawl', 'arxiv',
+               '-a', f'categories={categories}', '-a', f'base_url={base_url}', '-a', 'incremental=false',
+               '-s', f'STATS_FILE={stats_file}', '-s', 'METRICS_FILE=', '-s', 'RATE_LIMIT_ENABLED=False',
+               '-s', 'LOG_LEVEL=WARNING']
+    start = time.perf_counter()
+    subprocess.run(command, env=env, cwd=tmp, check=True, capture_output=True)
+    elapsed = time.perf_counter() - start
+    with open(stats_file) as f:
+        return elapsed, json.load(f)
+
+
+def db_writes(stats):
+    return {operation: int(stats.get(f'metrics/paperspider_db_query_seconds{{operation={operation}}}/count', 0))
+            for operation in WRITE_OPERATIONS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--categories', default='cs.CL,cs.AI')
+    parser.add_argument('--entries', type=int, default=600, help='每个分类的条目数')
+    parser.add_argument('--revised', type=int, default=30, help='第三轮出现新版本的论文数')
+    parser.add_argument('--pdf-size', type=int, default=32 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'refresh.db')}"
+        from app.utils.db_utils import db_manager, Paper
+        from .arxiv_server import ArxivServer
+
+        db_manager.create_tables()
+        server = ArxivServer(pdf_size=args.pdf_size, entries_per_category=args.entries).start()
+
+        reports = []
+        for round_no in (1, 2, 3):
+            if round_no == 3:
+                # 每个分类中最新的若干篇论文出现v2
+                for arxiv_ids in server.categories.values():
+                    server.versions.update((arxiv_id, 2) for arxiv_id in arxiv_ids[:args.revised // len(server.categories)])
+            pdf_requests = server.requests['pdf']
+            elapsed, stats = crawl(args.categories, server.base_url, tmp)
+            reports.append({
+                'round': round_no,
+                'elapsed_sec': round(elapsed, 2),
+                'items': stats.get('item_scraped_count', 0),
+                'unchanged': stats.get('arxiv/papers_unchanged', 0),
+                'revised': stats.get('pipeline/papers_revised', 0),
+                'db_writes': db_writes(stats),
+                'pdf_requests': server.requests['pdf'] - pdf_requests,
+            })
+
+        session = db_manager.get_session()
+        reports.append({'papers_v2': session.query(Paper).filter(Paper.version == 2).count()})
+        session.close()
+        server.shutdown()
+        db_manager.engine.dispose()
+
+    for report in reports:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
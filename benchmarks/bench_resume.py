@@ -0,0 +1,55 @@
+"""在会中途断开连接的本地服务器上验证断点续传，并统计实际传输的字节数
+
+用法: python -m benchmarks.bench_resume --papers 20 --pdf-size 2097152 --drop-rate 0.5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--papers', type=int, default=20)
+    parser.add_argument('--pdf-size', type=int, default=2 * 1024 * 1024)
+    parser.add_argument('--drop-rate', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 必须在导入app模块前指定数据库，使全局db_manager指向SQLite
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from pathlib import Path
+        from app.utils import downloader as downloader_module, rate_limiter as rate_limiter_module
+        from app.utils.db_utils import db_manager
+        from .arxiv_server import ArxivServer
+        from .bench_download import create_papers
+
+        # 断线重试不需要等待，也不限速
+        rate_limiter_module.RATE_LIMIT_ENABLED = False
+        downloader_module.DOWNLOAD_RETRY_DELAY = 0
+        downloader_module.DOWNLOAD_RETRY_TIMES = 20
+
+        db_manager.create_tables()
+        server = ArxivServer(pdf_size=args.pdf_size, drop_rate=args.drop_rate).start()
+        papers = create_papers(db_manager, args.papers, server.base_url, 0)
+        downloader = downloader_module.PaperDownloader()
+        downloader.base_dir = Path(tmp)
+
+        start = time.perf_counter()
+        results = [downloader.download_paper(paper) for paper in papers]
+        elapsed = time.perf_counter() - start
+
+        ok = sum(1 for success, _ in results if success)
+        intact = sum(1 for paper in papers
+                     if os.path.exists(downloader.get_download_path(paper))
+                     and os.path.getsize(downloader.get_download_path(paper)) == args.pdf_size)
+        payload = args.papers * args.pdf_size
+        print(f'成功 {ok}/{args.papers}, 文件完整 {intact}/{args.papers}, 耗时 {elapsed:.2f}s')
+        print(f'传输字节 {server.bytes_sent} / 有效字节 {payload} '
+              f'(重复传输 {(server.bytes_sent - payload) / payload:.1%})')
+        server.shutdown()
+        db_manager.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
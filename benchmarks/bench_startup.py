@@ -0,0 +1,102 @@
+"""测量导入耗时、导入时创建的资源，以及并发和fork场景下的数据库连接数
+
+每个模块在新的子进程中导入，报告导入耗时中位数、导入后新增的线程数、是否已创建数据库引擎和论文目录。
+连接测试在SQLite上用多个线程反复执行短查询，统计实际建立的连接数；fork测试检查子进程是否复用了父进程的连接。
+
+用法: python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MODULES = ['app.utils.db_utils', 'app.utils.downloader', 'app.spiders.pipelines', 'tasks']
+
+IMPORT_PROBE = '''
+import json, os, sys, threading, time, importlib
+threads = threading.active_count()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+db_utils = sys.modules.get('app.utils.db_utils')
+manager = getattr(db_utils, 'db_manager', None)
+engine = None if manager is None else manager.__dict__.get('_engine', manager.__dict__.get('engine'))
+print(json.dumps({'seconds': elapsed, 'threads': threading.active_count() - threads,
+                  'engine_created': engine is not None, 'papers_dir': os.path.exists('papers')}))
+'''
+
+
+def probe_import(module, repeat):
+    """在新进程中导入模块，返回多次测量的汇总"""
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT))
+            env.pop('DB_URL', None)
+            output = subprocess.run([sys.executable, '-c', IMPORT_PROBE, module], cwd=tmp, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    result = runs[-1]
+    result['seconds'] = statistics.median(run['seconds'] for run in runs)
+    return result
+
+
+def count_connections(threads, queries):
+    """多个线程各自执行短查询，返回 (建立的连接数, fork后子进程新建的连接数)"""
+    from sqlalchemy import event, text
+    from app.utils.db_utils import db_manager
+
+    connects = []
+    event.listen(db_manager.engine, 'connect', lambda *args: connects.append(os.getpid()))
+
+    def work():
+        for _ in range(queries):
+            session = db_manager.get_session()
+            try:
+                session.execute(text('SELECT 1'))
+            finally:
+                session.close()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    parent_connects = len(connects)
+
+    # 子进程中执行一次查询，重置过连接池时会新建连接，否则复用父进程的连接
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        work()
+        os.write(write_fd, str(sum(1 for p in connects if p == os.getpid())).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    child_connects = int(os.read(read_fd, 32) or b'0')
+    return parent_connects, child_connects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    report = {'imports': {module: probe_import(module, args.repeat) for module in MODULES}}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        parent, child = count_connections(args.threads, args.queries)
+        report['connections'] = {'threads': args.threads, 'queries_per_thread': args.queries,
+                                 'opened': parent, 'opened_in_forked_child': child}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
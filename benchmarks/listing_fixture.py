@@ -0,0 +1,79 @@
+"""按arXiv列表页(/list/{category}/recent)的HTML结构生成测试页面"""
+import random
+from datetime import datetime, timedelta
+
+SUBJECTS = [
+    'Computation and Language (cs.CL)',
+    'Artificial Intelligence (cs.AI)',
+    'Machine Learning (cs.LG)',
+    'Computer Vision and Pattern Recognition (cs.CV)',
+    'Information Retrieval (cs.IR)',
+]
+
+
+def make_arxiv_ids(count, yymm='2510', start=1):
+    """生成从新到旧排列的论文ID"""
+    return [f'{yymm}.{start + count - i:05d}' for i in range(count)]
+
+
+def render_entry(index, arxiv_id, rng, version=1):
+    authors = ', '.join(
+        f'<a href="https://arxiv.org/a/author_{rng.randint(1, 10 ** 6)}">Author {rng.randint(1, 10 ** 6)}</a>'
+        for _ in range(rng.randint(1, 8)))
+    primary, *others = rng.sample(SUBJECTS, rng.randint(1, 3))
+    other_subjects = ''.join(f'; {subject}' for subject in others)
+    return f'''<dt>
+    <a name='item{index}'>[{index}]</a>
+    <a href ="/abs/{arxiv_id}" title="Abstract" id="{arxiv_id}">
+        arXiv:{arxiv_id}
+    </a>
+    [<a href="/pdf/{arxiv_id}" title="Download PDF" id="pdf-{arxiv_id}" aria-labelledby="pdf-{arxiv_id}">pdf</a>, <a href="/html/{arxiv_id}v{version}" title="View HTML" id="html-{arxiv_id}" aria-labelledby="html-{arxiv_id}" rel="noopener noreferrer" target="_blank">html</a>, <a href="/format/{arxiv_id}" title="Other formats" id="oth-{arxiv_id}" aria-labelledby="oth-{arxiv_id}">other</a>]
+</dt>
+<dd>
+    <div class='meta'>
+        <div class='list-title mathjax'><span class='descriptor'>Title:</span>
+            Benchmark Paper {arxiv_id}: On the Scaling of Synthetic Listings
+        </div>
+        <div class='list-authors'>{authors}</div>
+        <div class='list-comments mathjax'><span class='descriptor'>Comments:</span>
+            {rng.randint(5, 40)} pages, {rng.randint(1, 12)} figures
+        </div>
+        <div class='list-subjects'><span class='descriptor'>Subjects:</span>
+            <span class="primary-subject">{primary}</span>{other_subjects}
+        </div>
+    </div>
+</dd>
+'''
+
+
+def render_listing(category, arxiv_ids, date=None, total=None, skip=0, show=250, seed=0, versions=None):
+    """生成一页arXiv列表页HTML，versions 为 {arxiv_id: 最新版本号}，未列出的论文为v1"""
+    versions = versions or {}
+    rng = random.Random(seed)
+    date = date or datetime(2025, 10, 17)
+    total = total if total is not None else len(arxiv_ids)
+    heading = f'{date:%a, %d %b %Y} (showing first {len(arxiv_ids)} of {total} entries )'
+    entries = ''.join(render_entry(skip + i + 1, arxiv_id, rng, versions.get(arxiv_id, 1))
+                      for i, arxiv_id in enumerate(arxiv_ids))
+    days = ''.join(f'<li><a href="#item{skip + 1}">{date - timedelta(days=d):%a, %d %b %Y}</a></li>'
+                   for d in range(5))
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>{category} recent submissions</title></head>
+<body class="with-cu-identity">
+<div id="header"><h1><a href="/">arXiv.org</a></h1></div>
+<main><div id="content"><div id='content-inner'>
+<div id='dlpage'>
+<h1>{category}</h1>
+<h2>Authors and titles for recent submissions</h2>
+<ul>{days}</ul>
+<div class='paging'>Total of {total} entries</div>
+<dl id='articles'>
+<h3>{heading}</h3>
+{entries}
+</dl>
+<div class='paging'>Total of {total} entries</div>
+</div></div></div></main>
+<footer><a href="https://info.arxiv.org/help/contact.html">Contact</a></footer>
+</body></html>
+'''.encode('utf-8')
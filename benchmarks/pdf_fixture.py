@@ -0,0 +1,77 @@
+"""生成结构有效的PDF样本，用于下载和PDF处理基准测试
+
+页面内容流与pdfTeX的输出类似，使用带字距调整的TJ数组，并按FlateDecode压缩。
+"""
+import random
+import zlib
+
+WORDS = ('model', 'language', 'attention', 'training', 'neural', 'network', 'dataset', 'results', 'we', 'propose',
+         'transformer', 'learning', 'performance', 'task', 'method', 'the', 'of', 'and', 'evaluation', 'baseline')
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').encode('latin-1')
+
+
+def random_pages(pages, lines=45, words=10, seed=0):
+    """生成 pages 页、每页 lines 行的随机文本"""
+    rng = random.Random(seed)
+    return [[' '.join(rng.choice(WORDS) for _ in range(words)) for _ in range(lines)] for _ in range(pages)]
+
+
+def _content_stream(lines):
+    """每行一个TJ数组，单词之间用字距调整代替空格"""
+    ops = [b'BT /F1 10 Tf 12 TL 72 720 Td']
+    for line in lines:
+        ops.append(b'[' + b'-333'.join(b'(' + _escape(word) + b')' for word in line.split()) + b'] TJ T*')
+    ops.append(b'ET')
+    return b'\n'.join(ops)
+
+
+def make_pdf(page_texts, compress=True, padding=0):
+    """生成每页包含给定文本行的PDF，padding 为额外的填充字节数"""
+    objects = {3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'}
+    kids = []
+    number = 4
+    for lines in page_texts:
+        content = _content_stream(lines)
+        if compress:
+            content = zlib.compress(content)
+        objects[number] = (b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                           b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (number + 1))
+        objects[number + 1] = (b'<< /Length %d%s >>\nstream\n' % (len(content), b' /Filter /FlateDecode' if compress else b'')
+                               + content + b'\nendstream')
+        kids.append(number)
+        number += 2
+    if padding:
+        objects[number] = b'<< /Length %d >>\nstream\n' % padding + b'0' * padding + b'\nendstream'
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids))
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b'%d 0 obj\n' % num + objects[num] + b'\nendobj\n'
+    xref = len(out)
+    size = max(objects) + 1
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    out += b''.join(b'%010d 00000 n \n' % offsets[num] for num in sorted(objects))
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref)
+    return bytes(out)
+
+
+def make_sized_pdf(size, pages=1, seed=0):
+    """生成尽量接近 size 字节的有效PDF，不足的部分用填充流补齐"""
+    page_texts = random_pages(pages, seed=seed)
+    pdf = make_pdf(page_texts)
+    padding = size - len(pdf)
+    # 填充对象本身的开销与填充长度的位数有关，调整几次即可精确匹配
+    for _ in range(3):
+        if padding <= 0:
+            break
+        pdf = make_pdf(page_texts, padding=padding)
+        if len(pdf) == size:
+            break
+        padding -= len(pdf) - size
+    return pdf
@@ -0,0 +1,266 @@
+"""离线端到端性能测试
+
+启动本地arXiv替身服务器，在SQLite上依次运行 ArxivSpider + PaperPipeline 爬取和下载队列，
+输出JSON报告并与保存的基线比较。
+--pipelined 开启流水线下载，边爬取边下载，爬取耗时包含关闭时等待下载完成的时间，
+从爬取开始到最后一篇PDF完成的总耗时等数据记录在报告的 pipeline 字段中，不参与基线比较。
+
+用法: python -m benchmarks.run_e2e --categories cs.CL,cs.AI --entries 600 --output report.json
+      python -m benchmarks.run_e2e --save-baseline          # 更新 benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).with_name('baseline.json')
+# 数值越大越好的指标，其余指标越小越好
+HIGHER_IS_BETTER = {'pages_per_sec', 'items_per_sec', 'download_mb_per_sec'}
+
+
+class DBCounter:
+    """统计引擎上执行的SQL语句和提交次数"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.statements = 0
+        self.commits = 0
+        self.lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+        event.listen(engine, 'commit', self._on_commit)
+
+    def _on_execute(self, *args):
+        with self.lock:
+            self.statements += 1
+
+    def _on_commit(self, *args):
+        with self.lock:
+            self.commits += 1
+
+    def snapshot(self):
+        with self.lock:
+            return self.statements + self.commits
+
+
+@contextmanager
+def working_directory(path):
+    """临时切换工作目录，退出时恢复，临时目录删除前当前目录已经切换回来"""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def run_crawl(server, categories, polite, pipelined):
+    """运行一次完整爬取，返回 (耗时, Scrapy统计信息)，流水线下载时耗时包含关闭时等待下载完成的时间"""
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.settings import Settings
+
+    settings = Settings()
+    settings.setmodule('app.settings', priority='project')
+    settings.set('LOG_LEVEL', 'INFO', priority='cmdline')
+    if not polite:
+        settings.set('RATE_LIMIT_ENABLED', False, priority='cmdline')
+        settings.set('CONCURRENT_REQUESTS', 16, priority='cmdline')
+    settings.set('DOWNLOAD_PIPELINED', pipelined, priority='cmdline')
+
+    from app.spiders.arxiv_spider import ArxivSpider
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(ArxivSpider)
+    start = time.perf_counter()
+    process.crawl(crawler, categories=','.join(categories), base_url=server.base_url)
+    process.start()
+    return time.perf_counter() - start, crawler.stats.get_stats()
+
+
+def make_downloader(engine_name):
+    """创建下载器并包装单篇下载方法，返回 (下载器, 每篇论文的 (开始, 结束) 时间列表)
+
+    下载器同时作为全局 paper_downloader，供管道的流水线下载使用。
+    """
+    from app.utils import downloader as downloader_module
+    if engine_name == 'asyncio':
+        from app.utils.async_downloader import AsyncPaperDownloader
+        downloader = AsyncPaperDownloader()
+    else:
+        from app.utils.downloader import PaperDownloader
+        downloader = PaperDownloader()
+
+    spans = []
+    lock = threading.Lock()
+
+    def record(start):
+        with lock:
+            spans.append((start, time.perf_counter()))
+
+    # 包装单篇下载方法以统计每篇论文的下载耗时
+    if engine_name == 'asyncio':
+        download_async = downloader.download_paper_async
+
+        async def timed_async(paper):
+            start = time.perf_counter()
+            try:
+                return await download_async(paper)
+            finally:
+                record(start)
+        downloader.download_paper_async = timed_async
+    else:
+        download = downloader.download_paper
+
+        def timed(paper):
+            start = time.perf_counter()
+            try:
+                return download(paper)
+            finally:
+                record(start)
+        downloader.download_paper = timed
+    downloader_module.paper_downloader = downloader
+    return downloader, spans
+
+
+def run_downloads(downloader):
+    """在本进程中处理下载队列中剩余的论文，返回耗时"""
+    from app.utils.download_queue import DownloadWorker
+    start = time.perf_counter()
+    DownloadWorker(downloader, batch_size=50).run(until_empty=True)
+    elapsed = time.perf_counter() - start
+    if hasattr(downloader, 'close'):
+        downloader.close()
+    return elapsed
+
+
+def compare(report, baseline, tolerance):
+    """与基线比较，返回退化的指标列表"""
+    regressions = []
+    for key, base in baseline['metrics'].items():
+        value = report['metrics'].get(key)
+        if value is None or not base:
+            continue
+        change = (value - base) / base
+        worse = -change if key in HIGHER_IS_BETTER else change
+        marker = ''
+        if worse > tolerance:
+            regressions.append(key)
+            marker = '  <-- 退化'
+        print(f'{key:>24}: {value:>10.3f} (基线 {base:.3f}, {change:+.1%}){marker}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--categories', default='cs.CL,cs.AI')
+    parser.add_argument('--entries', type=int, default=600, help='每个分类的条目数')
+    parser.add_argument('--pdf-size', type=int, default=256 * 1024)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--listing-latency', type=float, default=0.0, help='列表页额外的响应延迟(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread')
+    parser.add_argument('--polite', action='store_true', help='启用共享限速器')
+    parser.add_argument('--pipelined', action='store_true', help='开启流水线下载，边爬取边下载')
+    parser.add_argument('--output', help='JSON报告输出路径')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对退化幅度')
+    args = parser.parse_args()
+    categories = args.categories.split(',')
+    # 运行期间工作目录切换到临时目录，相对路径先按启动时的目录解析
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    args.baseline = os.path.abspath(args.baseline)
+
+    with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        # 必须在导入app模块前指定数据库，使全局db_manager指向SQLite
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'e2e.db')}"
+        from app.utils.db_utils import db_manager
+        from app.utils import downloader as downloader_module, rate_limiter as rate_limiter_module
+        from app.utils.metrics import metrics
+        from .arxiv_server import ArxivServer
+
+        if not args.polite:
+            rate_limiter_module.RATE_LIMIT_ENABLED = False
+        downloader_module.DOWNLOAD_RETRY_DELAY = 0
+
+        db_manager.create_tables()
+        counter = DBCounter(db_manager.engine)
+        server = ArxivServer(pdf_size=args.pdf_size, latency=args.latency, error_rate=args.error_rate,
+                             entries_per_category=args.entries, listing_latency=args.listing_latency).start()
+
+        downloader, spans = make_downloader(args.engine)
+        total_start = time.perf_counter()
+        crawl_time, stats = run_crawl(server, categories, args.polite, args.pipelined)
+        crawl_db_ops = counter.snapshot()
+        crawl_end = time.perf_counter()
+        items = stats.get('item_scraped_count', 0)
+        pages = server.requests['listing']
+
+        download_time = run_downloads(downloader)
+        total_time = time.perf_counter() - total_start
+        download_db_ops = counter.snapshot() - crawl_db_ops
+        # 下载指标只统计爬取结束后由下载worker处理的论文，流水线下载的论文单独计数
+        latencies = [end - start for start, end in spans if start >= crawl_end]
+        pipelined_downloads = len(spans) - len(latencies)
+        downloaded_mb = len(latencies) * args.pdf_size / (1024 * 1024)
+        server.shutdown()
+        db_manager.engine.dispose()
+
+    report = {
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'baseline', 'save_baseline')} | {'categories': categories},
+        'metrics': {
+            'pages_per_sec': pages / crawl_time,
+            'items_per_sec': items / crawl_time if crawl_time else 0,
+            'db_ops_per_item': crawl_db_ops / items if items else 0,
+            'db_ops_per_download': download_db_ops / len(latencies) if latencies else 0,
+            'download_mb_per_sec': downloaded_mb / download_time if download_time else 0,
+            'download_p50_sec': percentile(latencies, 50),
+            'download_p99_sec': percentile(latencies, 99),
+        },
+        'counts': {'pages': pages, 'items': items, 'downloads': len(latencies)},
+        # 流水线下载的效果，不参与基线比较
+        'pipeline': {
+            'enabled': args.pipelined,
+            # 从爬取开始到最后一篇PDF下载完成的时间
+            'total_sec': total_time,
+            'drain_sec': stats.get('download_scheduler/drain_seconds', 0),
+            'downloads_during_crawl': pipelined_downloads,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        # 各阶段内置指标的汇总，用于定位退化出现在哪个环节
+        'stages': metrics.summaries(),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        print(f'基线已保存到 {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f'以下指标相对基线退化超过 {args.tolerance:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
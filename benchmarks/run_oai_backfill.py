@@ -0,0 +1,248 @@
+"""OAI-PMH回填爬虫的离线测试
+
+本地arXiv替身服务器的 /oai 接口回放 fixtures/oai_page*.xml 中录制的 ListRecords 响应，
+在SQLite上用子进程运行 arxiv_oai 爬虫，依次验证:
+  full     从头回填两页，记录按arXivRaw元数据映射为Paper，已删除的记录被跳过，结束后清除续传令牌
+  rerun    回填完成后再次运行，论文未变化不再产出
+  resume   断点中保存了第二页的续传令牌，只请求并写入第二页
+  restart  断点中的续传令牌已失效(badResumptionToken)，从断点日期重新发起ListRecords并回填全部论文
+  crash    第二页的断点提交后进程立即退出，第一页的论文已入库，续传时重新处理第二页后论文齐全
+
+用法: python -m benchmarks.run_oai_backfill
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# 与爬虫的断点键一致: oai:<set>:<from>:<until>
+CHECKPOINT_KEY = 'oai:cs::'
+PAGE2_TOKEN = '6049821|1001'
+ALL_IDS = ['1706.03762', '1810.04805', '2005.14165']
+
+
+class ExitAfterCheckpoint:
+    """测试用扩展: 断点写入第二页的续传令牌并提交后立即结束进程，模拟回填中途崩溃
+
+    进程直接退出，管道的 close_spider 不会执行，缓冲区中尚未写入的论文随之丢失。
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from app.models.crawl_state import CrawlState
+
+        def before_commit(session):
+            if any(isinstance(obj, CrawlState) and obj.resumption_token == PAGE2_TOKEN
+                   for obj in list(session.new) + list(session.dirty)):
+                session.info['exit_after_commit'] = True
+
+        def after_commit(session):
+            if session.info.pop('exit_after_commit', False):
+                os._exit(3)
+
+        event.listen(Session, 'before_commit', before_commit)
+        event.listen(Session, 'after_commit', after_commit)
+        return cls()
+
+
+def run_spider(server, tmp, crash=False):
+    """在子进程中运行一次回填，返回Scrapy统计信息，crash为True时在第二页断点提交后退出并返回None"""
+    env = dict(os.environ, SCRAPY_SETTINGS_MODULE='app.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    stats_file = os.path.join(tmp, 'stats.json')
+    command = [sys.executable, '-m', 'scrapy', 'crawl', 'arxiv_oai', '-a', 'set_spec=cs',
+               '-a', f'oai_url={server.base_url}/oai', '-a', f'base_url={server.base_url}',
+               '-s', 'DOWNLOAD_DELAY=0', '-s', 'RATE_LIMIT_ENABLED=False', '-s', 'EMBEDDING_ENABLED=False',
+               '-s', 'METRICS_FILE=', '-s', f'STATS_FILE={stats_file}', '-s', 'LOG_LEVEL=WARNING']
+    if crash:
+        command += ['-s', 'EXTENSIONS=' + json.dumps({'benchmarks.run_oai_backfill.ExitAfterCheckpoint': 0})]
+    if os.path.exists(stats_file):
+        os.remove(stats_file)
+    process = subprocess.run(command, env=env, cwd=tmp, capture_output=True, text=True, timeout=300)
+    if crash:
+        if process.returncode != 3:
+            print(process.stderr[-2000:])
+            sys.exit(1)
+        return None
+    if process.returncode != 0 or not os.path.exists(stats_file):
+        print(process.stderr[-2000:])
+        sys.exit(1)
+    with open(stats_file) as f:
+        return json.load(f)
+
+
+def reset(manager, token=None, last_date=None):
+    """清空论文和断点，可选写入指定的续传令牌和断点日期"""
+    from app.utils.db_utils import Paper, PaperAuthor, PaperCategory
+    from app.models.crawl_state import CrawlState
+
+    session = manager.get_session()
+    for model in (PaperAuthor, PaperCategory, Paper, CrawlState):
+        session.query(model).delete()
+    if token or last_date:
+        session.add(CrawlState(category=CHECKPOINT_KEY, resumption_token=token, last_published_date=last_date))
+    session.commit()
+    session.close()
+
+
+def snapshot(manager):
+    """返回 (按arxiv_id排序的论文, 断点)"""
+    from app.utils.db_utils import Paper
+    from app.models.crawl_state import CrawlState
+
+    session = manager.get_session()
+    papers = {paper.arxiv_id: paper for paper in session.query(Paper)}
+    checkpoint = session.get(CrawlState, CHECKPOINT_KEY)
+    session.expunge_all()
+    session.close()
+    return papers, checkpoint
+
+
+def check_mapping(manager, papers, base_url):
+    """检查arXivRaw元数据到Paper各列的映射，返回失败项"""
+    from app.utils import paper_queries
+
+    paper = papers['1706.03762']
+    expected = {
+        'title': 'Attention Is All You Need',
+        'authors': ['Ashish Vaswani', 'Noam Shazeer', 'Niki Parmar', 'Jakob Uszkoreit', 'Llion Jones',
+                    'Aidan N. Gomez', 'Lukasz Kaiser', 'Illia Polosukhin'],
+        'institutions': [],
+        'abstract': ('The dominant sequence transduction models are based on complex recurrent or '
+                     'convolutional neural networks in an encoder-decoder configuration.'),
+        'pdf_url': f'{base_url}/pdf/1706.03762.pdf',
+        # 首次提交(v1)的日期作为发布日期，版本号取最后一个版本
+        'published_date': datetime(2017, 6, 12, 17, 57, 34),
+        'categories': 'cs.CL,cs.LG',
+        'version': 7,
+    }
+    actual = {
+        'title': paper.title,
+        'authors': json.loads(paper.authors),
+        'institutions': json.loads(paper.institutions),
+        'abstract': paper.abstract,
+        'pdf_url': paper.pdf_url,
+        'published_date': paper.published_date,
+        'categories': paper.categories,
+        'version': paper.version,
+    }
+    failures = [f'{key}: {actual[key]!r} != {value!r}' for key, value in expected.items() if actual[key] != value]
+    if papers['1810.04805'].title != 'BERT: Pre-training of Deep Bidirectional Transformers for Language Understanding':
+        failures.append(f'多行标题未合并空白: {papers["1810.04805"].title!r}')
+    if papers['2005.14165'].version != 4:
+        failures.append(f'2005.14165 版本号: {papers["2005.14165"].version}')
+
+    # 作者和分类关联表同步维护
+    session = manager.get_session()
+    try:
+        by_author = {p.arxiv_id for p in paper_queries.papers_by_author(session, 'Illia Polosukhin')}
+        by_category = {p.arxiv_id for p in paper_queries.papers_in_category(session, 'cs.LG')}
+    finally:
+        session.close()
+    if by_author != {'1706.03762'}:
+        failures.append(f'按作者查询: {sorted(by_author)}')
+    if by_category != {'1706.03762'}:
+        failures.append(f'按分类查询: {sorted(by_category)}')
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        # 必须在导入app模块前指定数据库，子进程通过环境变量继承同一个SQLite库
+        os.environ['DB_URL'] = f"sqlite:///{os.path.join(tmp, 'oai.db')}"
+        from app.utils.db_utils import db_manager
+        from .arxiv_server import ArxivServer
+
+        db_manager.create_tables()
+        server = ArxivServer().start()
+        results = []
+
+        def scenario(name, checks, crash=False, **state):
+            reset_first = state.pop('reset', True)
+            if reset_first:
+                reset(db_manager, **state)
+            server.oai_requests.clear()
+            stats = run_spider(server, tmp, crash) or {}
+            papers, checkpoint = snapshot(db_manager)
+            context = {'stats': stats, 'papers': papers, 'checkpoint': checkpoint,
+                       'requests': list(server.oai_requests)}
+            failures = [message for ok, message in checks(context) if not ok]
+            results.append({'scenario': name, 'requests': context['requests'],
+                            'items': stats.get('item_scraped_count', 0), 'papers': sorted(papers),
+                            'failures': failures})
+            return context
+
+        def full_checks(c):
+            requests = c['requests']
+            return [
+                (sorted(c['papers']) == ALL_IDS, '应写入两页中未删除的3篇论文'),
+                ('0704.0003' not in c['papers'], '已删除的记录不应写入'),
+                (len(requests) == 2 and requests[0].get('metadataPrefix') == 'arXivRaw'
+                 and requests[0].get('set') == 'cs' and 'resumptionToken' not in requests[0],
+                 '第一页应按 metadataPrefix/set 请求'),
+                (len(requests) == 2 and requests[1] == {'verb': 'ListRecords', 'resumptionToken': PAGE2_TOKEN},
+                 '第二页应只带续传令牌请求'),
+                (c['checkpoint'] is not None and c['checkpoint'].resumption_token is None,
+                 '回填完成后应清除续传令牌'),
+                (c['checkpoint'] is not None and c['checkpoint'].last_published_date == datetime(2020, 7, 23),
+                 '断点日期应为最后一页记录的datestamp'),
+            ]
+
+        full = scenario('full', full_checks)
+        mapping_failures = check_mapping(db_manager, full['papers'], server.base_url)
+        results[-1]['failures'] += mapping_failures
+
+        scenario('rerun', lambda c: [
+            (c['stats'].get('item_scraped_count', 0) == 0, '论文未变化时不应再产出'),
+            (sorted(c['papers']) == ALL_IDS, '已有论文应保留'),
+        ], reset=False)
+
+        scenario('resume', lambda c: [
+            (c['requests'] == [{'verb': 'ListRecords', 'resumptionToken': PAGE2_TOKEN}],
+             '应直接用断点中的续传令牌请求第二页'),
+            (sorted(c['papers']) == ['2005.14165'], '只应写入第二页的论文'),
+            (c['checkpoint'].resumption_token is None, '回填完成后应清除续传令牌'),
+        ], token=PAGE2_TOKEN)
+
+        scenario('restart', lambda c: [
+            (len(c['requests']) == 3 and c['requests'][0].get('resumptionToken') == 'stale|1',
+             '应先使用断点中的续传令牌'),
+            (len(c['requests']) == 3 and c['requests'][1].get('from') == '2019-05-27'
+             and c['requests'][1].get('metadataPrefix') == 'arXivRaw',
+             '令牌失效后应从断点日期重新请求'),
+            (len(c['requests']) == 3 and c['requests'][2].get('resumptionToken') == PAGE2_TOKEN,
+             '重新开始后应继续翻页'),
+            (sorted(c['papers']) == ALL_IDS, '应回填全部论文'),
+            (c['checkpoint'].resumption_token is None, '回填完成后应清除续传令牌'),
+        ], token='stale|1', last_date=datetime(2019, 5, 27))
+
+        # 第一页的2篇论文少于管道批量大小，仍在缓冲区中时断点已前进到第二页
+        scenario('crash', lambda c: [
+            (c['checkpoint'] is not None and c['checkpoint'].resumption_token == PAGE2_TOKEN,
+             '退出时断点应停在第二页'),
+            (sorted(c['papers']) == ALL_IDS[:2], '断点之前各页产出的论文应已入库'),
+        ], crash=True)
+        scenario('crash-resume', lambda c: [
+            (c['requests'] == [{'verb': 'ListRecords', 'resumptionToken': PAGE2_TOKEN}],
+             '应从第二页续传'),
+            (sorted(c['papers']) == ALL_IDS, '续传后论文应齐全'),
+            (c['checkpoint'].resumption_token is None, '回填完成后应清除续传令牌'),
+        ], reset=False)
+
+        server.shutdown()
+        db_manager.engine.dispose()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    ok = all(not result['failures'] for result in results)
+    print('通过' if ok else '失败')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
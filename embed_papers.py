@@ -0,0 +1,33 @@
+import argparse
+import time
+from app.utils.db_utils import db_manager
+from app.utils.vector_index import EmbeddingStage
+
+def embed_papers():
+    parser = argparse.ArgumentParser(description='论文向量化与相似论文检索')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = subparsers.add_parser('run', help='为尚未向量化的论文生成向量')
+    run_parser.add_argument('--batch-size', type=int, default=512)
+    
+    similar_parser = subparsers.add_parser('similar', help='检索与给定文本相似的论文')
+    similar_parser.add_argument('text')
+    similar_parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    
+    stage = EmbeddingStage()
+    session = db_manager.get_session()
+    try:
+        start = time.perf_counter()
+        if args.command == 'run':
+            count = stage.run(session, batch_size=args.batch_size)
+            print(f"已为 {count} 篇论文生成向量，耗时 {time.perf_counter() - start:.1f}s")
+        else:
+            for arxiv_id, score in stage.similar(session, args.text, k=args.limit):
+                print(f"{arxiv_id}\t{score:.3f}")
+            print(f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    embed_papers()
@@ -0,0 +1,28 @@
+import argparse
+import time
+from app.utils.db_utils import db_manager
+from app.utils.exporter import Exporter, EXPORT_TABLES, FORMAT_EXTENSIONS
+from app.settings import EXPORT_DIR, EXPORT_FORMAT, EXPORT_CHUNK_SIZE
+
+def export_papers():
+    parser = argparse.ArgumentParser(description='把论文和下载记录流式导出为JSONL/Parquet/Arrow文件')
+    parser.add_argument('--format', choices=list(FORMAT_EXTENSIONS), default=EXPORT_FORMAT)
+    parser.add_argument('--out-dir', default=EXPORT_DIR)
+    parser.add_argument('--tables', default=','.join(EXPORT_TABLES), help='逗号分隔的表名')
+    parser.add_argument('--full', action='store_true', help='忽略上次导出的位置，导出全部数据')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='每次从数据库读取的行数')
+    args = parser.parse_args()
+    
+    session = db_manager.get_session()
+    try:
+        start = time.perf_counter()
+        exported = Exporter(args.out_dir).run(session, tables=args.tables.split(','), fmt=args.format,
+                                              incremental=not args.full, chunk_size=args.chunk_size)
+        for table_name, path, count in exported:
+            print(f"{table_name}: {count} 行 -> {path}")
+        print(f"导出完成，耗时 {time.perf_counter() - start:.1f}s")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    export_papers()
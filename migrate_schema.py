@@ -0,0 +1,15 @@
+import argparse
+from app.utils.db_utils import db_manager
+from app.utils.migrations import migrate
+
+def migrate_schema():
+    parser = argparse.ArgumentParser(description='升级数据库结构并回填作者/分类关联表')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='每批迁移的论文数')
+    parser.add_argument('--start-id', type=int, default=0, help='从该论文ID之后继续迁移')
+    args = parser.parse_args()
+    
+    total = migrate(db_manager, chunk_size=args.chunk_size, start_id=args.start_id)
+    print(f"迁移完成，共处理 {total} 篇论文")
+
+if __name__ == "__main__":
+    migrate_schema()
@@ -0,0 +1,25 @@
+import argparse
+import time
+from app.utils.db_utils import db_manager
+from app.utils.pdf_processor import PdfProcessor, PDF_ENGINES
+from app.settings import PDF_PROCESS_WORKERS, PDF_PROCESS_BATCH_SIZE, PDF_TEXT_ENGINE
+
+def process_pdfs():
+    parser = argparse.ArgumentParser(description='校验已下载的PDF并提取页数和纯文本，无效的PDF标记为重新下载')
+    parser.add_argument('--workers', type=int, default=PDF_PROCESS_WORKERS, help='处理进程数，默认为CPU核数')
+    parser.add_argument('--batch-size', type=int, default=PDF_PROCESS_BATCH_SIZE, help='每批回写状态的记录数')
+    parser.add_argument('--engine', choices=sorted(PDF_ENGINES), default=PDF_TEXT_ENGINE)
+    args = parser.parse_args()
+    
+    db_manager.create_tables()
+    session = db_manager.get_session()
+    try:
+        start = time.perf_counter()
+        counts = PdfProcessor(args.workers, args.engine).run(session, batch_size=args.batch_size)
+        print(f"有效 {counts.get('valid', 0)} 个，无效 {counts.get('invalid', 0)} 个，"
+              f"耗时 {time.perf_counter() - start:.1f}s")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    process_pdfs()
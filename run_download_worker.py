@@ -0,0 +1,27 @@
+import argparse
+from app.utils.db_utils import db_manager
+from app.utils.download_queue import DownloadWorker
+from app.utils.downloader import paper_downloader
+
+def run_download_worker():
+    parser = argparse.ArgumentParser(description='从下载队列领取并下载论文')
+    parser.add_argument('--worker-id', default=None, help='worker标识，默认为 主机名-进程ID')
+    parser.add_argument('--batch-size', type=int, default=None, help='每次领取的任务数')
+    parser.add_argument('--once', action='store_true', help='队列为空时退出')
+    args = parser.parse_args()
+    
+    # 确保数据库表已创建
+    db_manager.create_tables()
+    
+    options = {'worker_id': args.worker_id}
+    if args.batch_size:
+        options['batch_size'] = args.batch_size
+    worker = DownloadWorker(paper_downloader, **options)
+    try:
+        processed = worker.run(until_empty=args.once)
+    finally:
+        paper_downloader.close()
+    print(f"共处理 {processed} 个下载任务")
+
+if __name__ == "__main__":
+    run_download_worker()
@@ -19,6 +19,11 @@ def run_spider():
     
     # 启动爬虫
     process.start()
+    
+    # 爬取结束后在本进程中处理下载队列，也可以单独运行 run_download_worker.py 多进程下载
+    from app.utils.download_queue import DownloadWorker
+    from app.utils.downloader import paper_downloader
+    DownloadWorker(paper_downloader).run(until_empty=True)
 
 if __name__ == "__main__":
     run_spider()
\ No newline at end of file
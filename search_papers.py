@@ -0,0 +1,36 @@
+import argparse
+import time
+from app.utils.db_utils import db_manager
+from app.utils.search_index import search_index
+
+def search_papers():
+    parser = argparse.ArgumentParser(description='本地论文全文检索')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    query_parser = subparsers.add_parser('query', help='按关键词检索论文')
+    query_parser.add_argument('keywords', nargs='+')
+    query_parser.add_argument('--limit', type=int, default=20)
+    query_parser.add_argument('--raw', action='store_true', help='直接使用FTS5查询语法')
+    
+    rebuild_parser = subparsers.add_parser('rebuild', help='从papers表重建检索索引')
+    rebuild_parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+    
+    if args.command == 'rebuild':
+        session = db_manager.get_session()
+        try:
+            start = time.perf_counter()
+            total = search_index.rebuild(session, chunk_size=args.chunk_size)
+            print(f"已索引 {total} 篇论文，耗时 {time.perf_counter() - start:.1f}s")
+        finally:
+            session.close()
+    else:
+        start = time.perf_counter()
+        results = search_index.search(' '.join(args.keywords), limit=args.limit, raw=args.raw)
+        elapsed = (time.perf_counter() - start) * 1000
+        for arxiv_id, score in results:
+            print(f"{arxiv_id}\t{score:.3f}")
+        print(f"共 {len(results)} 条结果，耗时 {elapsed:.1f}ms")
+
+if __name__ == "__main__":
+    search_papers()
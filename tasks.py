@@ -1,16 +1,93 @@
-from celery import shared_task
+import sys
+import subprocess
+from celery import Celery, shared_task, chord
+from celery.schedules import crontab
 from datetime import datetime
-from spiders.arxiv_spider import ArxivSpider
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
+from app.utils.crawl_orchestrator import PROJECT_ROOT, shard_categories, plan_lanes, run_shard, merge_stats
+from app.settings import (CELERY_BROKER_URL, CELERY_RESULT_BACKEND, CELERY_CRAWL_HOUR, CRAWL_CATEGORIES,
+                          CRAWL_DAYS_BACK, CRAWL_SHARD_SIZE, CRAWL_MAX_PARALLEL, PDF_PROCESS_ENABLED,
+                          EMBEDDING_ENABLED)
+
+app = Celery('paperspider', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+app.conf.beat_schedule = {
+    'crawl-arxiv-daily': {
+        'task': 'tasks.crawl_arxiv_papers',
+        'schedule': crontab(hour=CELERY_CRAWL_HOUR, minute=0),
+    },
+}
+
+@shared_task
+def crawl_shards(shards, days_back=CRAWL_DAYS_BACK, base_url=None, settings=None):
+    """依次在子进程中爬取一条通道上的分片，返回各分片的结果"""
+    return [run_shard(categories, days_back, base_url, settings=settings) for categories in shards]
+
+@shared_task
+def download_queued_papers():
+    """处理下载队列直到为空，返回处理的任务数"""
+    from app.utils.download_queue import DownloadWorker
+    from app.utils.downloader import paper_downloader
+    try:
+        return DownloadWorker(paper_downloader).run(until_empty=True)
+    finally:
+        paper_downloader.close()
 
 @shared_task
-def crawl_arxiv_papers():
-    """启动arXiv论文爬虫的Celery任务"""
+def process_downloaded_papers():
+    """校验新下载的PDF并提取文本
+
+    Celery的prefork worker是守护进程，不能再创建进程池，因此在子进程中运行 process_pdfs.py。
+    """
+    process = subprocess.run([sys.executable, str(PROJECT_ROOT / 'process_pdfs.py')], capture_output=True, text=True)
+    return {'status': 'success' if process.returncode == 0 else 'error', 'returncode': process.returncode,
+            'output': (process.stdout if process.returncode == 0 else process.stderr)[-2000:]}
+
+@shared_task
+def embed_new_papers():
+    """为尚未向量化的论文生成向量，返回处理的论文数"""
+    from app.utils.db_utils import db_manager
+    from app.utils.vector_index import EmbeddingStage
+    session = db_manager.get_session()
+    try:
+        return EmbeddingStage().run(session)
+    finally:
+        session.close()
+
+@shared_task
+def finish_crawl(lane_results, download=True):
+    """汇总所有通道的爬取结果，并把向量化、下载和PDF处理作为后续阶段触发"""
+    results = [result for lane in lane_results for result in lane]
+    stats, failed = merge_stats(results)
+    summary = {
+        'status': 'success' if not failed else 'partial',
+        'stats': stats,
+        'failed_shards': failed,
+        'timestamp': datetime.now().isoformat(),
+    }
+    if EMBEDDING_ENABLED:
+        # 分片各自不生成向量，全部结束后执行一次
+        summary['embed_task_id'] = embed_new_papers.delay().id
+    if download:
+        # 即使部分分片失败，已入队的论文仍然下载
+        # 下载完成后处理新下载的PDF
+        link = process_downloaded_papers.si() if PDF_PROCESS_ENABLED else None
+        summary['download_task_id'] = download_queued_papers.apply_async(link=link).id
+    return summary
+
+@shared_task
+def crawl_arxiv_papers(categories=CRAWL_CATEGORIES, days_back=CRAWL_DAYS_BACK, shard_size=CRAWL_SHARD_SIZE,
+                       max_parallel=CRAWL_MAX_PARALLEL, base_url=None, download=True, settings=None):
+    """启动arXiv论文爬虫的Celery任务
+
+    按分类切分为分片，分配到至多 max_parallel 个并行任务中，每个分片在独立子进程中爬取，
+    全部结束后由 finish_crawl 汇总统计并触发下载。settings 为传给每个爬虫子进程的Scrapy配置。
+    """
     try:
-        process = CrawlerProcess(get_project_settings())
-        process.crawl(ArxivSpider)
-        process.start()
-        return {'status': 'success', 'timestamp': datetime.now().isoformat()}
+        from app.utils.db_utils import db_manager
+        db_manager.create_tables()
+        lanes = plan_lanes(shard_categories(categories, shard_size), max_parallel)
+        header = [crawl_shards.s(shards, days_back, base_url, settings) for shards in lanes]
+        result = chord(header)(finish_crawl.s(download=download))
+        return {'status': 'started', 'lanes': len(lanes), 'result_id': result.id,
+                'timestamp': datetime.now().isoformat()}
     except Exception as e:
-        return {'status': 'error', 'error': str(e), 'timestamp': datetime.now().isoformat()}
\ No newline at end of file
+        return {'status': 'error', 'error': str(e), 'timestamp': datetime.now().isoformat()}